@@ -1,136 +1,36 @@
 import os
 import platform
-import shutil
 import threading
-import traceback
 import logging
-from time import strftime, localtime, perf_counter
 from tkinter import *
 from tkinter import ttk, filedialog, messagebox
 
 # --- 依赖导入与检查 ---
-# 图像基础库
-from PIL import Image, ImageEnhance, ImageFilter
-import fitz  # PyMuPDF
-import cv2
-import numpy as np
-# --- OCR 依赖导入与可用性检查 ---
-
-# Tesseract OCR
-try:
-    import pytesseract
-    from pytesseract import Output, TesseractError, TesseractNotFoundError
-    TESSERACT_AVAILABLE = True
-    print("Tesseract OCR 可用。")
-except ImportError:
-    # 未安装 pytesseract 库
-    print("警告：未找到 pytesseract 库，Tesseract 相关功能不可用。")
-    TESSERACT_AVAILABLE = False
-    TesseractError = Exception       # 定义通用异常占位
-    TesseractNotFoundError = Exception
-
-# PaddleOCR PP-Structure
-try:
-    import paddle
-    # 尝试导入 PPStructure，若底层 DLL 加载失败会抛出 OSError
-    from paddleocr import PPStructure
-    PPSTRUCTURE_AVAILABLE = True
-    print("PaddleOCR PP-Structure 可用。")
-except ImportError:
-    # 未安装 paddle 或 paddleocr
-    print("警告：未找到 paddlepaddle 或 paddleocr 库，PP-Structure 功能不可用。")
-    PPSTRUCTURE_AVAILABLE = False
-    PPStructure = None               # 定义空占位，避免后续 NameError
-except OSError as e:
-    # 底层依赖加载失败（如 torch\lib\shm.dll）
-    print(f"警告：加载 PP-Structure 底层依赖失败: {e}，已禁用 PP-Structure 功能。")
-    PPSTRUCTURE_AVAILABLE = False
-    PPStructure = None
-# --- PyTorch 和 CARN 超分辨率 ---
-try:
-    import torch
-    from torchvision.transforms import ToTensor, ToPILImage
-    TORCH_AVAILABLE = True
-    print("PyTorch 可用。")
-
-    # 尝试导入 CARN 模型定义 (假设 carn.py 在同目录或 PYTHONPATH)
-    try:
-        from carn import CARN
-        CARN_MODEL_DEF_AVAILABLE = True
-        print("CARN 模型定义可用。")
-    except ImportError:
-        print("警告：未找到 CARN 模型定义文件 (carn.py)，超分辨率功能不可用。")
-        CARN_MODEL_DEF_AVAILABLE = False
-        CARN = None
-
-except ImportError:
-    # 未安装 torch 或 torchvision
-    print("警告：未找到 torch 或 torchvision 库，超分辨率功能不可用。")
-    TORCH_AVAILABLE = False
-    CARN_MODEL_DEF_AVAILABLE = False
-    CARN = None
-
-except OSError as e:
-    # 底层 DLL 加载失败（如 shm.dll）
-    print(f"警告：加载 PyTorch 底层依赖失败: {e}，已禁用超分辨率功能。")
-    TORCH_AVAILABLE = False
-    CARN_MODEL_DEF_AVAILABLE = False
-    CARN = None
-
+# 模型加载、预处理 (OSD/裁剪/CLAHE/降噪/超分)、PDF 页面循环与结果输出全部位于 ocr_engine.py，
+# 与 ocr.py 共用同一套实现；本界面只负责收集参数 (PDF 专用的精简选项) 并显示日志/进度。
+# 启动时只检查各库是否已安装，重量级库在开始识别时才导入 (见 ocr_engine.probe_installed)。
+import ocr_engine
+
+_installed = ocr_engine.probe_installed()
+TESSERACT_AVAILABLE = _installed["tesseract"]
+PPSTRUCTURE_AVAILABLE = _installed["ppstructure"]
+TORCH_AVAILABLE = _installed["torch"]
+CARN_MODEL_DEF_AVAILABLE = _installed["carn"]
+from ocr_engine import (
+    TESSERACT_PATH, TESSDATA_DIR, TESSDATA_PREFIX,
+    OCRSettings, OCRBatchRunner,
+)
+from ocr_server import DEFAULT_SERVER_URL
+from tk_log import BufferedTkLog, run_log_path
 
 # --- 日志配置 ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- 全局 Tesseract 路径查找 (如果 Tesseract 可用) ---
-TESSERACT_PATH = None
-TESSDATA_DIR = None
-TESSDATA_PREFIX = None
-
-if TESSERACT_AVAILABLE:
-    try:
-        print("开始查找 Tesseract OCR...")
-        # ... (省略 Tesseract 路径查找代码，与之前相同) ...
-        if platform.system() == "Windows":
-            tesseract_cmd_env = os.getenv('TESSERACT_CMD')
-            if tesseract_cmd_env and os.path.exists(tesseract_cmd_env): TESSERACT_PATH = tesseract_cmd_env
-            else:
-                possible_paths = [r'C:\Program Files\Tesseract-OCR\tesseract.exe', r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe']
-                TESSERACT_PATH = next((p for p in possible_paths if os.path.exists(p)), None)
-                if not TESSERACT_PATH: TESSERACT_PATH = shutil.which('tesseract')
-        else: TESSERACT_PATH = shutil.which('tesseract')
-
-        if not TESSERACT_PATH or not os.path.exists(TESSERACT_PATH): raise FileNotFoundError("错误：未能找到 Tesseract 可执行文件。")
-        print(f"找到 Tesseract: {TESSERACT_PATH}")
-        pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
-        print(f"已设置 pytesseract 命令路径。")
-
-        # --- 查找 Tessdata 目录 ---
-        tesseract_dir = os.path.dirname(TESSERACT_PATH)
-        potential_tessdata = os.path.join(tesseract_dir, 'tessdata')
-        if os.path.isdir(potential_tessdata): TESSDATA_DIR = potential_tessdata
-        elif platform.system() == "Windows":
-            potential_tessdata_alt = os.path.abspath(os.path.join(tesseract_dir, '..', 'tessdata'))
-            if os.path.isdir(potential_tessdata_alt): TESSDATA_DIR = potential_tessdata_alt
-        if not TESSDATA_DIR:
-            tessdata_prefix_env = os.getenv('TESSDATA_PREFIX')
-            if tessdata_prefix_env:
-                 potential_tessdata_env = os.path.join(tessdata_prefix_env, 'tessdata')
-                 if os.path.isdir(potential_tessdata_env): TESSDATA_DIR = potential_tessdata_env
-                 elif os.path.basename(tessdata_prefix_env).lower() == 'tessdata' and os.path.isdir(tessdata_prefix_env): TESSDATA_DIR = tessdata_prefix_env
-
-        if TESSDATA_DIR and os.path.isdir(TESSDATA_DIR):
-            print(f"找到 tessdata 目录: {TESSDATA_DIR}")
-            TESSDATA_PREFIX = os.path.abspath(os.path.join(TESSDATA_DIR, '..'))
-            os.environ['TESSDATA_PREFIX'] = TESSDATA_PREFIX
-            print(f"已设置环境变量 TESSDATA_PREFIX = {TESSDATA_PREFIX}")
-        else: print("警告：未能自动找到有效的 'tessdata' 目录。")
-    except FileNotFoundError as e: print(e); TESSERACT_PATH = None
-    except Exception as e: print(f"初始化 Tesseract 路径时发生未知错误: {e}"); TESSERACT_PATH = None
 # -----------------------------------------------------------
 
 class PDFOCRApp:
     """
-    PDF OCR 工具 (v4 - 集成 CARN 超分 + PP-Structure + Tesseract 备选)
+    PDF OCR 工具 (v5 - 处理流程与 ocr.py 共用 ocr_engine.OCRBatchRunner)
     """
     def __init__(self, root):
         self.root = root
@@ -147,6 +47,7 @@ class PDFOCRApp:
             print("无法设置 ttk 主题，使用默认主题。")
 
         self.input_files = []
+        self.log_sink = None # setup_ui 中创建
         self.output_folder = StringVar(value=os.getcwd())
         self.running = False
 
@@ -159,10 +60,11 @@ class PDFOCRApp:
         self.perform_denoise = BooleanVar(value=False)
         self.use_super_res = BooleanVar(value=False) # 超分辨率默认关闭
         self.carn_model_path = StringVar(value="carn.pth") # CARN 权重路径
-
-        # --- 模型实例 (延迟加载) ---
-        self.ppstructure_model_instance = None
-        self.carn_model_instance = None
+        self.use_text_layer = BooleanVar(value=True) # 电子版页面直接提取内嵌文本层，跳过 OCR
+        self.adaptive_dpi = BooleanVar(value=False) # 按估计字高为每页选择渲染 DPI (否则固定 300)
+        self.use_model_server = BooleanVar(value=False) # 使用本机 OCR 模型服务 (ocr_server.py)，未启动时在本进程加载模型
+        self.screen_pages = BooleanVar(value=True) # 跳过空白页
+        self.dedup_pages = BooleanVar(value=False) # 重复页复用之前页面的识别结果
 
         # --- 启动检查 ---
         if not TESSERACT_AVAILABLE and not PPSTRUCTURE_AVAILABLE:
@@ -174,11 +76,11 @@ class PDFOCRApp:
         elif not PPSTRUCTURE_AVAILABLE:
              messagebox.showwarning("配置警告", "未找到 PaddleOCR，PP-Structure 功能不可用。")
              if self.ocr_engine_choice.get() == "PP-Structure": self.ocr_engine_choice.set("Tesseract")
-        if TESSERACT_AVAILABLE and not TESSDATA_PREFIX and not os.getenv('TESSDATA_PREFIX'):
+        if TESSERACT_AVAILABLE and not TESSDATA_PREFIX and not os.getenv('TESSDATA_PREFIX') and not TESSDATA_DIR:
             messagebox.showwarning("Tesseract警告", "未能确认 TESSDATA_PREFIX，Tesseract OCR 可能因缺少语言文件失败。")
         if not TORCH_AVAILABLE or not CARN_MODEL_DEF_AVAILABLE:
             messagebox.showwarning("超分警告", "未找到 PyTorch 或 CARN 模型定义，超分辨率功能不可用。")
-
+            self.use_super_res.set(False)
 
         self.setup_ui()
 
@@ -228,6 +130,16 @@ class PDFOCRApp:
         lang_entry = ttk.Entry(lang_frame, textvariable=self.ocr_language, width=15)
         lang_entry.pack(side=LEFT, padx=5)
         ttk.Label(lang_frame, text="(PP用ch/en, Tess用chi_sim+eng)").pack(side=LEFT)
+        ttk.Checkbutton(ocr_opts_frame, text="优先使用 PDF 内嵌文本层 (电子版页面跳过 OCR，扫描页仍会识别)",
+                        variable=self.use_text_layer).pack(anchor=W, pady=3)
+        ttk.Checkbutton(ocr_opts_frame, text="自适应渲染 DPI (按字高选择 150~400 DPI，大幅面页面限制像素数)",
+                        variable=self.adaptive_dpi).pack(anchor=W, pady=3)
+        ttk.Checkbutton(ocr_opts_frame, text="跳过空白页",
+                        variable=self.screen_pages).pack(anchor=W, pady=3)
+        ttk.Checkbutton(ocr_opts_frame, text="重复页 (如重复的封面) 复用之前页面的识别结果",
+                        variable=self.dedup_pages).pack(anchor=W, pady=3)
+        ttk.Checkbutton(ocr_opts_frame, text=f"使用本机 OCR 服务 ({DEFAULT_SERVER_URL}，模型常驻；未启动时在本进程加载)",
+                        variable=self.use_model_server).pack(anchor=W, pady=3)
 
         # 预处理选项
         preproc_opts_frame = ttk.Frame(opts_notebook, padding=10)
@@ -284,29 +196,21 @@ class PDFOCRApp:
         sb.pack(side=RIGHT, fill=Y)
         self.log_text.config(yscrollcommand=sb.set)
 
+        # 日志与进度的缓冲输出端：定时批量刷新，组件只保留最近的行，完整日志写入每次任务的日志文件
+        self.log_sink = BufferedTkLog(self.root, self.log_text, self.total_progress, self.total_progress_label)
+
     # --- UI 更新方法 (保持不变) ---
     def log_message(self, m, level=logging.INFO):
-        def update_log():
-            self.log_text.config(state=NORMAL)
-            timestamp = strftime("%H:%M:%S", localtime())
-            level_str = logging.getLevelName(level)
-            prefix = f"{timestamp} [{level_str}] " if level > logging.INFO else f"{timestamp} - "
-            self.log_text.insert(END, f"{prefix}{m}\n")
-            self.log_text.see(END)
-            self.log_text.config(state=DISABLED)
-            if level == logging.ERROR: logging.error(m)
-            elif level == logging.WARNING: logging.warning(m)
-            else: logging.info(m)
-        try: self.root.after(0, update_log)
-        except RuntimeError: print(f"日志(UI关闭?): {m}")
+        # 可在任意线程调用：日志先进入缓冲区，由 Tk 定时器批量显示 (见 tk_log.py)
+        if self.log_sink is None:
+            print(f"日志: {m}")
+            return
+        self.log_sink.log(m, level)
 
     def update_progress(self, value, text):
-         def update_ui():
-              safe_value = max(0, min(100, int(value)))
-              self.total_progress['value'] = safe_value
-              self.total_progress_label.config(text=text)
-         try: self.root.after(0, update_ui)
-         except RuntimeError: print(f"进度(UI关闭?): {text} ({value}%)")
+        # 只保留最新进度，由 Tk 定时器应用
+        if self.log_sink is not None:
+            self.log_sink.set_progress(value, text)
 
     def update_button_state(self, is_running):
          def update_ui():
@@ -362,8 +266,10 @@ class PDFOCRApp:
         self.running = True
         self.update_button_state(True)
         self.update_progress(0, "准备开始...")
-        self.log_text.config(state=NORMAL); self.log_text.delete(1.0, END); self.log_text.config(state=DISABLED)
+        self.log_sink.clear()
+        log_path = self.log_sink.open_file(run_log_path(self.output_folder.get()))
         self.log_message(">>> 开始 OCR 任务 <<<")
+        if log_path: self.log_message(f"完整日志: {log_path}")
         self.log_message(f"引擎: {self.ocr_engine_choice.get()}, 语言: {self.ocr_language.get()}, 超分={self.use_super_res.get()}, OSD={self.perform_osd.get()}, 裁剪={self.perform_crop.get()}, CLAHE={self.perform_clahe.get()}, 去噪={self.perform_denoise.get()}")
 
         threading.Thread(target=self.process_files_thread, daemon=True).start()
@@ -374,440 +280,49 @@ class PDFOCRApp:
                   self.running = False; self.log_message(">>> 正在尝试取消任务... <<<", logging.WARNING)
         else: self.log_message("没有正在运行的任务。")
 
-    # --- 模型加载与释放 ---
-    def _load_ppstructure_model(self):
-        """按需加载 PP-Structure 模型"""
-        if self.ppstructure_model_instance is None and PPSTRUCTURE_AVAILABLE:
-            self.log_message("首次使用，正在加载 PP-Structure 模型...", logging.INFO)
-            try:
-                # 检查 GPU 可用性
-                use_gpu = paddle.device.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0
-                self.log_message(f"PP-Structure 将使用 {'GPU' if use_gpu else 'CPU'}。", logging.INFO)
-                # 初始化模型
-                self.ppstructure_model_instance = PPStructure(
-                    show_log=False, # 关闭 paddleocr 的日志
-                    use_gpu=use_gpu,
-                    lang=self.ocr_language.get().split('+')[0] # PPStructure 通常用单语言 'ch' 或 'en'
-                )
-                self.log_message("PP-Structure 模型加载成功。", logging.INFO)
-                return True
-            except Exception as e:
-                self.log_message(f"错误：加载 PP-Structure 模型失败: {e}", logging.ERROR)
-                traceback.print_exc()
-                self.ppstructure_model_instance = None
-                return False
-        elif self.ppstructure_model_instance:
-             return True # 已加载
-        else:
-             return False # 不可用
-
-    def _load_carn_model(self):
-        """按需加载 CARN 模型"""
-        if self.carn_model_instance is None and TORCH_AVAILABLE and CARN_MODEL_DEF_AVAILABLE:
-             model_path = self.carn_model_path.get()
-             if not os.path.exists(model_path):
-                  self.log_message(f"错误：CARN 模型权重文件不存在: {model_path}", logging.ERROR)
-                  return False
-             self.log_message(f"首次使用，正在加载 CARN 超分模型: {model_path}", logging.INFO)
-             try:
-                 self.carn_model_instance = CARN() # 假设 CARN 类在 carn.py 中
-                 # 强制在 CPU 上加载和运行
-                 device = torch.device('cpu')
-                 self.carn_model_instance.load_state_dict(torch.load(model_path, map_location=device))
-                 self.carn_model_instance.eval() # 设置为评估模式
-                 self.carn_model_instance.to(device) # 确保模型在 CPU 上
-                 self.log_message("CARN 模型加载成功 (CPU)。", logging.INFO)
-                 return True
-             except Exception as e:
-                  self.log_message(f"错误：加载 CARN 模型失败: {e}", logging.ERROR)
-                  traceback.print_exc()
-                  self.carn_model_instance = None
-                  return False
-        elif self.carn_model_instance:
-             return True # 已加载
-        else:
-             return False # 不可用
-
+    # --- 参数收集 ---
+    def _build_settings(self):
+        """从界面变量收集本次任务的参数；界面上没有的选项 (进程数、OSD 方式、超分分块等) 使用 OCRSettings 默认值"""
+        return OCRSettings(
+            engine=self.ocr_engine_choice.get(),
+            language=self.ocr_language.get(),
+            perform_osd=self.perform_osd.get(),
+            perform_crop=self.perform_crop.get(),
+            perform_clahe=self.perform_clahe.get(),
+            perform_denoise=self.perform_denoise.get(),
+            use_super_res=self.use_super_res.get(),
+            carn_model_path=self.carn_model_path.get(),
+            use_text_layer=self.use_text_layer.get(),
+            adaptive_dpi=self.adaptive_dpi.get(),
+            server_url=DEFAULT_SERVER_URL if self.use_model_server.get() else None,
+            skip_blank_pages=self.screen_pages.get(),
+            dedup_pages=self.dedup_pages.get(),
+        )
 
     # --- 核心处理线程 ---
     def process_files_thread(self):
-        """后台线程处理所有选定的 PDF 文件"""
-        total_files = len(self.input_files)
-        processed_count = 0
-        error_count = 0
-        thread_start_time = perf_counter()
-        engine_choice = self.ocr_engine_choice.get()
-        use_sr = self.use_super_res.get()
-
-        # --- 预加载模型 (如果需要) ---
-        ppstructure_ready = False
-        if engine_choice == "PP-Structure":
-             ppstructure_ready = self._load_ppstructure_model()
-             if not ppstructure_ready:
-                  self.log_message("PP-Structure 加载失败，将自动切换到 Tesseract 备选方案。", logging.ERROR)
-                  engine_choice = "Tesseract" # 切换到备选
-
-        carn_ready = False
-        if use_sr:
-             carn_ready = self._load_carn_model()
-             if not carn_ready:
-                  self.log_message("CARN 模型加载失败，超分辨率功能已禁用。", logging.ERROR)
-                  use_sr = False # 禁用超分
-
-        # --- Tesseract 检查 (如果需要作为备选) ---
-        if engine_choice == "Tesseract" and not TESSERACT_PATH:
-             self.log_message("错误: Tesseract 未配置，无法作为备选方案。", logging.CRITICAL)
-             self.running = False # 停止运行
-             self.update_button_state(False)
-             self.update_progress(0, "错误：OCR引擎不可用")
-             return # 退出线程
-
-        # --- 文件处理循环 ---
+        """后台线程处理所有选定的 PDF 文件 (结果缓存与逐页检查点与 ocr.py 的默认设置一致)"""
+        settings = self._build_settings()
+        runner = OCRBatchRunner(settings, self.output_folder.get(),
+                                log=self.log_message,
+                                progress=self.update_progress,
+                                should_stop=lambda: not self.running)
         try:
-            for idx, file_path in enumerate(self.input_files):
-                if not self.running: self.log_message("任务已被用户取消。"); break
-                file_num = idx + 1
-                base_name = os.path.basename(file_path)
-                self.log_message(f"\n>> 文件 {file_num}/{total_files}: {base_name}", logging.INFO)
-                file_start_time = perf_counter()
-                self.update_progress((idx / total_files) * 100, f"处理中: {base_name} ({file_num}/{total_files})")
-
-                # --- 选择处理流程 ---
-                if engine_choice == "PP-Structure" and ppstructure_ready:
-                    result_text = self.process_pdf_with_ppstructure(file_path, file_num, total_files, use_sr and carn_ready)
-                elif TESSERACT_AVAILABLE: # 使用 Tesseract 作为备选
-                    result_text = self.process_pdf_with_tesseract(file_path, file_num, total_files, use_sr and carn_ready)
-                else: # 没有可用的引擎
-                    result_text = "[错误：没有可用的 OCR 引擎]"
-                    error_count += 1
-
-                if not self.running: self.log_message(f"处理 {base_name} 期间任务被取消。"); break
-
-                # --- 保存结果 ---
-                if result_text is not None:
-                    if "失败" in result_text or "错误" in result_text: error_count += 1; logging.warning(f"文件 {base_name} 处理中遇到问题。")
-                    output_filename = os.path.splitext(base_name)[0] + "_ocr.txt"
-                    output_path = os.path.join(self.output_folder.get(), output_filename)
-                    try:
-                        with open(output_path, "w", encoding="utf-8") as fw: fw.write(result_text)
-                        file_end_time = perf_counter()
-                        self.log_message(f"结果已保存 (耗时 {file_end_time - file_start_time:.2f} 秒): {output_path}")
-                        processed_count += 1
-                    except IOError as e: self.log_message(f"错误：无法保存文件 {output_path}: {e}", logging.ERROR); error_count += 1
-                else: error_count += 1; self.log_message(f"文件 {base_name} 未能处理或被跳过。", logging.WARNING)
-
-        except Exception as e:
-            self.log_message(f"处理文件过程中发生严重错误: {e}\n{traceback.format_exc()}", logging.CRITICAL)
-            error_count = total_files
+            runner.run(self.input_files)
+            if runner.engine_choice != settings.engine:
+                self.ocr_engine_choice.set(runner.engine_choice) # 更新UI反映切换
+            if settings.use_super_res and not runner.carn_ready:
+                self.use_super_res.set(False) # 更新UI反映禁用
         finally:
-            # --- 任务结束 ---
-            thread_end_time = perf_counter()
-            duration = thread_end_time - thread_start_time
-            final_message = ""
-            if not self.running and processed_count < total_files: final_message = f"任务已取消。成功处理 {processed_count} 个文件。"
-            elif error_count > 0: final_message = f"处理完成，共 {total_files} 文件，其中 {error_count} 个失败或含错误。"
-            else: final_message = f"所有 {total_files} 个文件处理完成！"
-            self.log_message(f"\n{final_message} 总耗时: {duration:.2f} 秒。", logging.INFO)
-            self.update_progress(100, final_message)
             self.running = False
             self.update_button_state(False)
-            # 可选：清理模型以释放内存 (如果模型很大)
-            # self.ppstructure_model_instance = None
-            # self.carn_model_instance = None
-            # torch.cuda.empty_cache() # 如果用了 GPU
-
-    # --- 基于 PP-Structure 的处理流程 ---
-    def process_pdf_with_ppstructure(self, path, file_num, total_files, apply_sr):
-        """使用 PP-Structure 处理单个 PDF 文件"""
-        if not self.ppstructure_model_instance: return "[错误: PP-Structure 模型未加载]"
-        doc = None
-        all_page_texts = []
-        try:
-            doc = fitz.open(path)
-            num_pages = len(doc)
-            self.log_message(f"  [PP-Structure] 共 {num_pages} 页")
-
-            for i in range(num_pages):
-                if not self.running: return None
-                page_num = i + 1
-                self.log_message(f"  处理页面 {page_num}/{num_pages} (引擎: PP-Structure)...")
-                page_start_time = perf_counter()
-                progress_val = ((file_num - 1) / total_files + (page_num / num_pages) / total_files) * 100
-                self.update_progress(progress_val, f"文件 {file_num}/{total_files} - 页面 {page_num}/{num_pages} (PP-Structure)...")
-
-                page_content = f"\n--- 第 {page_num} 页 (PP-Structure 处理失败) ---\n"
-                try:
-                    # 1. 获取图像
-                    page = doc.load_page(i)
-                    pix = page.get_pixmap(dpi=300)
-                    img_pil = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    img_cv_bgr = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-                    img_to_process = img_cv_bgr
-
-                    # 2.txt. 应用超分辨率 (如果启用且模型可用)
-                    if apply_sr:
-                        self.log_message("    应用 CARN 超分辨率...")
-                        sr_start_time = perf_counter()
-                        img_to_process = self._apply_carn_super_resolution(img_cv_bgr)
-                        if img_to_process is None:
-                            self.log_message("    CARN 超分失败，使用原始图像。", logging.WARNING)
-                            img_to_process = img_cv_bgr # Fallback
-                        else:
-                             sr_end_time = perf_counter()
-                             self.log_message(f"    CARN 超分完成 (耗时 {sr_end_time - sr_start_time:.2f} 秒)。")
-
-                    # 3. 调用 PP-Structure 模型
-                    self.log_message("    调用 PP-Structure 分析...")
-                    pp_start_time = perf_counter()
-                    # **注意:** PP-Structure 内部可能自带 OSD 和预处理，我们先不进行外部预处理
-                    results = self.ppstructure_model_instance(img_to_process)
-                    pp_end_time = perf_counter()
-                    self.log_message(f"    PP-Structure 分析完成 (耗时 {pp_end_time - pp_start_time:.2f} 秒)。")
-
-
-                    # 4. 解析并格式化结果
-                    page_blocks_text = []
-                    if results:
-                         for item in results:
-                              block_type = item.get('type', 'Unknown').lower()
-                              # PP-Structure 返回的 res 已经是识别结果或表格HTML
-                              res_content = item.get('res', '')
-                              # bbox = item.get('bbox') # 边界框信息
-
-                              if block_type in ['text', 'title', 'list']:
-                                   if isinstance(res_content, tuple) and len(res_content) == 2: # paddleocr >= 2.txt.6 返回 (text, confidence)
-                                       page_blocks_text.append(res_content[0])
-                                   elif isinstance(res_content, str): # 旧版本可能直接返回 str
-                                        page_blocks_text.append(res_content)
-                              elif block_type == 'table':
-                                   # 直接包含表格的 HTML
-                                   page_blocks_text.append(f"\n[表格开始]\n{res_content}\n[表格结束]\n")
-                              elif block_type == 'figure':
-                                   page_blocks_text.append("[图片区域]")
-                              else: # 其他或未知类型
-                                   if isinstance(res_content, tuple) and len(res_content) == 2:
-                                       page_blocks_text.append(f"[{block_type.upper()}]: {res_content[0]}")
-                                   elif isinstance(res_content, str) and res_content:
-                                        page_blocks_text.append(f"[{block_type.upper()}]: {res_content}")
-
-                         page_content = "\n".join(page_blocks_text)
-                    else:
-                         page_content = f"\n--- 第 {page_num} 页 (PP-Structure 未返回结果) ---\n"
-
-
-                except Exception as page_err:
-                    self.log_message(f"  处理页面 {page_num} (PP-Structure) 时发生错误: {page_err}", logging.ERROR)
-                    traceback.print_exc()
-                    page_content = f"\n--- 第 {page_num} 页 (PP-Structure 处理时发生错误: {page_err}) ---\n"
-                finally:
-                    page_end_time = perf_counter()
-                    self.log_message(f"  页面 {page_num} 处理完成 (耗时 {page_end_time - page_start_time:.2f} 秒)。")
-                    all_page_texts.append(page_content)
-
-            return "".join(all_page_texts)
-
-        except fitz.fitz.FileNotFoundError: self.log_message(f"错误：文件未找到 {path}", logging.ERROR); return None
-        except Exception as e: self.log_message(f"处理 PDF (PP-Structure) 时发生严重错误: {e}", logging.CRITICAL); return None
-        finally:
-            if doc: doc.close()
+            self.log_sink.close_file()
 
-    # --- 基于 Tesseract 的处理流程 (备选) ---
-    def process_pdf_with_tesseract(self, path, file_num, total_files, apply_sr):
-        """使用 Tesseract 处理单个 PDF 文件 (备选方案)"""
-        doc = None
-        all_page_texts = []
-        try:
-            doc = fitz.open(path)
-            num_pages = len(doc)
-            self.log_message(f"  [Tesseract] 共 {num_pages} 页")
-
-            for i in range(num_pages):
-                if not self.running: return None
-                page_num = i + 1
-                self.log_message(f"  处理页面 {page_num}/{num_pages} (引擎: Tesseract)...")
-                page_start_time = perf_counter()
-                progress_val = ((file_num - 1) / total_files + (page_num / num_pages) / total_files) * 100
-                self.update_progress(progress_val, f"文件 {file_num}/{total_files} - 页面 {page_num}/{num_pages} (Tesseract)...")
-
-                page_content = f"\n--- 第 {page_num} 页 (Tesseract 处理失败) ---\n"
-                try:
-                    # 1. 获取图像
-                    page = doc.load_page(i)
-                    pix = page.get_pixmap(dpi=300)
-                    img_pil = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    img_cv_bgr = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-                    img_to_process = img_cv_bgr
-
-                     # 2.txt. 应用超分辨率 (如果启用且模型可用)
-                    if apply_sr:
-                        self.log_message("    应用 CARN 超分辨率...")
-                        sr_start_time = perf_counter()
-                        img_to_process = self._apply_carn_super_resolution(img_cv_bgr)
-                        if img_to_process is None:
-                            self.log_message("    CARN 超分失败，使用原始图像。", logging.WARNING)
-                            img_to_process = img_cv_bgr # Fallback
-                        else:
-                             sr_end_time = perf_counter()
-                             self.log_message(f"    CARN 超分完成 (耗时 {sr_end_time - sr_start_time:.2f} 秒)。")
-
-
-                    # 3. 预处理 I: 旋转和裁剪 (依赖 Tesseract OSD)
-                    if TESSERACT_AVAILABLE: # 只有 Tesseract 可用时才执行 Tesseract 的预处理
-                        img_layout = self._preprocess_for_layout(img_to_process)
-                        if img_layout is None: raise ValueError("布局预处理失败 (旋转/裁剪)")
-                    else: # 如果 Tesseract 不可用，无法执行 OSD/裁剪
-                         img_layout = img_to_process
-                         self.log_message("    跳过旋转和裁剪 (Tesseract 不可用)。", logging.WARNING)
-
-
-                    # 4. 预处理 II: OCR 准备
-                    self.log_message("    进行 OCR 预处理...")
-                    img_ocr_ready_pil = self._preprocess_for_ocr(img_layout)
-
-                    if img_ocr_ready_pil is None:
-                        page_content = f"\n--- 第 {page_num} 页 (图像预处理失败) ---\n"
-                    else:
-                        # 5. 执行整页 OCR (Tesseract)
-                        self.log_message("    执行整页 Tesseract OCR...")
-                        ocr_start_time = perf_counter()
-                        # 整页 OCR 建议使用 PSM 3 或 11
-                        ocr_result = self._ocr_text_block_tesseract(img_ocr_ready_pil, psm=3)
-                        ocr_end_time = perf_counter()
-                        self.log_message(f"    Tesseract OCR 完成 (耗时 {ocr_end_time - ocr_start_time:.2f} 秒)。")
-
-                        # 6. (可选) 公式处理
-                        # if self.include_formulas.get() and "错误" not in ocr_result:
-                        #    self.log_message("    尝试检测公式...")
-                        #    fm = self.detect_formulas_tesseract(img_ocr_ready_pil) # 公式检测可能需要 PIL
-                        #    ocr_result = self.replace_formulas(ocr_result, fm)
-
-                        page_content = f"\n--- 第 {page_num} 页 ---\n{ocr_result}\n"
-
-                except Exception as page_err:
-                    self.log_message(f"  处理页面 {page_num} (Tesseract) 时发生错误: {page_err}", logging.ERROR)
-                    traceback.print_exc()
-                    page_content = f"\n--- 第 {page_num} 页 (Tesseract 处理时发生错误: {page_err}) ---\n"
-                finally:
-                    page_end_time = perf_counter()
-                    self.log_message(f"  页面 {page_num} 处理完成 (耗时 {page_end_time - page_start_time:.2f} 秒)。")
-                    all_page_texts.append(page_content)
-
-            return "".join(all_page_texts)
-
-        except fitz.fitz.FileNotFoundError: self.log_message(f"错误：文件未找到 {path}", logging.ERROR); return None
-        except Exception as e: self.log_message(f"处理 PDF (Tesseract) 时发生严重错误: {e}", logging.CRITICAL); return None
-        finally:
-            if doc: doc.close()
 
-
-    # --- 超分辨率辅助方法 ---
-    def _apply_carn_super_resolution(self, img_cv_bgr):
-        """应用 CARN 模型进行超分辨率处理"""
-        if not self.carn_model_instance: return None
-        try:
-            device = torch.device('cpu') # 强制使用 CPU
-            # 将 OpenCV BGR 图像转换为 PyTorch Tensor
-            # 注意：ToTensor() 会将 HWC [0,255] 转换为 CHW [0,1]
-            img_pil = Image.fromarray(cv2.cvtColor(img_cv_bgr, cv2.COLOR_BGR2RGB))
-            lr_tensor = ToTensor()(img_pil).unsqueeze(0).to(device)
-
-            with torch.no_grad():
-                sr_tensor = self.carn_model_instance(lr_tensor)
-
-            # 将结果 Tensor 转回 OpenCV BGR 图像
-            # ToPILImage() 需要 CHW [0,1] Tensor
-            sr_image_pil = ToPILImage()(sr_tensor.squeeze(0).cpu())
-            sr_image_cv_bgr = cv2.cvtColor(np.array(sr_image_pil), cv2.COLOR_RGB2BGR)
-            return sr_image_cv_bgr
-        except Exception as e:
-            self.log_message(f"    CARN 超分辨率处理失败: {e}", logging.ERROR)
-            return None
-
-
-    # --- Tesseract 相关辅助方法 (如果需要备选) ---
-    def _preprocess_for_layout(self, img_cv_bgr):
-        """Tesseract 流程的预处理 I: 旋转和裁剪"""
-        processed_img = img_cv_bgr.copy()
-        if self.perform_osd.get() and TESSERACT_AVAILABLE:
-            rotated_img = self._run_osd_and_rotate(processed_img)
-            if rotated_img is not None: processed_img = rotated_img
-            else: self.log_message("    OSD 旋转失败，跳过。", logging.WARNING)
-        if self.perform_crop.get():
-            cropped_img = self._crop_borders(processed_img)
-            if cropped_img is not None and cropped_img.shape[0] > 10 and cropped_img.shape[1] > 10: processed_img = cropped_img
-            else: self.log_message("    边界裁剪失败或区域过小，跳过。", logging.WARNING)
-        return processed_img
-
-    def _preprocess_for_ocr(self, img_cv_bgr):
-        """Tesseract 流程的预处理 II: 灰度, CLAHE, 去噪, 二值化"""
-        try:
-            gray = cv2.cvtColor(img_cv_bgr, cv2.COLOR_BGR2GRAY)
-            processed_gray = gray
-            if self.perform_clahe.get():
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)); processed_gray = clahe.apply(processed_gray)
-            if self.perform_denoise.get():
-                processed_gray = cv2.fastNlMeansDenoising(processed_gray, None, h=10, templateWindowSize=7, searchWindowSize=21)
-            binary = cv2.adaptiveThreshold(processed_gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 7)
-            return Image.fromarray(binary)
-        except Exception as e: self.log_message(f"      OCR 预处理失败: {e}", logging.ERROR); return None
-
-    def _run_osd_and_rotate(self, image_cv_bgr):
-        """Tesseract OSD 检测方向并旋转"""
-        if not TESSERACT_AVAILABLE: return image_cv_bgr # 如果 Tesseract 不可用，返回原图
-        try:
-            self.log_message("    步骤 1/2.txt: 方向检测与旋转 (OSD)...")
-            gray = cv2.cvtColor(image_cv_bgr, cv2.COLOR_BGR2GRAY)
-            osd_data = pytesseract.image_to_osd(gray, config='--psm 0', output_type=Output.DICT)
-            angle = osd_data.get('rotate', 0); script = osd_data.get('script', 'Unknown')
-            self.log_message(f"    OSD: 角度={angle}, 脚本={script}")
-            if angle != 0 and abs(angle) < 90: # 仅旋转非 90/180/270 的小角度？或全部旋转
-                self.log_message(f"    旋转 {-angle} 度...")
-                (h, w) = image_cv_bgr.shape[:2]; center = (w // 2, h // 2)
-                M = cv2.getRotationMatrix2D(center, -angle, 1.0)
-                rotated = cv2.warpAffine(image_cv_bgr, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
-                return rotated
-            else: self.log_message("    无需旋转或角度无效。"); return image_cv_bgr
-        except (TesseractNotFoundError, TesseractError) as e: self.log_message(f"    Tesseract OSD 失败: {str(e).split(None,1)[0]}", logging.ERROR); return image_cv_bgr
-        except Exception as e: self.log_message(f"    OSD 或旋转出错: {e}", logging.ERROR); return image_cv_bgr
-
-    def _crop_borders(self, image_cv_bgr, border_threshold=200, min_area_ratio=0.5):
-        """检测并裁剪图像边框"""
-        try:
-            self.log_message("    步骤 2.txt/2.txt: 裁剪边界...")
-            gray = cv2.cvtColor(image_cv_bgr, cv2.COLOR_BGR2GRAY)
-            _, thresh = cv2.threshold(gray, border_threshold, 255, cv2.THRESH_BINARY_INV)
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if not contours: self.log_message("    边界裁剪：未找到轮廓。"); return image_cv_bgr
-            max_contour = max(contours, key=cv2.contourArea); area = cv2.contourArea(max_contour); img_area = image_cv_bgr.shape[0] * image_cv_bgr.shape[1]
-            if area / img_area < min_area_ratio: self.log_message(f"    边界裁剪：内容区域过小 ({area/img_area:.2f})，跳过。"); return image_cv_bgr
-            x, y, w, h = cv2.boundingRect(max_contour); padding = 5
-            x1, y1 = max(0, x - padding), max(0, y - padding)
-            x2, y2 = min(image_cv_bgr.shape[1], x + w + padding), min(image_cv_bgr.shape[0], y + h + padding)
-            cropped = image_cv_bgr[y1:y2, x1:x2]
-            self.log_message("    边界裁剪完成。")
-            return cropped
-        except Exception as e: self.log_message(f"    边界裁剪出错: {e}", logging.ERROR); return image_cv_bgr
-
-    def _ocr_text_block_tesseract(self, img_block_pil, psm=3):
-        """使用 Tesseract 对图像块执行 OCR"""
-        if not TESSERACT_AVAILABLE: return "[错误: Tesseract 不可用]"
-        try:
-            lang = self.ocr_language.get()
-            # 注意：Tesseract 语言格式是 chi_sim+eng
-            lang_tess = lang if '+' in lang else lang.replace('ch','chi_sim') # 简单转换
-            config = f'--oem 3 --psm {psm}'
-            text = pytesseract.image_to_string(img_block_pil, lang=lang_tess, config=config)
-            return text.strip() if text else "[空]"
-        except (TesseractNotFoundError, TesseractError) as e:
-            error_detail = str(e).split('\n', 1)[0]; self.log_message(f"    OCR (Tesseract) 失败: {error_detail}", logging.ERROR); return f"[OCR 错误: {error_detail}]"
-        except Exception as e: self.log_message(f"    OCR (Tesseract) 意外错误: {e}", logging.ERROR); return f"[OCR 错误: {e}]"
-
-
-# --- 主程序入口 ---
 if __name__ == "__main__":
     root = Tk()
     if platform.system() == "Windows":
         try: from ctypes import windll; windll.shcore.SetProcessDpiAwareness(1)
         except Exception as e: print(f"无法设置 DPI 感知: {e}")
     app = PDFOCRApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
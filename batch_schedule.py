@@ -0,0 +1,159 @@
+# 文件路径：batch_schedule.py
+# -*- coding: utf-8 -*-
+"""
+batch_schedule.py — OCR 批处理的页码范围与任务调度
+原来批处理按输入列表顺序处理每个文件的全部页面，排在前面的 2000 页档案会让后面几十张单页发票等很久。
+BatchSchedule 决定处理哪些页面以及以什么顺序提交：
+  - 页码范围："1-5,8,12-" (1 起始，"12-" 表示到最后一页，"-3" 表示前 3 页)，可统一指定或按文件指定；
+  - 文件顺序："input" 输入顺序，"sjf" 待处理页数少的文件优先 (短作业优先)，
+    "priority" 按用户给定的优先级 (数值大的先处理，相同时按输入顺序)；
+  - 预览：preview_pages=N 时先处理每个文件的前 N 页，再处理各文件剩余的页面。
+同一文件的页面始终按页码顺序提交，逐页输出与检查点不受调度影响。
+"""
+
+import os
+
+SCHEDULE_ORDERS = {"input": "输入顺序", "sjf": "页数少的文件优先", "priority": "按优先级"}
+
+
+def parse_page_ranges(spec):
+    """
+    解析页码范围 "1-5,8,12-" -> [(1, 5), (8, 8), (12, None)]；空字符串或 None 返回 None (全部页面)。
+    格式错误时抛出 ValueError。
+    """
+    if spec is None or not str(spec).strip():
+        return None
+    ranges = []
+    for part in str(spec).replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start, _, end = part.partition("-")
+                first = int(start) if start.strip() else 1
+                last = int(end) if end.strip() else None
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f"无法解析页码范围 '{part}' (格式如 1-5,8,12-)")
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"无效的页码范围 '{part}'")
+        ranges.append((first, last))
+    return ranges or None
+
+
+def select_pages(ranges, num_pages):
+    """页码范围在 num_pages 页的文件中选中的页码 (1 起始，升序)；ranges 为 None 时为全部页面"""
+    if ranges is None:
+        return list(range(1, num_pages + 1))
+    selected = set()
+    for first, last in ranges:
+        selected.update(range(first, min(num_pages, last if last is not None else num_pages) + 1))
+    return sorted(selected)
+
+
+def parse_assignments(items, convert=str):
+    """
+    解析命令行的 "文件=值" 列表 -> {文件: 值}；文件可以是路径或文件名。
+    用最后一个 "=" 分隔 (路径中可以有 "=")，值由 convert 转换，格式错误时抛出 ValueError。
+    """
+    assignments = {}
+    for item in items or ():
+        path, sep, value = item.rpartition("=")
+        if not sep or not path.strip():
+            raise ValueError(f"格式应为 文件=值: '{item}'")
+        assignments[path.strip()] = convert(value.strip())
+    return assignments
+
+
+def split_assignments(text):
+    """界面中一行输入的多个 "文件=值" (用 ";" 分隔，值中的 "," 属于页码范围) -> 列表，供 parse_assignments 解析"""
+    return [item.strip() for item in str(text or "").replace("；", ";").split(";") if item.strip()]
+
+
+def _normalize(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _index_by_file(mapping):
+    """
+    按文件指定的值 -> ({规范化的完整路径: 值}, {文件名: 值})。
+    含目录的键只按完整路径匹配 (相对路径相对当前目录)；不含目录的键按文件名匹配，
+    同名的文件 (在不同目录中) 都使用这个值。
+    """
+    by_path, by_name = {}, {}
+    for key, value in mapping.items():
+        if os.path.basename(key) != key:
+            by_path[_normalize(key)] = value
+        else:
+            by_name[os.path.normcase(key)] = value
+    return by_path, by_name
+
+
+class BatchSchedule:
+    """ 一次批处理的页码范围、文件顺序与预览设置 """
+
+    def __init__(self, order="input", pages=None, file_pages=None, priorities=None, preview_pages=0):
+        if order not in SCHEDULE_ORDERS:
+            raise ValueError(f"未知的调度顺序: {order}")
+        self.order = order
+        self.pages = parse_page_ranges(pages)  # 所有文件的页码范围 (None 为全部页面)
+        # 按文件指定的页码范围/优先级 {路径或文件名: 值}，优先于统一的范围
+        self.file_pages = {key: parse_page_ranges(value) for key, value in (file_pages or {}).items()}
+        self.priorities = dict(priorities or {})
+        self._file_pages_index = _index_by_file(self.file_pages)
+        self._priorities_index = _index_by_file(self.priorities)
+        self.preview_pages = max(0, int(preview_pages or 0))
+
+    @staticmethod
+    def _lookup(index, path, default=None):
+        """先按完整路径、再按文件名查找按文件指定的值 (index 见 _index_by_file)"""
+        by_path, by_name = index
+        normalized = _normalize(path)
+        if normalized in by_path:
+            return by_path[normalized]
+        return by_name.get(os.path.basename(normalized), default)
+
+    def page_ranges_for(self, path):
+        return self._lookup(self._file_pages_index, path, self.pages)
+
+    def priority_for(self, path):
+        return self._lookup(self._priorities_index, path, 0)
+
+    @property
+    def is_default(self):
+        return (self.order == "input" and self.pages is None and not self.file_pages
+                and not self.preview_pages)
+
+    @property
+    def description(self):
+        parts = [SCHEDULE_ORDERS[self.order]]
+        if self.pages is not None or self.file_pages:
+            parts.append("按页码范围")
+        if self.preview_pages:
+            parts.append(f"先预览每个文件前 {self.preview_pages} 页")
+        return ", ".join(parts)
+
+    def order_files(self, files):
+        """
+        files: [(文件序号, 路径, 待处理页数)] (输入顺序)。返回按调度顺序排列的文件序号。
+        sort 是稳定的，相同页数/优先级的文件保持输入顺序。
+        """
+        if self.order == "sjf":
+            files = sorted(files, key=lambda f: f[2])
+        elif self.order == "priority":
+            files = sorted(files, key=lambda f: -self.priority_for(f[1]))
+        return [file_index for file_index, _, _ in files]
+
+    def order_tasks(self, tasks_by_file, file_order):
+        """
+        tasks_by_file: {文件序号: 按页码排列的任务}。按 file_order 拼接所有任务；
+        preview_pages > 0 时先是每个文件的前 N 个任务，再是各文件其余的任务。
+        返回 (任务列表, 预览阶段的任务数)。
+        """
+        if not self.preview_pages:
+            return [task for index in file_order for task in tasks_by_file[index]], 0
+        preview = [task for index in file_order for task in tasks_by_file[index][:self.preview_pages]]
+        rest = [task for index in file_order for task in tasks_by_file[index][self.preview_pages:]]
+        return preview + rest, (len(preview) if rest else 0)
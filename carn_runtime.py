@@ -0,0 +1,413 @@
+# 文件路径：carn_runtime.py
+# -*- coding: utf-8 -*-
+"""
+carn_runtime.py — CARN 超分辨率推理
+主要功能：
+1. CarnUpscaler: 分块 (tile) 推理。
+   - 输入图像按 tile_size 切块，相邻块重叠 tile_overlap 像素，输出在重叠区按线性权重融合，避免接缝。
+   - 按块行处理，已完成的输出行立即写入结果并释放浮点累加缓冲区，
+     峰值内存由块大小决定 (加上最终输出图像本身)，与页面尺寸无关。
+   - text_only=True 时只对检测到文字的块做 CARN 超分，其余块用双三次插值放大。
+   - 同一块行中尺寸相同的块合并为一个 batch 前向 (batch_size 可配置)，
+     在 torch.inference_mode 下执行，可选 channels_last 内存布局。
+   - 统计处理的图像数、块数和推理耗时，供运行结束时输出吞吐量。
+2. detect_text_mask: 基于形态学梯度的快速文字区域检测 (无需 OCR 模型)。
+3. 模型变体导出与加载：
+   - export_carn_variants: 由 fp32 权重 (carn.pth) 导出 TorchScript (trace + freeze) 与
+     int8 静态量化 (FX 图模式，文字图像块校准) 两个变体，
+     在测试图像块上计算相对 fp32 输出的 PSNR 并测速，结果写入 {权重名}.variants.json。
+   - load_carn_variant: variant="auto" 时按清单选择 PSNR 达标且最快的变体；
+     清单缺失或与权重文件不匹配时回退到 fp32 eager 模型。
+依赖 torch，仅在启用超分时导入。
+
+用法：python carn_runtime.py export carn.pth [--fixtures 样本图像目录]
+"""
+
+import os
+import sys
+import copy
+import json
+import glob
+import logging
+import argparse
+import warnings
+from time import perf_counter
+
+import cv2
+import numpy as np
+import torch
+
+DEFAULT_TILE_SIZE = 256
+DEFAULT_TILE_OVERLAP = 16
+DEFAULT_BATCH_SIZE = 4
+
+CARN_VARIANTS = ("fp32", "torchscript", "int8")
+VARIANT_SUFFIXES = {"torchscript": ".ts.pt", "int8": ".int8.pt"}
+VARIANTS_MANIFEST_SUFFIX = ".variants.json"
+DEFAULT_MIN_PSNR = 35.0  # 相对 fp32 输出的 PSNR 下限 (dB)，低于此值的变体不会被自动选用
+
+
+def detect_text_mask(img_cv_bgr, min_height=6, max_height_ratio=0.2, margin=8):
+    """
+    快速标出可能含文字的区域：形态学梯度 + Otsu 二值化 + 水平闭运算连成文字行，
+    保留尺寸像文字行的连通区域。返回与输入同尺寸的 uint8 掩码 (非 0 为文字)。
+    """
+    gray = cv2.cvtColor(img_cv_bgr, cv2.COLOR_BGR2GRAY)
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    mask = np.zeros(gray.shape, dtype=np.uint8)
+    max_height = max(min_height, int(gray.shape[0] * max_height_ratio))
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if min_height <= h <= max_height and w >= h:
+            cv2.rectangle(mask, (max(0, x - margin), max(0, y - margin)), (x + w + margin, y + h + margin), 255, -1)
+    return mask
+
+
+def _tile_starts(length, tile, overlap):
+    """一维切块起点：步长 tile - overlap，最后一块与边界对齐"""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, tile - overlap))
+    starts.append(length - tile)
+    return starts
+
+
+def _blend_ramp(length, ramp, fade_in, fade_out):
+    """一维融合权重：与相邻块重叠的一侧在 ramp 像素内线性升/降，图像边界一侧保持 1"""
+    weights = np.ones(length, dtype=np.float32)
+    ramp = min(ramp, length // 2)
+    if ramp > 0:
+        edge = np.arange(1, ramp + 1, dtype=np.float32) / (ramp + 1)
+        if fade_in:
+            weights[:ramp] = edge
+        if fade_out:
+            weights[-ramp:] = edge[::-1]
+    return weights
+
+
+class CarnUpscaler:
+    """ 对 cv2 BGR 图像执行分块 CARN 超分，返回放大 scale 倍的 BGR uint8 图像 """
+
+    def __init__(self, model, scale=3, tile_size=DEFAULT_TILE_SIZE, tile_overlap=DEFAULT_TILE_OVERLAP,
+                 text_only=False, batch_size=DEFAULT_BATCH_SIZE, channels_last=False, device="cpu"):
+        self.scale = scale
+        self.tile_size = max(16, int(tile_size))
+        self.tile_overlap = max(0, min(int(tile_overlap), self.tile_size // 4))
+        self.text_only = text_only
+        self.batch_size = max(1, int(batch_size))  # 峰值内存约与 tile_size² × batch_size 成正比
+        self.channels_last = channels_last
+        self.device = torch.device(device)
+        self.model = model.to(memory_format=torch.channels_last) if channels_last else model
+        self.images = 0  # 统计：处理过的图像数、块数、实际经过 CARN 的块数、推理耗时
+        self.tiles_total = 0
+        self.tiles_sr = 0
+        self.sr_seconds = 0.0
+
+    def _infer_batch(self, tiles_bgr):
+        """一组同尺寸的块合并为一个 batch 推理，返回放大后的 BGR float32 数组列表 (0~1)"""
+        start = perf_counter()
+        batch_rgb = np.stack([tile[:, :, ::-1] for tile in tiles_bgr])  # N,H,W,3
+        lr_tensor = torch.from_numpy(batch_rgb).to(self.device).permute(0, 3, 1, 2).float().div_(255.0)
+        lr_tensor = lr_tensor.contiguous(
+            memory_format=torch.channels_last if self.channels_last else torch.contiguous_format)
+        with torch.inference_mode():
+            sr_tensor = self.model(lr_tensor)
+            sr = sr_tensor.clamp_(0.0, 1.0).permute(0, 2, 3, 1).cpu().numpy()
+        self.sr_seconds += perf_counter() - start
+        return [tile[:, :, ::-1] for tile in sr]
+
+    def _infer_row(self, tiles):
+        """对一个块行中需要超分的块分组批量推理。tiles: [(x0, 块图像)]，返回 {x0: 放大结果}"""
+        by_shape = {}
+        for x0, tile in tiles:
+            by_shape.setdefault(tile.shape, []).append((x0, tile))
+        results = {}
+        for group in by_shape.values():
+            for i in range(0, len(group), self.batch_size):
+                chunk = group[i:i + self.batch_size]
+                for (x0, _), tile_sr in zip(chunk, self._infer_batch([tile for _, tile in chunk])):
+                    results[x0] = tile_sr
+        return results
+
+    def _resize_tile(self, tile_bgr):
+        """非文字块：双三次插值放大"""
+        h, w = tile_bgr.shape[:2]
+        up = cv2.resize(tile_bgr, (w * self.scale, h * self.scale), interpolation=cv2.INTER_CUBIC)
+        return up.astype(np.float32) / 255.0
+
+    def upscale(self, img_cv_bgr):
+        s = self.scale
+        self.images += 1
+        height, width = img_cv_bgr.shape[:2]
+        out = np.empty((height * s, width * s, 3), dtype=np.uint8)
+        text_mask = detect_text_mask(img_cv_bgr) if self.text_only else None
+
+        ys = _tile_starts(height, self.tile_size, self.tile_overlap)
+        xs = _tile_starts(width, self.tile_size, self.tile_overlap)
+        ramp = self.tile_overlap * s
+        # 浮点累加缓冲区只覆盖尚未写出的输出行 [band_start, band_start + len(acc))
+        band_start = 0
+        acc = np.zeros((0, width * s, 3), dtype=np.float32)
+        weight_acc = np.zeros((0, width * s, 1), dtype=np.float32)
+        for row, y0 in enumerate(ys):
+            y1 = min(y0 + self.tile_size, height)
+            needed = y1 * s - band_start
+            if needed > acc.shape[0]:
+                extra = needed - acc.shape[0]
+                acc = np.concatenate([acc, np.zeros((extra, width * s, 3), dtype=np.float32)])
+                weight_acc = np.concatenate([weight_acc, np.zeros((extra, width * s, 1), dtype=np.float32)])
+            wy = _blend_ramp((y1 - y0) * s, ramp, y0 > 0, y1 < height)
+            r0 = y0 * s - band_start
+            row_tiles = [(x0, img_cv_bgr[y0:y1, x0:min(x0 + self.tile_size, width)]) for x0 in xs]
+            sr_tiles = self._infer_row([(x0, tile) for x0, tile in row_tiles
+                                        if text_mask is None or text_mask[y0:y1, x0:x0 + tile.shape[1]].any()])
+            self.tiles_total += len(row_tiles)
+            self.tiles_sr += len(sr_tiles)
+            for x0, tile in row_tiles:
+                x1 = x0 + tile.shape[1]
+                tile_sr = sr_tiles[x0] if x0 in sr_tiles else self._resize_tile(tile)
+                wx = _blend_ramp((x1 - x0) * s, ramp, x0 > 0, x1 < width)
+                weights = wy[:, None, None] * wx[None, :, None]
+                acc[r0:r0 + (y1 - y0) * s, x0 * s:x1 * s] += tile_sr * weights
+                weight_acc[r0:r0 + (y1 - y0) * s, x0 * s:x1 * s] += weights
+
+            # 下一块行起点之前的输出行不会再有贡献，写出并释放
+            flush_to = ys[row + 1] * s if row + 1 < len(ys) else height * s
+            n = flush_to - band_start
+            np.clip(acc[:n] / weight_acc[:n] * 255.0 + 0.5, 0, 255, out=acc[:n])
+            out[band_start:flush_to] = acc[:n]
+            acc = acc[n:]
+            weight_acc = weight_acc[n:]
+            band_start = flush_to
+        return out
+
+
+# --- 模型变体导出与加载 ---
+def variant_path(model_path, variant):
+    """变体文件路径：carn.pth -> carn.ts.pt / carn.int8.pt；fp32 即原权重文件"""
+    if variant == "fp32":
+        return model_path
+    return os.path.splitext(model_path)[0] + VARIANT_SUFFIXES[variant]
+
+
+def manifest_path(model_path):
+    return os.path.splitext(model_path)[0] + VARIANTS_MANIFEST_SUFFIX
+
+
+def _weights_identity(model_path):
+    st = os.stat(model_path)
+    return {"size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+def load_fp32_model(model_path):
+    from carn import CARN
+    model = CARN()
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    return model.eval()
+
+
+def make_fixture_tiles(count=8, tile_size=96, fixtures_dir=None, seed=0):
+    """
+    精度检查/量化校准用的 BGR uint8 图像块。
+    fixtures_dir 给定时从其中的图像随机裁块；否则生成模拟低分辨率扫描的文字块 (不同字号、粗细、模糊和噪声)。
+    """
+    rng = np.random.RandomState(seed)
+    tiles = []
+    if fixtures_dir:
+        paths = sorted(p for ext in ("*.png", "*.jpg", "*.jpeg", "*.bmp", "*.tif", "*.tiff")
+                       for p in glob.glob(os.path.join(fixtures_dir, ext)))
+        images = [img for img in (cv2.imread(p) for p in paths) if img is not None
+                  and img.shape[0] >= tile_size and img.shape[1] >= tile_size]
+        for i in range(count if images else 0):
+            img = images[i % len(images)]
+            y = rng.randint(0, img.shape[0] - tile_size + 1)
+            x = rng.randint(0, img.shape[1] - tile_size + 1)
+            tiles.append(np.ascontiguousarray(img[y:y + tile_size, x:x + tile_size]))
+        if tiles:
+            return tiles
+    words = ["OCR", "CARN", "Invoice 2024", "page 17", "Total: 3,480.50", "the quick brown fox", "x^2 + y^2"]
+    for i in range(count):
+        tile = np.full((tile_size, tile_size, 3), 255 - rng.randint(0, 40), dtype=np.uint8)
+        y = 12
+        while y < tile_size:
+            scale = rng.uniform(0.3, 0.7)
+            ink = int(rng.randint(0, 80))
+            cv2.putText(tile, words[rng.randint(len(words))], (rng.randint(-20, 10), y), cv2.FONT_HERSHEY_SIMPLEX,
+                        scale, (ink, ink, ink), 1 + int(scale > 0.55), cv2.LINE_AA)
+            y += int(22 * scale) + rng.randint(4, 10)
+        tile = cv2.GaussianBlur(tile, (3, 3), rng.uniform(0.3, 1.0))
+        noise = rng.normal(0, 4, tile.shape)
+        tiles.append(np.clip(tile + noise, 0, 255).astype(np.uint8))
+    return tiles
+
+
+def _tiles_to_tensor(tiles_bgr):
+    batch_rgb = np.stack([tile[:, :, ::-1] for tile in tiles_bgr])
+    return torch.from_numpy(np.ascontiguousarray(batch_rgb)).permute(0, 3, 1, 2).float().div_(255.0)
+
+
+def psnr(reference, output):
+    """两组 0~1 浮点输出之间的 PSNR (dB)；完全一致时返回 inf"""
+    mse = torch.mean((reference.clamp(0, 1) - output.clamp(0, 1)) ** 2).item()
+    return float("inf") if mse == 0 else 10.0 * np.log10(1.0 / mse)
+
+
+def _seconds_per_tile(model, lr, repeats=3):
+    """多次前向取最短耗时，除以块数"""
+    best = None
+    with torch.inference_mode():
+        model(lr[:1])  # 预热 (TorchScript 首次调用会做图优化)
+        for _ in range(repeats):
+            start = perf_counter()
+            model(lr)
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best / lr.shape[0]
+
+
+def _quantize_int8(model, calibration):
+    """FX 图模式静态量化：卷积/ReLU/拼接全部量化为 int8，用文字图像块校准激活范围"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+    engines = torch.backends.quantized.supported_engines
+    engine = "x86" if "x86" in engines else ("fbgemm" if "fbgemm" in engines else "qnnpack")
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), (calibration[:1],))
+    with torch.inference_mode():
+        for i in range(0, calibration.shape[0], 4):
+            prepared(calibration[i:i + 4])
+    return convert_fx(prepared), engine
+
+
+def export_carn_variants(model_path, fixtures_dir=None, num_tiles=16, tile_size=96, log=None):
+    """
+    由 fp32 权重导出 TorchScript 与 int8 变体，并在测试图像块上检查精度、测量速度。
+    校准块与测试块使用不同的随机种子，避免量化参数"见过"测试数据。
+    返回写入清单的字典。
+    """
+    log = log or (lambda m, level=logging.INFO: logging.log(level, m))
+    model = load_fp32_model(model_path)
+    calibration = _tiles_to_tensor(make_fixture_tiles(num_tiles, tile_size, fixtures_dir, seed=1))
+    test_lr = _tiles_to_tensor(make_fixture_tiles(num_tiles, tile_size, fixtures_dir, seed=2))
+    with torch.inference_mode():
+        reference = model(test_lr)
+
+    variants = {"fp32": {"file": os.path.basename(model_path), "psnr": float("inf"),
+                         "seconds_per_tile": _seconds_per_tile(model, test_lr)}}
+    quant_engine = None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # torch.ao.quantization / jit.trace 的弃用与 trace 提示
+        for variant in ("torchscript", "int8"):
+            try:
+                if variant == "int8":
+                    source, quant_engine = _quantize_int8(model, calibration)
+                else:
+                    source = model
+                with torch.inference_mode():
+                    traced = torch.jit.freeze(torch.jit.trace(source, calibration[:2]))
+                path = variant_path(model_path, variant)
+                traced.save(path)
+                loaded = torch.jit.load(path, map_location="cpu")  # 用保存后再加载的模型检查，确保文件可用
+                with torch.inference_mode():
+                    value = psnr(reference, loaded(test_lr))
+                variants[variant] = {"file": os.path.basename(path), "psnr": value,
+                                     "seconds_per_tile": _seconds_per_tile(loaded, test_lr)}
+            except Exception as e:
+                log(f"导出 {variant} 变体失败: {e}", logging.ERROR)
+
+    fp32_speed = variants["fp32"]["seconds_per_tile"]
+    for name, info in variants.items():
+        log(f"  {name:<12} PSNR {info['psnr']:.2f} dB, 每块 {info['seconds_per_tile'] * 1000:.1f} ms "
+            f"(相对 fp32 加速 {fp32_speed / info['seconds_per_tile']:.2f}x)"
+            f"{'' if info['psnr'] >= DEFAULT_MIN_PSNR else f'  低于 {DEFAULT_MIN_PSNR:.0f} dB，不会被自动选用'}")
+
+    manifest = {"weights": _weights_identity(model_path), "quantized_engine": quant_engine,
+                "fixture": {"tiles": num_tiles, "tile_size": tile_size,
+                            "source": os.path.abspath(fixtures_dir) if fixtures_dir else "synthetic"},
+                "torch": torch.__version__,
+                # JSON 不支持 inf：psnr 为 null 表示输出与 fp32 完全一致
+                "variants": {name: dict(info, psnr=None if info["psnr"] == float("inf") else info["psnr"])
+                             for name, info in variants.items()}}
+    with open(manifest_path(model_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    log(f"变体清单已写入: {manifest_path(model_path)}")
+    return manifest
+
+
+def read_variants_manifest(model_path):
+    """读取与当前权重文件匹配的变体清单；不存在、无法解析或权重已变化时返回 None"""
+    try:
+        with open(manifest_path(model_path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("weights") != _weights_identity(model_path):
+            return None
+        return manifest
+    except (OSError, ValueError):
+        return None
+
+
+def choose_carn_variant(model_path, variant="auto", min_psnr=DEFAULT_MIN_PSNR):
+    """解析要使用的变体名：auto 时选择清单中 PSNR 达标、文件存在且每块耗时最短的变体"""
+    if variant != "auto":
+        return variant
+    manifest = read_variants_manifest(model_path)
+    if not manifest:
+        return "fp32"
+    candidates = []
+    for name, info in manifest.get("variants", {}).items():
+        value = info.get("psnr")
+        if name not in CARN_VARIANTS or (value is not None and value < min_psnr):
+            continue
+        if name != "fp32" and not os.path.exists(variant_path(model_path, name)):
+            continue
+        candidates.append((info.get("seconds_per_tile", float("inf")), name))
+    return min(candidates)[1] if candidates else "fp32"
+
+
+def load_carn_variant(model_path, variant="auto", min_psnr=DEFAULT_MIN_PSNR, log=None):
+    """
+    加载 CARN 模型的指定变体，返回 (模型, 实际使用的变体名)。
+    变体文件加载失败时回退到 fp32 eager 模型。
+    """
+    log = log or (lambda m, level=logging.INFO: logging.log(level, m))
+    chosen = choose_carn_variant(model_path, variant, min_psnr)
+    if chosen != "fp32":
+        path = variant_path(model_path, chosen)
+        try:
+            if chosen == "int8":
+                manifest = read_variants_manifest(model_path) or {}
+                engine = manifest.get("quantized_engine")
+                if engine and engine in torch.backends.quantized.supported_engines:
+                    torch.backends.quantized.engine = engine
+            return torch.jit.load(path, map_location="cpu").eval(), chosen
+        except Exception as e:
+            log(f"加载 CARN {chosen} 变体失败 ({path}): {e}，改用 fp32 模型。", logging.WARNING)
+    return load_fp32_model(model_path), "fp32"
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python carn_runtime.py", description="CARN 模型变体导出")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="导出 TorchScript 与 int8 量化变体并检查精度")
+    p.add_argument("model", nargs="?", default="carn.pth", help="fp32 权重文件 (默认 carn.pth)")
+    p.add_argument("--fixtures", default=None, help="用于校准和精度检查的样本图像目录 (默认生成文字图像块)")
+    p.add_argument("--tiles", type=int, default=16, help="校准块与测试块的数量 (默认 16)")
+    p.add_argument("--tile-size", type=int, default=96, help="测试块边长 (默认 96)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if not os.path.exists(args.model):
+        print(f"错误：CARN 权重文件不存在: {args.model}", file=sys.stderr)
+        return 2
+    export_carn_variants(args.model, args.fixtures, args.tiles, args.tile_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
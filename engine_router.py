@@ -0,0 +1,195 @@
+# 文件路径：engine_router.py
+# -*- coding: utf-8 -*-
+"""
+engine_router.py — 按实测耗时与识别质量为每个文件选择 OCR 引擎 (引擎选择 "auto")
+原来 PP-Structure / Tesseract 在界面中全局选择，只有模型加载失败时才切换。
+干净的单栏文字页 Tesseract 往往快几倍且结果相当，带表格的页面则需要 PP-Structure 的版面分析。
+批处理 (OCRBatchRunner) 先把每个文件的前 sample_pages 个 OCR 页面作为采样页提交 (task.route = SAMPLE_ROUTE)，
+识别引擎对采样页用两种引擎各识别一次，返回 PageSample：各引擎的耗时、平均置信度、字符数、表格数，
+以及两种引擎识别文本的一致程度。采样页全部完成后，EngineRouter 在批处理进程中为每个文件做一次决定：
+  - 采样页中 PP-Structure 检测到表格时，选择 PP-Structure；
+  - 两种引擎的置信度刻度不同 (PP-Structure 为识别分数 ×100，Tesseract 为 MeanTextConf)，不能直接比较，
+    只记录在日志中。质量以两种引擎文本的一致程度衡量：字符二元组重合比例 (不受版面块顺序影响)
+    不低于 AGREEMENT_MIN 时认为质量相当，选择实测更快的引擎；
+  - 不一致时：Tesseract 字符数少于 PP-Structure 的 MIN_TEXT_RATIO 说明漏识别，否则无法判断哪个正确，
+    两种情况都选择 PP-Structure (版面分析更稳健)。
+  - 采样页本身：有表格或文本不一致时输出 PP-Structure 的结果，一致时输出更快的引擎的结果。
+文件的其余页面在提交时指定选中的引擎 (task.route)，进程池/流水线的各个识别进程 (线程) 使用同一个决定，
+并按采样的平均耗时估计节省的时间 (扣除采样时多识别一次的开销)。
+页数少于 SHORT_FILE_PAGES 的文件 (单页发票、图像文件等) 单独采样得不偿失，它们共用一个路由：
+前 sample_pages 个这样的页面采样，之后的小文件都使用其结果。
+"""
+
+import os
+import logging
+from collections import Counter
+
+AUTO_ENGINE = "auto"
+ROUTED_ENGINES = ("Tesseract", "PP-Structure")
+SAMPLE_ROUTE = "sample"  # task.route：两种引擎各识别一次的采样页
+DEFAULT_SAMPLE_PAGES = 2
+AGREEMENT_MIN = 0.85
+MIN_TEXT_RATIO = 0.8
+SHORT_FILE_PAGES = 10
+_SHORT_FILES = "<short>"  # 小文件共用路由的键
+
+
+def text_agreement(text_a, text_b):
+    """
+    两段识别文本的一致程度 (0~1)：去掉空白后字符二元组多重集的 Dice 系数。
+    只看出现了哪些二元组而不看顺序，两种引擎输出版面块的顺序不同不影响结果。
+    """
+    a, b = "".join(text_a.split()), "".join(text_b.split())
+    if not a and not b:
+        return 1.0
+    grams_a = Counter(a[i:i + 2] for i in range(max(1, len(a) - 1)))
+    grams_b = Counter(b[i:i + 2] for i in range(max(1, len(b) - 1)))
+    total = sum(grams_a.values()) + sum(grams_b.values())
+    return 2.0 * sum((grams_a & grams_b).values()) / total if total else 1.0
+
+
+class EngineSample:
+    """ 一个引擎对一个采样页的识别结果统计 """
+
+    def __init__(self, engine, seconds, confidence=None, chars=0, tables=0):
+        self.engine = engine
+        self.seconds = seconds
+        self.confidence = confidence  # 引擎自身的平均置信度 (0~100，各引擎刻度不同)；没有给出时为 None
+        self.chars = chars  # 识别出的非空白字符数
+        self.tables = tables  # 检测到的表格数 (只有 PP-Structure 给出)
+
+
+class PageSample:
+    """ 一个采样页：{引擎: EngineSample} (识别失败的引擎不在其中) 与两种引擎文本的一致程度 """
+
+    def __init__(self, samples, agreement=None):
+        self.samples = samples
+        self.agreement = agreement  # 两种引擎都成功时的 text_agreement，否则为 None
+
+    def output_engine(self):
+        """采样页本身输出哪个引擎的结果 (两种引擎都失败时返回 None)"""
+        if not self.samples:
+            return None
+        if len(self.samples) == 1:
+            return next(iter(self.samples))
+        if self.samples["PP-Structure"].tables or self.agreement < AGREEMENT_MIN:
+            return "PP-Structure"
+        return min(ROUTED_ENGINES, key=lambda e: self.samples[e].seconds)
+
+    def to_dict(self):
+        """转换为 JSON 基本类型 (OCR 服务返回结果时使用)"""
+        return {"agreement": self.agreement,
+                "samples": {engine: vars(sample) for engine, sample in self.samples.items()}}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls({engine: EngineSample(**sample) for engine, sample in values.get("samples", {}).items()},
+                   values.get("agreement"))
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def compare_engines(pages):
+    """pages: [PageSample]。返回 (选中的引擎, 原因)"""
+    tess = [p.samples["Tesseract"] for p in pages if "Tesseract" in p.samples]
+    pp = [p.samples["PP-Structure"] for p in pages if "PP-Structure" in p.samples]
+    if not tess:
+        return "PP-Structure", "Tesseract 采样失败"
+    if not pp:
+        return "Tesseract", "PP-Structure 采样失败"
+    if any(s.tables for s in pp):
+        return "PP-Structure", "采样页含表格"
+    agreement = _mean(p.agreement for p in pages)
+    if agreement is not None and agreement >= AGREEMENT_MIN:
+        faster = min(ROUTED_ENGINES, key=lambda e: _mean(p.samples[e].seconds for p in pages if e in p.samples))
+        return faster, f"两种引擎识别文本一致 {agreement:.0%}，选择更快的引擎"
+    if sum(s.chars for s in tess) < MIN_TEXT_RATIO * sum(s.chars for s in pp):
+        return "PP-Structure", "Tesseract 识别出的文字明显更少"
+    return "PP-Structure", f"两种引擎识别文本差异较大 (一致 {agreement or 0:.0%})"
+
+
+class DocumentRoute:
+    """ 一个文件 (或共用路由的小文件) 的采样记录与路由决定 """
+
+    def __init__(self, name):
+        self.name = name
+        self.reserved = 0  # 已分配的采样页数
+        self.pages = []  # [PageSample]
+        self.sampled_pages = 0  # 完成的采样页数 (含两种引擎都失败的页面)
+        self.engine = None  # 做出决定后选中的引擎
+        self.reason = None
+
+    def samples_of(self, engine):
+        return [p.samples[engine] for p in self.pages if engine in p.samples]
+
+
+class EngineRouter:
+    """ 在批处理进程中分配采样页并为每个文件选择引擎；log(m, level) 用于输出路由决定 """
+
+    def __init__(self, sample_pages=DEFAULT_SAMPLE_PAGES, log=None):
+        self.sample_pages = max(1, int(sample_pages))
+        self.log_message = log or (lambda m, level=logging.INFO: logging.log(level, m))
+        self._routes = {}
+
+    @staticmethod
+    def route_key(file_path, num_pages):
+        """路由键：页数较多的文件各自采样，小文件共用一个路由"""
+        return file_path if num_pages >= SHORT_FILE_PAGES else _SHORT_FILES
+
+    def _route(self, key):
+        route = self._routes.get(key)
+        if route is None:
+            name = f"页数少于 {SHORT_FILE_PAGES} 的文件" if key == _SHORT_FILES else os.path.basename(key)
+            route = self._routes[key] = DocumentRoute(name)
+        return route
+
+    def reserve_sample(self, key):
+        """按任务顺序调用：该路由的采样页还没有分配够时分配一页并返回 True"""
+        route = self._route(key)
+        if route.reserved >= self.sample_pages:
+            return False
+        route.reserved += 1
+        return True
+
+    def record(self, key, page_sample):
+        """记录一个完成的采样页 (PageSample；页面处理出错时为 None)"""
+        route = self._route(key)
+        route.sampled_pages += 1
+        if page_sample is not None:
+            route.pages.append(page_sample)
+
+    def engine_for(self, key):
+        """该路由其余页面使用的引擎；第一次调用时按已完成的采样页做出决定并记录日志"""
+        route = self._route(key)
+        if route.engine is None:
+            self._decide(route)
+        return route.engine
+
+    def _decide(self, route):
+        route.engine, route.reason = compare_engines(route.pages)
+        parts = []
+        for engine in ROUTED_ENGINES:
+            samples = route.samples_of(engine)
+            if not samples:
+                parts.append(f"{engine} 失败")
+                continue
+            confidence = _mean(s.confidence for s in samples)
+            parts.append(f"{engine} {_mean(s.seconds for s in samples):.2f} 秒/页, "
+                         f"置信度 {'未知' if confidence is None else f'{confidence:.0f}'}, "
+                         f"{sum(s.chars for s in samples)} 字" +
+                         (f", {sum(s.tables for s in samples)} 个表格" if any(s.tables for s in samples) else ""))
+        self.log_message(f"  {route.name}: 采样 {route.sampled_pages} 页 ({'; '.join(parts)}) "
+                         f"-> 其余页面使用 {route.engine} ({route.reason})。")
+
+    def estimated_saving(self, key):
+        """按采样平均耗时估计一个路由页面相对另一引擎节省的秒数 (选中的引擎更慢时为 0)"""
+        route = self._route(key)
+        other = "PP-Structure" if route.engine == "Tesseract" else "Tesseract"
+        chosen_seconds = _mean(s.seconds for s in route.samples_of(route.engine))
+        other_seconds = _mean(s.seconds for s in route.samples_of(other))
+        if chosen_seconds is None or other_seconds is None:
+            return 0.0
+        return max(0.0, other_seconds - chosen_seconds)
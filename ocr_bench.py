@@ -0,0 +1,657 @@
+# 文件路径：ocr_bench.py
+# -*- coding: utf-8 -*-
+"""
+ocr_bench.py — OCR 流程性能测量
+用法示例：
+   python ocr_bench.py pixmap                      # 使用运行时生成的测试 PDF
+   python ocr_bench.py pixmap scans/a.pdf --dpi 300 --pages 5
+
+子命令：
+  pixmap  对比页面图像转换的旧路径 (pix.samples -> PIL -> np.array -> cvtColor -> copy)
+          与零拷贝路径 (pixmap_to_bgr)，输出每页转换耗时、转换期间的内存分配峰值
+          以及每种方式所在子进程的峰值 RSS。
+  dpi     对每页执行自适应 DPI 估计，对比固定 DPI 下的像素数与渲染耗时。
+  sr      CARN 分块超分吞吐量：对比不同 batch 大小 / channels_last 的 块/秒 (需要 torch)。
+  preprocess 预处理链：原流程 (每阶段新数组、每页新建 CLAHE、NL-means) 与 OCRPreprocessor 的各阶段耗时，
+             测试页叠加不同强度的高斯噪声。
+  tesseract  每页 OSD + 识别的耗时：pytesseract (每次调用启动 tesseract 进程) 与进程内 libtesseract 对比。
+  pipeline   同一批页面分别用串行 (SerialPageOCR) 与单进程流水线 (PipelinedPageOCR) 处理，
+             对比总耗时、页/秒，并输出流水线各阶段利用率。
+  frontends  回归检查：用相同的界面选项分别调用 ocr.py 与 ReadPdf.py 的参数收集 (_build_settings)，
+             在同一组测试 PDF (默认生成文本层页、扫描页、旋转扫描页) 上运行，逐文件比较输出；
+             参数或输出不一致时列出差异并以退出码 1 结束。
+  dedup      回归检查：重复页预筛 (page_screen.py) 在只差一个数字的发票页上不能误判为重复页，
+             完全相同的页面与平移后重新扫描的页面应判为重复；输出预筛耗时与复核次数，
+             误判或漏判时以退出码 1 结束。
+  startup    冷启动：在新的解释器中分别测量 import ocr / import ReadPdf (延迟导入) 与
+             导入后立即 probe_dependencies (原先启动时导入 paddle / torch / pytesseract) 的耗时，
+             Tesseract 路径查找有无磁盘缓存的耗时，以及 -X importtime 中最慢的模块；
+             界面模块导入超过目标 (COLD_START_TARGET_SECONDS) 时退出码为 1。
+"""
+
+import os
+import sys
+import argparse
+import importlib
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+import multiprocessing
+from time import perf_counter
+
+import fitz  # PyMuPDF
+import cv2
+import numpy as np
+from PIL import Image
+
+from ocr_engine import pixmap_to_bgr, choose_page_dpi
+
+try:
+    import resource  # Windows 上不可用
+except ImportError:
+    resource = None
+
+
+# --- 测试数据 ---
+def make_fixture_pdf(path, num_pages=3):
+    """生成 A4 测试 PDF：每页若干行文字 (用于没有现成样本时)"""
+    doc = fitz.open()
+    for i in range(num_pages):
+        page = doc.new_page(width=595, height=842)
+        y = 60
+        for line in range(40):
+            page.insert_text((50, y), f"Page {i + 1} line {line + 1}: The quick brown fox jumps over the lazy dog.",
+                             fontsize=10)
+            y += 18
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_scanned_pdf(path, num_pages=2, rotate=0, dpi=200):
+    """生成只含页面图像的 "扫描版" PDF (无文本层)，rotate 为页面图像的旋转角度 (90 的倍数)"""
+    source = fitz.open(make_fixture_pdf(f"{path}.src.pdf", num_pages))
+    doc = fitz.open()
+    for page in source:
+        pix = page.get_pixmap(dpi=dpi)
+        img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        img = np.ascontiguousarray(np.rot90(img, k=-(rotate // 90) % 4))
+        ok, png = cv2.imencode(".png", img[:, :, ::-1] if pix.n == 3 else img)
+        width, height = img.shape[1] * 72 / dpi, img.shape[0] * 72 / dpi
+        doc.new_page(width=width, height=height).insert_image(fitz.Rect(0, 0, width, height), stream=png.tobytes())
+    source.close()
+    os.remove(f"{path}.src.pdf")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存 (MB)；平台不支持时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # macOS 单位为字节，Linux 为 KB
+
+
+def _format_mb(value):
+    return "n/a" if value is None else f"{value:.1f} MB"
+
+
+# --- pixmap 转换 ---
+def _legacy_convert(pix, _buffer):
+    """原流程：pix.samples -> PIL -> np.array -> cvtColor，处理函数中再 .copy() 一次"""
+    img_pil = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    img_cv_bgr = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
+    return img_cv_bgr.copy()
+
+
+def _zero_copy_convert(pix, buffer):
+    return pixmap_to_bgr(pix, buffer)
+
+
+_CONVERTERS = {"legacy": _legacy_convert, "zero-copy": _zero_copy_convert}
+
+
+def _measure_pixmap(mode, pdf_path, dpi, max_pages, queue):
+    """在独立子进程中执行，保证峰值 RSS 只反映一种转换方式"""
+    convert = _CONVERTERS[mode]
+    doc = fitz.open(pdf_path)
+    times, peaks = [], []
+    buffer = None
+    for i in range(min(len(doc), max_pages)):
+        pix = doc.load_page(i).get_pixmap(dpi=dpi)
+        tracemalloc.start()
+        start = perf_counter()
+        buffer = convert(pix, buffer)
+        times.append(perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024 / 1024)
+        tracemalloc.stop()
+        del pix
+    doc.close()
+    queue.put({"mode": mode, "pages": len(times), "shape": None if buffer is None else buffer.shape,
+               "avg_ms": sum(times) / max(1, len(times)) * 1000, "alloc_peak_mb": max(peaks, default=0.0),
+               "rss_peak_mb": peak_rss_mb()})
+
+
+def bench_pixmap(args):
+    pdf_path = args.pdf
+    if pdf_path is None:
+        pdf_path = make_fixture_pdf(os.path.join(tempfile.mkdtemp(prefix="ocr_bench_"), "fixture.pdf"))
+    print(f"PDF: {pdf_path}, DPI: {args.dpi}, 最多 {args.pages} 页")
+    ctx = multiprocessing.get_context("spawn")
+    for mode in _CONVERTERS:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_measure_pixmap, args=(mode, pdf_path, args.dpi, args.pages, queue))
+        proc.start()
+        r = queue.get()
+        proc.join()
+        print(f"  {r['mode']:<10} {r['pages']} 页 {r['shape']}: 每页转换 {r['avg_ms']:.1f} ms, "
+              f"转换期间分配峰值 {_format_mb(r['alloc_peak_mb'])}, 进程峰值 RSS {_format_mb(r['rss_peak_mb'])}")
+
+
+# --- 自适应 DPI ---
+def bench_dpi(args):
+    pdf_path = args.pdf
+    if pdf_path is None:
+        pdf_path = make_fixture_pdf(os.path.join(tempfile.mkdtemp(prefix="ocr_bench_"), "fixture.pdf"))
+    doc = fitz.open(pdf_path)
+    total_fixed = total_adaptive = 0
+    time_fixed = time_adaptive = 0.0
+    for i in range(min(len(doc), args.pages)):
+        page = doc.load_page(i)
+        start = perf_counter()
+        pix = page.get_pixmap(dpi=args.dpi)
+        time_fixed += perf_counter() - start
+        fixed_pixels = pix.width * pix.height
+        start = perf_counter()
+        dpi, text_height = choose_page_dpi(page, args.dpi, args.min_dpi, args.max_dpi)
+        pix = page.get_pixmap(dpi=dpi)
+        time_adaptive += perf_counter() - start  # 含试渲染
+        total_fixed += fixed_pixels
+        total_adaptive += pix.width * pix.height
+        height_text = "未知" if text_height is None else f"{text_height:.1f} px"
+        print(f"  第 {i + 1} 页: 估计字高 {height_text} -> {dpi} DPI, "
+              f"{pix.width * pix.height / 1e6:.1f} MP (固定 {args.dpi} DPI: {fixed_pixels / 1e6:.1f} MP)")
+    doc.close()
+    print(f"合计像素 {total_adaptive / 1e6:.1f} MP / 固定 {total_fixed / 1e6:.1f} MP, "
+          f"渲染耗时 {time_adaptive:.2f} 秒 (含试渲染) / 固定 {time_fixed:.2f} 秒")
+
+
+# --- CARN 超分吞吐量 ---
+def bench_sr(args):
+    import torch
+    from carn import CARN
+    from carn_runtime import CarnUpscaler
+
+    model = CARN()
+    if args.carn_model:
+        model.load_state_dict(torch.load(args.carn_model, map_location="cpu"))
+    else:
+        print("未指定 --carn-model，使用随机初始化权重 (只测速度)")
+    model.eval()
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    rng = np.random.RandomState(0)
+    img = cv2.GaussianBlur((rng.rand(args.height, args.width, 3) * 255).astype(np.uint8), (5, 5), 2)
+    print(f"输入 {args.width}x{args.height}, 分块 {args.tile}px, 线程 {torch.get_num_threads()}")
+    for channels_last in (False, True):
+        for batch_size in args.batch:
+            upscaler = CarnUpscaler(model, tile_size=args.tile, batch_size=batch_size, channels_last=channels_last)
+            upscaler.upscale(img)
+            print(f"  batch {batch_size:<3} channels_last={channels_last!s:<5}: {upscaler.tiles_sr} 块, "
+                  f"推理 {upscaler.sr_seconds:.2f} 秒, {upscaler.tiles_sr / upscaler.sr_seconds:.2f} 块/秒, "
+                  f"{upscaler.images / upscaler.sr_seconds:.3f} 图像/秒")
+
+
+# --- 预处理链 ---
+def _legacy_preprocess(img_cv_bgr, timings):
+    """原 _preprocess_for_ocr：灰度 -> 新建 CLAHE -> NL-means -> 自适应二值化"""
+    start = perf_counter()
+    gray = cv2.cvtColor(img_cv_bgr, cv2.COLOR_BGR2GRAY)
+    timings["gray"] = timings.get("gray", 0.0) + perf_counter() - start
+    start = perf_counter()
+    gray = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+    timings["clahe"] = timings.get("clahe", 0.0) + perf_counter() - start
+    start = perf_counter()
+    gray = cv2.fastNlMeansDenoising(gray, None, h=10, templateWindowSize=7, searchWindowSize=21)
+    timings["denoise"] = timings.get("denoise", 0.0) + perf_counter() - start
+    start = perf_counter()
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 7)
+    timings["binarize"] = timings.get("binarize", 0.0) + perf_counter() - start
+    return binary
+
+
+def bench_preprocess(args):
+    from ocr_preprocess import OCRPreprocessor
+
+    pdf_path = args.pdf
+    if pdf_path is None:
+        pdf_path = make_fixture_pdf(os.path.join(tempfile.mkdtemp(prefix="ocr_bench_"), "fixture.pdf"), 1)
+    doc = fitz.open(pdf_path)
+    page_img = pixmap_to_bgr(doc.load_page(0).get_pixmap(dpi=args.dpi))
+    doc.close()
+    # 扫描件的背景通常不是纯白，先压缩到 [30, 225]，避免噪声在 255 处被截断
+    page_img = (page_img.astype(np.float32) * (195.0 / 255.0) + 30.0)
+    rng = np.random.RandomState(0)
+    print(f"PDF: {pdf_path} 第 1 页, DPI: {args.dpi}, 图像 {page_img.shape[1]}x{page_img.shape[0]}")
+    preprocessor = OCRPreprocessor(perform_clahe=True, perform_denoise=True, denoise_method="auto")
+    for sigma in args.noise:
+        noisy = np.clip(page_img + rng.normal(0, sigma, page_img.shape), 0, 255).astype(np.uint8)
+        legacy = {}
+        start = perf_counter()
+        _legacy_preprocess(noisy, legacy)
+        legacy_total = perf_counter() - start
+        stats = {}
+        start = perf_counter()
+        preprocessor.process(noisy, stats)
+        total = perf_counter() - start
+        method = next((k[len("prep_denoise_"):] for k in stats if k.startswith("prep_denoise_")
+                       and not k.endswith(("_seconds", "_skipped"))), "跳过")
+        print(f"  噪声 σ={sigma:<4} 原流程 {legacy_total * 1000:7.0f} ms (降噪 {legacy['denoise'] * 1000:.0f} ms) | "
+              f"新流程 {total * 1000:6.0f} ms: 分析 {stats.get('prep_analyze_seconds', 0) * 1000:.0f} ms, "
+              f"CLAHE {stats.get('prep_clahe_seconds', 0) * 1000:.0f} ms, "
+              f"降噪 [{method}] {stats.get('prep_denoise_seconds', 0) * 1000:.0f} ms, "
+              f"二值化 {stats.get('prep_binarize_seconds', 0) * 1000:.0f} ms")
+
+
+# --- Tesseract 调用方式 ---
+def bench_tesseract(args):
+    import ocr_engine
+    from tess_capi import TesseractCAPI, find_libtesseract
+
+    pdf_path = args.pdf
+    if pdf_path is None:
+        pdf_path = make_fixture_pdf(os.path.join(tempfile.mkdtemp(prefix="ocr_bench_"), "fixture.pdf"))
+    doc = fitz.open(pdf_path)
+    pages = []
+    for i in range(min(len(doc), args.pages)):
+        pix = doc.load_page(i).get_pixmap(dpi=args.dpi, colorspace=fitz.csGRAY)
+        pages.append(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width])
+    doc.close()
+    print(f"PDF: {pdf_path}, DPI: {args.dpi}, {len(pages)} 页, 语言: {args.lang}")
+
+    backends = []
+    if ocr_engine.load_tesseract() and ocr_engine.TESSERACT_PATH:
+        pytesseract = ocr_engine.pytesseract
+        backends.append(("pytesseract", lambda g: pytesseract.image_to_osd(g, config="--psm 0"),
+                         lambda g: pytesseract.image_to_string(g, lang=args.lang, config="--oem 3 --psm 3")))
+    else:
+        print("  pytesseract 或 tesseract 可执行文件不可用，跳过")
+    lib = find_libtesseract(ocr_engine.TESSERACT_PATH)
+    if lib is not None:
+        capi = TesseractCAPI(lib, ocr_engine.TESSDATA_DIR)
+        backends.append((f"libtesseract {capi.version}", capi.image_to_osd,
+                         lambda g: capi.image_to_string(g, args.lang, psm=3)))
+    else:
+        print("  未找到 libtesseract (可用 TESSERACT_LIB 指定)，跳过")
+
+    for name, osd, recognize in backends:
+        osd_times, ocr_times, chars = [], [], 0
+        for gray in pages:
+            start = perf_counter()
+            try:
+                osd(gray)
+            except Exception as e:  # 文字过少的页面 OSD 会失败，与流程中的处理一致
+                print(f"    OSD 失败: {str(e).splitlines()[0] if str(e) else e}")
+            osd_times.append(perf_counter() - start)
+            start = perf_counter()
+            chars += len(recognize(gray).strip())
+            ocr_times.append(perf_counter() - start)
+        n = max(1, len(pages))
+        print(f"  {name:<22} 每页 OSD {sum(osd_times) / n * 1000:.0f} ms + 识别 {sum(ocr_times) / n * 1000:.0f} ms "
+              f"(首页 {(osd_times[0] + ocr_times[0]) * 1000:.0f} ms), 识别字符 {chars}")
+
+
+def bench_pipeline(args):
+    import ocr_engine
+
+    pdf_path = args.pdf
+    if pdf_path is None:
+        pdf_path = make_fixture_pdf(os.path.join(tempfile.mkdtemp(prefix="ocr_bench_"), "fixture.pdf"),
+                                    num_pages=args.pages)
+    with fitz.open(pdf_path) as doc:
+        tasks = [ocr_engine.PageTask(0, pdf_path, i, len(doc)) for i in range(min(len(doc), args.pages))]
+    print(f"PDF: {pdf_path}, DPI: {args.dpi}, {len(tasks)} 页, 语言: {args.lang}, CPU 核数: {os.cpu_count()}")
+
+    def quiet(message, level=None):
+        pass
+
+    for threads in [None] + args.threads:
+        settings = ocr_engine.OCRSettings(engine="Tesseract", language=args.lang, dpi=args.dpi,
+                                          use_text_layer=False, pipeline=threads is not None,
+                                          pipeline_ocr_threads=threads or 1)
+        runner = ocr_engine.create_page_runner(settings, log=quiet)
+        if not runner.start():
+            print("  Tesseract 不可用，无法测量")
+            return
+        start = perf_counter()
+        results = list(runner.map_pages(tasks))
+        elapsed = perf_counter() - start
+        runner.close()
+        errors = sum(1 for r in results if r.error)
+        name = "串行" if threads is None else f"流水线 识别 x{threads}"
+        print(f"  {name:<14} {elapsed:.2f} 秒, {len(results) / elapsed:.2f} 页/秒"
+              f"{f', 失败 {errors} 页' if errors else ''}")
+        if getattr(runner, "stage_message", None):
+            print(f"    {runner.stage_message}")
+
+
+# ocr.py 界面变量名 -> 回归检查使用的取值 (与界面默认值一致；ReadPdf.py 只读取其中的一部分)
+FRONTEND_OPTIONS = {
+    "ocr_engine_choice": "Tesseract", "ocr_language": "chi_sim+eng",
+    "perform_osd": True, "combined_osd": True, "perform_crop": True, "perform_clahe": True,
+    "perform_denoise": False, "use_super_res": False, "carn_model_path": "carn.pth",
+    "sr_tile_size": 256, "sr_text_only": False, "sr_batch_size": 4, "carn_variant": "auto",
+    "worker_count": 1, "use_text_layer": True, "adaptive_dpi": False, "output_jsonl": False,
+    "use_pipeline": False, "use_model_server": False, "screen_pages": True, "dedup_pages": False,
+    "region_ocr": False, "image_format": "png", "png_level": 1, "image_threads": 1,
+}
+FRONTENDS = (("ocr.py", "ocr", "FileOCRApp"), ("ReadPdf.py", "ReadPdf", "PDFOCRApp"))
+
+
+class _FormValue:
+    """代替 Tk 变量 (只提供 get)，无需创建窗口即可调用界面的 _build_settings"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def frontend_settings(module_name, class_name, options):
+    """按界面选项调用前端类的 _build_settings，返回 OCRSettings"""
+    app_class = getattr(importlib.import_module(module_name), class_name)
+    form = argparse.Namespace(**{name: _FormValue(value) for name, value in options.items()})
+    return app_class._build_settings(form)
+
+
+def _read_outputs(output_dir):
+    outputs = {}
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                outputs[name] = f.read()
+    return outputs
+
+
+def bench_frontends(args):
+    from ocr_engine import OCRBatchRunner
+
+    work_dir = tempfile.mkdtemp(prefix="ocr_frontends_")
+    pdfs = args.pdf or [
+        make_fixture_pdf(os.path.join(work_dir, "text_layer.pdf"), num_pages=2),
+        make_scanned_pdf(os.path.join(work_dir, "scanned.pdf"), num_pages=2),
+        make_scanned_pdf(os.path.join(work_dir, "rotated.pdf"), num_pages=1, rotate=90),
+    ]
+    options = dict(FRONTEND_OPTIONS, ocr_engine_choice=args.engine, ocr_language=args.lang)
+    print(f"测试 PDF: {', '.join(os.path.basename(p) for p in pdfs)}, 引擎: {args.engine}, 语言: {args.lang}")
+
+    def quiet(message, level=None):
+        pass
+
+    failed = False
+    results = []
+    for label, module_name, class_name in FRONTENDS:
+        settings = frontend_settings(module_name, class_name, options)
+        output_dir = os.path.join(work_dir, module_name)
+        os.makedirs(output_dir)
+        runner = OCRBatchRunner(settings, output_dir, use_cache=False, resume=False, log=quiet)
+        start = perf_counter()
+        summary = runner.run(pdfs)
+        elapsed = perf_counter() - start
+        print(f"  {label:<12} {elapsed:.2f} 秒, 成功 {summary.processed_count}/{summary.total_files} 个文件")
+        results.append((label, vars(settings), _read_outputs(output_dir)))
+
+    (label_a, settings_a, outputs_a), (label_b, settings_b, outputs_b) = results
+    diff_fields = sorted(k for k in set(settings_a) | set(settings_b) if settings_a.get(k) != settings_b.get(k))
+    if diff_fields:
+        failed = True
+        print("  参数不一致:")
+        for k in diff_fields:
+            print(f"    {k}: {label_a}={settings_a.get(k)!r}, {label_b}={settings_b.get(k)!r}")
+    for name in sorted(set(outputs_a) | set(outputs_b)):
+        if outputs_a.get(name) != outputs_b.get(name):
+            failed = True
+            state = "缺失" if name not in outputs_a or name not in outputs_b else "内容不同"
+            print(f"  输出不一致: {name} ({state})")
+    if not outputs_a:
+        failed = True
+        print("  没有生成任何输出文件")
+    print(f"  {'结果不一致' if failed else f'两个前端输出一致 ({len(outputs_a)} 个文件)'}, 输出目录: {work_dir}")
+    return 1 if failed else 0
+
+
+def make_invoice_pdf(path, num_pages=20):
+    """生成同一模板的发票 PDF：各页只有页脚的发票号 (只差一个数字) 不同"""
+    doc = fitz.open()
+    for i in range(num_pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((50, 60), "ACME Corporation - Invoice", fontsize=18)
+        for line in range(25):
+            page.insert_text((50, 110 + line * 20), f"Item {line + 1:02d}  Widget type standard   qty 1   price 10.00",
+                             fontsize=10)
+        page.insert_text((50, 800), f"Invoice No. {i + 1:05d}", fontsize=11)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_repeat_pdf(path, source_path, pages, dpi=200, shift_pixels=2):
+    """
+    生成重复页 PDF：依次为 source 中 pages 各页的原样副本、这些页的扫描图像页，
+    以及同一扫描图像平移 shift_pixels 个像素 (按复核 DPI 计) 的页面。
+    """
+    from page_screen import VERIFY_DPI
+
+    source = fitz.open(source_path)
+    doc = fitz.open()
+    for index in pages:
+        doc.insert_pdf(source, from_page=index, to_page=index)
+    shift = shift_pixels * 72 / VERIFY_DPI
+    for offset in (0, shift):
+        for index in pages:
+            page = source.load_page(index)
+            rect = page.rect
+            doc.new_page(width=rect.width, height=rect.height).insert_image(
+                rect + (offset, offset, offset, offset), stream=page.get_pixmap(dpi=dpi).tobytes("png"))
+    source.close()
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def bench_dedup(args):
+    from ocr_engine import build_page_tasks
+    from page_screen import PageScreener, describe_page
+
+    work_dir = tempfile.mkdtemp(prefix="ocr_dedup_")
+    invoice = make_invoice_pdf(os.path.join(work_dir, "invoices.pdf"), args.pages)
+    repeated = [0, args.pages // 2]
+    repeat = make_repeat_pdf(os.path.join(work_dir, "repeats.pdf"), invoice, repeated)
+    tasks = build_page_tasks(0, invoice) + build_page_tasks(1, repeat)
+    # 期望：发票页都不是重复页；repeats.pdf 中的副本是对应发票页的重复页，平移的扫描页是未平移扫描页
+    # (或其矢量原页) 的重复页。扫描页与矢量原页的重采样差异无法与改动的笔画区分，扫描页本身不判定
+    count = len(repeated)
+    expected = {args.pages + k: {repeated[k]} for k in range(count)}
+    expected.update({args.pages + 2 * count + k: {args.pages + count + k, repeated[k]} for k in range(count)})
+    unchecked = {args.pages + count + k for k in range(count)}
+    print(f"测试 PDF: {args.pages} 页发票 (只差发票号) + {count} 页副本、{count} 页扫描页及其平移 2 像素的副本")
+
+    screener = PageScreener(skip_blank=True, dedup=True)
+    failed = False
+    start = perf_counter()
+    try:
+        for seq, task in enumerate(tasks):
+            verdict, original = screener.screen(task, seq)
+            want = expected.get(seq)
+            got = original if verdict == "duplicate" else None
+            if seq in unchecked or (got is None and want is None) or (want and got in want):
+                continue
+            failed = True
+            wanted = " 或 ".join(describe_page(tasks[k]) for k in sorted(want)) if want else None
+            print(f"  {'误判' if want is None else '漏判'}: {describe_page(task)} -> "
+                  f"{describe_page(tasks[got]) if got is not None else verdict or '需要 OCR'}"
+                  f"{f' (应为 {wanted} 的重复页)' if wanted else ''}")
+    finally:
+        screener.close()
+    elapsed = perf_counter() - start
+    print(f"  预筛 {len(tasks)} 页 {elapsed:.2f} 秒 ({elapsed / len(tasks) * 1000:.0f} ms/页), "
+          f"复核 {screener.verified} 次, 其中内容不同 {screener.rejected} 次")
+    print(f"  {'结果有误' if failed else '重复页判定正确'}, 测试目录: {work_dir}")
+    return 1 if failed else 0
+
+
+COLD_START_TARGET_SECONDS = 1.0  # 界面模块导入 (窗口出现前) 的目标耗时
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _timed_import(code, env=None):
+    """在新的解释器中执行 code，返回 (进程内耗时, 进程总耗时)"""
+    script = f"import time; _t = time.perf_counter(); {code}; print(time.perf_counter() - _t)"
+    start = perf_counter()
+    out = subprocess.run([sys.executable, "-c", script], cwd=_REPO_DIR, env=env, capture_output=True, text=True)
+    wall = perf_counter() - start
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"退出码 {out.returncode}")
+    return float(out.stdout.strip().splitlines()[-1]), wall
+
+
+def _slowest_imports(module, top):
+    """-X importtime 输出中累计耗时最长的顶层模块 [(模块, 秒)]"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=_REPO_DIR,
+                         capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        if 1 <= depth <= 2 and name.strip() != module:  # 被直接导入的模块及其下一层
+            rows.append((name.strip(), int(parts[1]) / 1e6))
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+
+
+def bench_startup(args):
+    env = dict(os.environ, OCR_CACHE_DIR=tempfile.mkdtemp(prefix="ocr_startup_"))  # 路径缓存从空目录开始
+    cases = [
+        ("解释器启动", "pass"),
+        ("import ocr_engine", "import ocr_engine"),
+        ("import ocr", "import ocr"),
+        ("import ReadPdf", "import ReadPdf"),
+        ("ocr + 全部依赖 (原方式)", "import ocr, ocr_engine; ocr_engine.probe_dependencies()"),
+    ]
+    print(f"Python {sys.version.split()[0]}, 每项 {args.runs} 次取中位数 (首次运行另计，含 Tesseract 路径查找)")
+    failed = False
+    for label, code in cases:
+        try:
+            first = _timed_import(code, env)
+            runs = [_timed_import(code, env) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"  {label:<28} 失败: {e}")
+            continue
+        inner = statistics.median(r[0] for r in runs)
+        wall = statistics.median(r[1] for r in runs)
+        note = ""
+        if code in ("import ocr", "import ReadPdf"):
+            ok = inner <= args.target
+            failed = failed or not ok
+            note = f"  [{'达标' if ok else '超出'}目标 {args.target:.2f} 秒]"
+        print(f"  {label:<28} 导入 {inner:.3f} 秒, 进程总计 {wall:.3f} 秒 (首次 {first[1]:.3f} 秒){note}")
+
+    find_code = "import ocr_engine; _t = time.perf_counter(); ocr_engine.find_tesseract_paths()"
+    script = f"import time; {find_code}; print(time.perf_counter() - _t)"
+    empty_env = dict(env, OCR_CACHE_DIR=tempfile.mkdtemp(prefix="ocr_startup_"))
+    times = []
+    for run_env in (empty_env, empty_env):  # 第一次查找并写缓存，第二次读缓存
+        out = subprocess.run([sys.executable, "-c", script], cwd=_REPO_DIR, env=run_env, capture_output=True,
+                             text=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]) if out.returncode == 0 else None)
+    if None not in times:
+        print(f"  Tesseract 路径查找: 无缓存 {times[0] * 1000:.1f} ms, 使用磁盘缓存 {times[1] * 1000:.1f} ms")
+
+    print(f"  import ocr 最慢的模块 (-X importtime 累计):")
+    for name, seconds in _slowest_imports("ocr", args.top):
+        print(f"    {name:<30} {seconds:.3f} 秒")
+    return 1 if failed else 0
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python ocr_bench.py", description="OCR 流程性能测量")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("pixmap", help="对比 PDF 页面图像转换的旧路径与零拷贝路径")
+    p.add_argument("pdf", nargs="?", default=None, help="测试 PDF (默认运行时生成)")
+    p.add_argument("--dpi", type=int, default=300, help="渲染 DPI (默认 300)")
+    p.add_argument("--pages", type=int, default=5, help="最多测量的页数 (默认 5)")
+    p.set_defaults(func=bench_pixmap)
+
+    p = sub.add_parser("dpi", help="对比自适应 DPI 与固定 DPI 的像素数和渲染耗时")
+    p.add_argument("pdf", nargs="?", default=None, help="测试 PDF (默认运行时生成)")
+    p.add_argument("--dpi", type=int, default=300, help="固定 DPI / 估计失败时的默认值 (默认 300)")
+    p.add_argument("--min-dpi", type=int, default=150, help="自适应 DPI 下限 (默认 150)")
+    p.add_argument("--max-dpi", type=int, default=400, help="自适应 DPI 上限 (默认 400)")
+    p.add_argument("--pages", type=int, default=20, help="最多测量的页数 (默认 20)")
+    p.set_defaults(func=bench_dpi)
+
+    p = sub.add_parser("sr", help="CARN 分块超分吞吐量 (不同 batch / 内存布局)")
+    p.add_argument("--carn-model", default=None, help="CARN 权重 (默认随机权重，只测速度)")
+    p.add_argument("--width", type=int, default=620, help="输入图像宽度 (默认 620)")
+    p.add_argument("--height", type=int, default=877, help="输入图像高度 (默认 877)")
+    p.add_argument("--tile", type=int, default=128, help="分块大小 (默认 128)")
+    p.add_argument("--batch", type=int, nargs="+", default=[1, 4, 8], help="要比较的 batch 大小 (默认 1 4 8)")
+    p.add_argument("--threads", type=int, default=0, help="torch 线程数 (默认 torch 默认值)")
+    p.set_defaults(func=bench_sr)
+
+    p = sub.add_parser("preprocess", help="对比原预处理链与 OCRPreprocessor 的各阶段耗时")
+    p.add_argument("pdf", nargs="?", default=None, help="测试 PDF (默认运行时生成，只用第 1 页)")
+    p.add_argument("--dpi", type=int, default=300, help="渲染 DPI (默认 300)")
+    p.add_argument("--noise", type=float, nargs="+", default=[0, 4, 12], help="叠加的高斯噪声标准差 (默认 0 4 12)")
+    p.set_defaults(func=bench_preprocess)
+
+    p = sub.add_parser("tesseract", help="对比 pytesseract 子进程与进程内 libtesseract 的每页耗时")
+    p.add_argument("pdf", nargs="?", default=None, help="测试 PDF (默认运行时生成)")
+    p.add_argument("--dpi", type=int, default=300, help="渲染 DPI (默认 300)")
+    p.add_argument("--pages", type=int, default=3, help="最多测量的页数 (默认 3)")
+    p.add_argument("-l", "--lang", default="chi_sim+eng", help="Tesseract 语言 (默认 chi_sim+eng)")
+    p.set_defaults(func=bench_tesseract)
+
+    p = sub.add_parser("pipeline", help="对比串行与单进程流水线 (渲染/识别并行) 的吞吐量")
+    p.add_argument("pdf", nargs="?", default=None, help="测试 PDF (默认运行时生成)")
+    p.add_argument("--dpi", type=int, default=300, help="渲染 DPI (默认 300)")
+    p.add_argument("--pages", type=int, default=6, help="最多测量的页数 (默认 6)")
+    p.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4], help="流水线识别线程数 (默认 1 2 4)")
+    p.add_argument("-l", "--lang", default="chi_sim+eng", help="Tesseract 语言 (默认 chi_sim+eng)")
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("frontends", help="回归检查：ocr.py 与 ReadPdf.py 在同一组 PDF 上的输出是否一致")
+    p.add_argument("pdf", nargs="*", help="测试 PDF (默认运行时生成文本层页、扫描页与旋转扫描页)")
+    p.add_argument("--engine", default="Tesseract", choices=["Tesseract", "PP-Structure"],
+                   help="OCR 引擎 (默认 Tesseract)")
+    p.add_argument("-l", "--lang", default="chi_sim+eng", help="识别语言 (默认 chi_sim+eng)")
+    p.set_defaults(func=bench_frontends)
+
+    p = sub.add_parser("dedup", help="回归检查：只差一个数字的页面不能判为重复页，相同页面应复用结果")
+    p.add_argument("--pages", type=int, default=20, help="发票页数 (默认 20)")
+    p.set_defaults(func=bench_dedup)
+
+    p = sub.add_parser("startup", help="界面冷启动与模块导入耗时 (对比启动时导入全部 OCR 依赖)")
+    p.add_argument("--runs", type=int, default=5, help="每项测量次数 (默认 5，取中位数)")
+    p.add_argument("--target", type=float, default=COLD_START_TARGET_SECONDS,
+                   help=f"界面模块导入的目标耗时 (秒，默认 {COLD_START_TARGET_SECONDS})")
+    p.add_argument("--top", type=int, default=8, help="列出最慢的模块数 (默认 8)")
+    p.set_defaults(func=bench_startup)
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# 文件路径：ocr_cache.py
+# -*- coding: utf-8 -*-
+"""
+ocr_cache.py — 按页面内容寻址的 OCR 结果缓存
+主要功能：
+1. page_content_hash / file_content_hash: 计算页面内容指纹。
+   PDF 页面直接对内容流、图像、字体和 XObject 的原始字节取哈希，不需要渲染。
+2. OCRResultCache: 基于 sqlite 的磁盘缓存，键为
+   (页面内容哈希, 引擎, 引擎参数, DPI, 超分开关)，值为该页识别结果 {"label": 标题说明, "body": 正文, "engine": 引擎, "layout": 版面块} (JSON)。
+   不保存带页码的标题行，同一页面出现在别的位置时由调用方按当前页码重建标题。
+   - 总大小超过上限时按最近最少使用 (LRU) 淘汰。
+   - 统计命中/未命中/写入/淘汰次数，供运行结束时输出。
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+
+# 缓存格式版本；处理流程的输出格式变化时递增，使旧缓存自动失效
+CACHE_FORMAT_VERSION = 2  # 2: 值不再包含 "--- PDF页 N (引擎) ---" 标题行
+DEFAULT_CACHE_SIZE_MB = 512
+
+
+def default_cache_dir():
+    """默认缓存目录：环境变量 OCR_CACHE_DIR，否则为用户缓存目录下的 ocr_tools"""
+    env_dir = os.getenv('OCR_CACHE_DIR')
+    if env_dir:
+        return env_dir
+    if os.name == 'nt':
+        base = os.getenv('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ocr_tools')
+
+
+def page_content_hash(doc, page):
+    """PDF 页面内容指纹：内容流 + 页面几何 + 引用的图像/字体/XObject 原始数据"""
+    h = hashlib.sha256()
+    h.update(repr((tuple(page.rect), page.rotation)).encode())
+    h.update(page.read_contents() or b"")
+    xrefs = set()
+    for img in page.get_images(full=True):
+        xrefs.add(img[0])
+    for font in page.get_fonts(full=True):
+        xrefs.add(font[0])
+    for xobj in page.get_xobjects():
+        xrefs.add(xobj[0])
+    for xref in sorted(x for x in xrefs if x > 0):
+        try:
+            h.update(doc.xref_stream_raw(xref) or b"")
+        except Exception:  # 非流对象等，退化为对象定义
+            h.update(doc.xref_object(xref, compressed=True).encode())
+    return h.hexdigest()
+
+
+def file_content_hash(path, chunk_size=1 << 20):
+    """图像文件指纹：文件字节的 sha256"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_cache_key(page_hash, engine, fingerprint):
+    """由页面指纹、实际使用的引擎和参数指纹 (dict) 生成缓存键"""
+    payload = json.dumps({"v": CACHE_FORMAT_VERSION, "page": page_hash, "engine": engine,
+                          "settings": fingerprint}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class OCRResultCache:
+    """ sqlite 磁盘缓存 (单线程使用；多个进程可同时打开同一缓存文件) """
+
+    def __init__(self, cache_dir=None, max_size_mb=DEFAULT_CACHE_SIZE_MB, log=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.log_message = log or (lambda m, level=logging.INFO: logging.log(level, m))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.db_path = os.path.join(self.cache_dir, "ocr_cache.sqlite3")
+        self._conn = sqlite3.connect(self.db_path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pages ("
+                           "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, "
+                           "created REAL NOT NULL, last_access REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """查找缓存结果 (dict)；命中时刷新访问时间。未命中返回 None"""
+        return self.get_any((key,))
+
+    def get_any(self, keys, count_miss=True):
+        """
+        按顺序查找几个候选键 (如自动选择引擎时每种引擎一个键)，返回第一个命中的结果 (dict)。
+        一页只计一次命中或未命中；命中时刷新访问时间。
+        count_miss=False 时未命中不计数 (调用方之后用 add_misses 只统计确实需要识别的页面)。
+        """
+        for key in keys:
+            row = self._conn.execute("SELECT text FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.hits += 1
+                self._conn.execute("UPDATE pages SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+                return json.loads(row[0])
+        if count_miss:
+            self.misses += 1
+        return None
+
+    def add_misses(self, count):
+        self.misses += count
+
+    def put(self, key, entry):
+        """写入一页识别结果 (可转为 JSON 的 dict)，必要时淘汰最久未使用的条目"""
+        now = time.time()
+        text = json.dumps(entry, ensure_ascii=False)
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self._conn.execute("INSERT OR REPLACE INTO pages (key, text, size, created, last_access) "
+                           "VALUES (?, ?, ?, ?, ?)", (key, text, size, now, now))
+        self._conn.commit()
+        self.stores += 1
+        self._evict_if_needed()
+
+    def total_size(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def _evict_if_needed(self):
+        """总大小超过上限时，按 last_access 从旧到新删除，直到降到上限的 90%"""
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM pages ORDER BY last_access ASC").fetchall()
+        to_delete = []
+        for key, size in rows:
+            if total <= target:
+                break
+            to_delete.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM pages WHERE key = ?", to_delete)
+        self._conn.commit()
+        self.evictions += len(to_delete)
+
+    def purge(self):
+        """清空缓存。返回删除的条目数"""
+        count = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        self._conn.execute("DELETE FROM pages")
+        self._conn.commit()
+        self._conn.execute("VACUUM")
+        return count
+
+    def stats_message(self):
+        return (f"缓存: 命中 {self.hits} 页, 未命中 {self.misses} 页, 新写入 {self.stores} 页, "
+                f"淘汰 {self.evictions} 条 (当前 {self.total_size() / 1024 / 1024:.1f} MB / "
+                f"上限 {self.max_bytes / 1024 / 1024:.0f} MB)")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,2924 @@
+# 文件路径：ocr_engine.py
+# -*- coding: utf-8 -*-
+"""
+ocr_engine.py — OCR 处理核心 (不依赖 Tk)
+主要功能：
+1. OCRSettings: 一次 OCR 任务的全部参数，纯数据，可 pickle 传给子进程。
+2. OCREngine: 从 ocr.py 的 FileOCRApp 中拆出的单图像处理流程
+   (CARN 超分 + PP-Structure / Tesseract + 预处理)。
+3. 页面任务模型 PageTask / PageResult，以及三种执行方式：
+   - SerialPageOCR: 在当前线程中逐页处理 (原有行为)。
+   - ParallelPageOCR: 进程池并行处理，每个工作进程持有自己的 OCR 引擎，
+     结果按提交顺序 (即文件、页码顺序) 返回。
+   - PipelinedPageOCR: 单进程流水线，渲染 / 超分 / 识别分别在各自的线程中运行，用有界队列连接。
+4. OCRBatchRunner: 批量处理输入文件并写出 {文件名}_ocr.txt (GUI 与命令行共用)。
+   每页完成后立即追加到 {文件名}_ocr.partial.txt 并写入检查点日志 (见 ocr_output.py)，
+   中断后再次运行从缺失的页面继续；文件全部页面成功后改名为 {文件名}_ocr.txt。
+   带可靠文本层的 PDF 页面直接提取文本 (见 pdf_text_layer.py)，只有扫描页/图文混排页才 OCR。
+   Tesseract 优先通过 libtesseract C API 在进程内调用 (见 tess_capi.py)，找不到库时使用 pytesseract。
+   设置 server_url 时页面交给常驻模型的本机 OCR 服务 (见 ocr_server.py)，服务不可用时回退到上述执行方式。
+   OCR 前先低分辨率预筛页面 (见 page_screen.py)：空白页直接跳过，与批次中较早页面相同的页面复用其识别结果。
+   Tesseract 可按区域识别 (region_ocr，见 text_regions.py)：只识别检测到的文字区域，各区域按类型选择 psm 并行识别。
+5. 命令行入口，例如：
+   python -m ocr_engine "scans/*.pdf" -o out -e tesseract -l chi_sim+eng -j 4
+   paddle / torch / pytesseract 只在所选引擎需要时才导入。
+"""
+
+import os
+import sys
+import copy
+import glob
+import json
+import importlib.util
+import queue
+import argparse
+import platform
+import shutil
+import threading
+import traceback
+import logging
+import multiprocessing
+import multiprocessing.util
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter
+
+# --- 依赖导入与检查 ---
+# 图像基础库
+import fitz  # PyMuPDF
+import cv2
+import numpy as np
+
+from ocr_cache import (OCRResultCache, DEFAULT_CACHE_SIZE_MB, page_content_hash, file_content_hash, make_cache_key,
+                       default_cache_dir)
+from ocr_output import (PageJournal, StreamingTextWriter, StreamingJSONLWriter, FLUSH_POLICIES, OUTPUT_FORMATS,
+                        source_identity, tesseract_blocks, ppstructure_blocks, ppstructure_block_content,
+                        split_page_text, format_page_text)
+from pdf_text_layer import native_page_text, DEFAULT_MIN_CHARS as TEXT_LAYER_MIN_CHARS
+from tess_capi import TesseractCAPIError
+from ocr_preprocess import OCRPreprocessor
+from page_screen import PageScreener, describe_page
+from text_regions import detect_text_regions, REGION_PADDING
+from page_images import (AsyncImageWriter, IMAGE_FORMATS, DEFAULT_PNG_LEVEL, image_path, raw_page_path,
+                         load_raw_page, log_image_stats)
+from engine_router import (EngineRouter, EngineSample, PageSample, text_agreement, AUTO_ENGINE, ROUTED_ENGINES,
+                           SAMPLE_ROUTE, DEFAULT_SAMPLE_PAGES)
+from batch_schedule import BatchSchedule, SCHEDULE_ORDERS, select_pages, parse_assignments
+
+# --- OCR 依赖 (按需导入) ---
+# paddle / torch 导入耗时数秒，pytesseract 需要查找可执行文件，
+# 因此都推迟到真正选用对应引擎时 (load_tesseract / load_ppstructure / load_torch) 才导入。
+# 以下可用性标记在对应 load_* 调用前为 None，表示尚未检查。
+# 界面启动时只调用 probe_installed (find_spec，不导入这些库)，窗口不必等待 paddle / torch 导入完成。
+TESSERACT_AVAILABLE = None
+PPSTRUCTURE_AVAILABLE = None
+TORCH_AVAILABLE = None
+CARN_MODEL_DEF_AVAILABLE = None
+
+pytesseract = None
+Output = None
+TesseractError = Exception  # 定义通用异常占位
+TesseractNotFoundError = Exception  # 定义通用异常占位
+paddle = None
+PPStructure = None  # 定义空占位，避免后续 NameError
+torch = None
+CARN = None
+
+TESSERACT_PATH = None
+TESSDATA_DIR = None
+TESSDATA_PREFIX = None
+_tesseract_paths_checked = False
+# Tesseract / tessdata 查找结果的磁盘缓存 (位于结果缓存目录)；PATH 与相关环境变量不变且路径仍存在时直接使用
+TESSERACT_PATHS_CACHE = "tesseract_paths.json"
+
+
+def load_tesseract():
+    """导入 pytesseract 并查找 Tesseract 可执行文件和 tessdata 目录 (只执行一次)。返回是否可用"""
+    global TESSERACT_AVAILABLE, pytesseract, Output, TesseractError, TesseractNotFoundError
+    if TESSERACT_AVAILABLE is not None:
+        return TESSERACT_AVAILABLE
+    try:
+        import pytesseract as _pytesseract
+        from pytesseract import Output as _Output, TesseractError as _TesseractError, \
+            TesseractNotFoundError as _TesseractNotFoundError
+
+        pytesseract, Output = _pytesseract, _Output
+        TesseractError, TesseractNotFoundError = _TesseractError, _TesseractNotFoundError
+        TESSERACT_AVAILABLE = True
+        print("Tesseract OCR 可用。")
+    except ImportError:
+        print("警告：未找到 pytesseract 库，Tesseract 相关功能不可用。")
+        TESSERACT_AVAILABLE = False
+        return False
+    if find_tesseract_paths():
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+        print(f"已设置 pytesseract 命令路径。")
+    return TESSERACT_AVAILABLE
+
+
+def find_tesseract_paths():
+    """查找 Tesseract 可执行文件与 tessdata 目录 (不需要 pytesseract，只执行一次)，优先使用磁盘缓存。返回可执行文件路径"""
+    global TESSERACT_PATH, TESSDATA_DIR, TESSDATA_PREFIX, _tesseract_paths_checked
+    if _tesseract_paths_checked:
+        return TESSERACT_PATH
+    _tesseract_paths_checked = True
+    cache_path = os.path.join(default_cache_dir(), TESSERACT_PATHS_CACHE)
+    env_key = [os.getenv('TESSERACT_CMD'), os.getenv('TESSDATA_PREFIX'), os.getenv('PATH')]
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("env") == env_key and os.path.isfile(cached["tesseract"]) and \
+                (cached["tessdata"] is None or os.path.isdir(cached["tessdata"])):
+            TESSERACT_PATH, TESSDATA_DIR = cached["tesseract"], cached["tessdata"]
+            if TESSDATA_DIR:
+                TESSDATA_PREFIX = os.path.abspath(os.path.join(TESSDATA_DIR, '..'))
+                os.environ['TESSDATA_PREFIX'] = TESSDATA_PREFIX
+            print(f"使用缓存的 Tesseract 路径: {TESSERACT_PATH} (tessdata: {TESSDATA_DIR})")
+            return TESSERACT_PATH
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # 没有缓存或缓存损坏，重新查找
+
+    _discover_tesseract_paths()
+    if TESSERACT_PATH:  # 没找到时不缓存，安装后下次启动即可发现
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump({"env": env_key, "tesseract": TESSERACT_PATH, "tessdata": TESSDATA_DIR}, f)
+        except OSError as e:
+            print(f"警告：无法写入 Tesseract 路径缓存 {cache_path}: {e}")
+    return TESSERACT_PATH
+
+
+def _discover_tesseract_paths():
+    """全局 Tesseract 路径查找"""
+    global TESSERACT_PATH, TESSDATA_DIR, TESSDATA_PREFIX
+    try:
+        print("开始查找 Tesseract OCR...")
+        if platform.system() == "Windows":
+            tesseract_cmd_env = os.getenv('TESSERACT_CMD')
+            if tesseract_cmd_env and os.path.exists(tesseract_cmd_env):
+                TESSERACT_PATH = tesseract_cmd_env
+            else:
+                possible_paths = [
+                    r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+                    r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe'
+                ]
+                TESSERACT_PATH = next((p for p in possible_paths if os.path.exists(p)), None)
+            if not TESSERACT_PATH:  # 如果通过环境变量和默认路径都找不到，尝试 shutil.which
+                TESSERACT_PATH = shutil.which('tesseract')
+        else:  # macOS, Linux
+            TESSERACT_PATH = shutil.which('tesseract')
+
+        if not TESSERACT_PATH or not os.path.exists(TESSERACT_PATH):
+            raise FileNotFoundError(
+                "错误：未能找到 Tesseract 可执行文件。请确保已安装并配置到系统 PATH，或设置 TESSERACT_CMD 环境变量。")
+        print(f"找到 Tesseract: {TESSERACT_PATH}")
+
+        # --- 查找 Tessdata 目录 ---
+        tesseract_dir = os.path.dirname(TESSERACT_PATH)
+        # 优先检查 TESSERACT_PATH 同级或上级的 'tessdata'
+        potential_tessdata_paths = [
+            os.path.join(tesseract_dir, 'tessdata'),
+            os.path.abspath(os.path.join(tesseract_dir, '..', 'tessdata'))  # 有些安装方式tessdata在上一级
+        ]
+        for p_path in potential_tessdata_paths:
+            if os.path.isdir(p_path):
+                TESSDATA_DIR = p_path
+                break
+
+        # 如果没找到，再检查环境变量 TESSDATA_PREFIX
+        if not TESSDATA_DIR:
+            tessdata_prefix_env = os.getenv('TESSDATA_PREFIX')
+            if tessdata_prefix_env:
+                # TESSDATA_PREFIX 可能直接指向 tessdata 目录，或者其父目录
+                if os.path.basename(tessdata_prefix_env).lower() == 'tessdata' and os.path.isdir(tessdata_prefix_env):
+                    TESSDATA_DIR = tessdata_prefix_env
+                else:
+                    potential_tessdata_env = os.path.join(tessdata_prefix_env, 'tessdata')
+                    if os.path.isdir(potential_tessdata_env):
+                        TESSDATA_DIR = potential_tessdata_env
+
+        if TESSDATA_DIR and os.path.isdir(TESSDATA_DIR):
+            print(f"找到 tessdata 目录: {TESSDATA_DIR}")
+            # 设置 TESSDATA_PREFIX 为 tessdata 目录的父目录
+            TESSDATA_PREFIX = os.path.abspath(os.path.join(TESSDATA_DIR, '..'))
+            os.environ['TESSDATA_PREFIX'] = TESSDATA_PREFIX  # 确保 Tesseract 能找到
+            print(f"已设置环境变量 TESSDATA_PREFIX = {TESSDATA_PREFIX}")
+        else:
+            print(
+                "警告：未能自动找到有效的 'tessdata' 目录。Tesseract OCR 可能因缺少语言文件而失败。请尝试设置 TESSDATA_PREFIX 环境变量指向 'tessdata' 文件夹的父目录。")
+
+    except FileNotFoundError as e:
+        print(e)
+        TESSERACT_PATH = None  # 标记为不可用
+    except Exception as e:
+        print(f"初始化 Tesseract 路径时发生未知错误: {e}")
+        TESSERACT_PATH = None  # 标记为不可用
+
+
+def load_ppstructure():
+    """导入 paddle 与 PaddleOCR PP-Structure (只执行一次)。返回是否可用"""
+    global PPSTRUCTURE_AVAILABLE, paddle, PPStructure
+    if PPSTRUCTURE_AVAILABLE is not None:
+        return PPSTRUCTURE_AVAILABLE
+    try:
+        import paddle as _paddle  # 尝试导入 PPStructure，若底层 DLL 加载失败会抛出 OSError
+        from paddleocr import PPStructure as _PPStructure
+
+        paddle, PPStructure = _paddle, _PPStructure
+        PPSTRUCTURE_AVAILABLE = True
+        print("PaddleOCR PP-Structure 可用。")
+    except ImportError:
+        print("警告：未找到 paddlepaddle 或 paddleocr 库，PP-Structure 功能不可用。")
+        PPSTRUCTURE_AVAILABLE = False
+    except OSError as e:
+        print(f"警告：加载 PP-Structure 底层依赖失败: {e}，已禁用 PP-Structure 功能。")
+        PPSTRUCTURE_AVAILABLE = False
+    return PPSTRUCTURE_AVAILABLE
+
+
+def load_torch():
+    """导入 PyTorch 与 CARN 模型定义 (只执行一次)。返回超分是否可用"""
+    global TORCH_AVAILABLE, CARN_MODEL_DEF_AVAILABLE, torch, CARN
+    if TORCH_AVAILABLE is not None:
+        return TORCH_AVAILABLE and CARN_MODEL_DEF_AVAILABLE
+    try:
+        import torch as _torch
+
+        torch = _torch
+        TORCH_AVAILABLE = True
+        print("PyTorch 可用。")
+        try:
+            from carn import CARN as _CARN  # 假设 carn.py 在同目录或 PYTHONPATH
+
+            CARN = _CARN
+            CARN_MODEL_DEF_AVAILABLE = True
+            print("CARN 模型定义可用。")
+        except ImportError:
+            print("警告：未找到 CARN 模型定义文件 (carn.py)，超分辨率功能不可用。")
+            CARN_MODEL_DEF_AVAILABLE = False
+    except ImportError:
+        print("警告：未找到 torch 库，超分辨率功能不可用。")
+        TORCH_AVAILABLE = False
+        CARN_MODEL_DEF_AVAILABLE = False
+    except OSError as e:
+        print(f"警告：加载 PyTorch 底层依赖失败: {e}，已禁用超分辨率功能。")
+        TORCH_AVAILABLE = False
+        CARN_MODEL_DEF_AVAILABLE = False
+    return TORCH_AVAILABLE and CARN_MODEL_DEF_AVAILABLE
+
+
+def probe_dependencies():
+    """一次性导入并检查全部 OCR 依赖 (模型服务启动时使用)"""
+    load_tesseract()
+    load_ppstructure()
+    load_torch()
+
+
+def probe_installed():
+    """
+    界面启动时的快速检查：用 importlib.util.find_spec 判断各库是否已安装 (不导入 paddle / torch / pytesseract)，
+    并查找 Tesseract 路径 (磁盘缓存)。返回 {"tesseract", "ppstructure", "torch", "carn": bool}。
+    库已安装但导入失败 (如 DLL 缺失) 的情况要到选用引擎时 load_* 才能发现，届时按原逻辑回退或禁用。
+    """
+    def installed(*names):
+        try:
+            return all(importlib.util.find_spec(name) is not None for name in names)
+        except (ImportError, ValueError):
+            return False
+
+    tesseract = installed("pytesseract")
+    if tesseract:
+        find_tesseract_paths()
+    return {"tesseract": tesseract, "ppstructure": installed("paddle", "paddleocr"),
+            "torch": installed("torch"), "carn": installed("carn")}
+
+# 支持的输入文件类型
+PDF_EXTENSIONS = ['.pdf']
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff']
+# 每个引擎保持打开的 PDF 数 (OCR 服务中的引擎轮流处理多个客户端的文件)
+MAX_OPEN_DOCS = 4
+
+
+def _default_log(m, level=logging.INFO):
+    """无 GUI 时的日志输出 (子进程中同样使用)"""
+    logging.log(level, m)
+
+
+# -----------------------------------------------------------
+
+class OCRSettings:
+    """ 一次 OCR 任务的参数 (只含基本类型，便于传递给子进程) """
+
+    def __init__(self, engine="PP-Structure", language="ch", perform_osd=True, perform_crop=True,
+                 perform_clahe=True, perform_denoise=False, use_super_res=False, carn_model_path="carn.pth",
+                 dpi=300, workers=1, use_text_layer=True, text_layer_min_chars=TEXT_LAYER_MIN_CHARS,
+                 adaptive_dpi=False, min_dpi=150, max_dpi=400, max_page_megapixels=60,
+                 sr_tile_size=256, sr_tile_overlap=16, sr_text_only=False, sr_batch_size=4, sr_threads=0,
+                 sr_channels_last=False, carn_variant="auto", tesseract_backend="auto", osd_mode="combined",
+                 denoise_method="auto", output_format="text", pipeline=False, pipeline_ocr_threads=2,
+                 pipeline_queue_size=2, server_url=None, skip_blank_pages=True, dedup_pages=False,
+                 region_ocr=False, region_threads=0, image_format="png", png_level=DEFAULT_PNG_LEVEL,
+                 image_threads=1, reuse_saved_pages=True, route_sample_pages=DEFAULT_SAMPLE_PAGES):
+        # "PP-Structure"、"Tesseract" 或 "auto" (每个文件先用两种引擎识别 route_sample_pages 页，
+        # 按实测耗时与识别文本的一致程度为其余页面选择引擎，见 engine_router.py)
+        self.engine = engine
+        # Tesseract 调用方式："auto" 优先进程内 libtesseract，"capi" 同 auto 但找不到库时给出警告，"cli" 始终用 pytesseract
+        self.tesseract_backend = tesseract_backend
+        self.language = language
+        self.perform_osd = perform_osd
+        # 方向检测方式："combined" 先按原方向识别，识别置信度足够高 (页面是正向) 时不再做 OSD，
+        # 置信度低时才 OSD，需要旋转则旋转后重新识别；"separate" 每页先单独 OSD (--psm 0) 再识别。
+        # 识别置信度来自进程内 libtesseract；pytesseract 后端的 combined 改为在缩略图上做 OSD，再识别一次
+        self.osd_mode = osd_mode
+        self.perform_crop = perform_crop
+        self.perform_clahe = perform_clahe
+        self.perform_denoise = perform_denoise
+        # 降噪方法："auto" 按估计的噪声水平选择 (跳过/中值/双边)，也可固定为 "nlmeans"/"median"/"bilateral"
+        self.denoise_method = denoise_method
+        self.use_super_res = use_super_res
+        self.carn_model_path = carn_model_path
+        # CARN 模型变体：auto 按 carn_runtime.py export 生成的清单选择精度达标且最快的变体
+        self.carn_variant = carn_variant
+        # CARN 分块推理：块大小决定峰值内存；text_only 时只对检测到文字的块超分
+        self.sr_tile_size = sr_tile_size
+        self.sr_tile_overlap = sr_tile_overlap
+        self.sr_text_only = sr_text_only
+        # CARN 批量推理：同尺寸的块合并前向；sr_threads=0 表示使用 torch 默认线程数
+        self.sr_batch_size = sr_batch_size
+        self.sr_threads = sr_threads
+        self.sr_channels_last = sr_channels_last
+        self.dpi = dpi  # PDF 页面渲染 DPI (自适应模式下作为估计失败时的默认值)
+        # 自适应 DPI：先低分辨率试渲染估计字高，再选择让字高落在识别器最佳范围内的最低 DPI
+        self.adaptive_dpi = adaptive_dpi
+        self.min_dpi = min_dpi
+        self.max_dpi = max_dpi
+        self.max_page_megapixels = max_page_megapixels  # 单页像素上限，防止大幅面图纸渲染出超大图像
+        self.workers = max(1, int(workers))  # 1 表示在当前线程中串行处理
+        # 单进程流水线 (workers=1 时有效)：渲染 / 超分 / 识别分别在各自的线程中进行，
+        # 阶段之间用容量为 pipeline_queue_size 的队列连接；识别阶段 pipeline_ocr_threads 个线程各持有一套引擎
+        self.pipeline = pipeline
+        self.pipeline_ocr_threads = max(1, int(pipeline_ocr_threads))
+        self.pipeline_queue_size = max(1, int(pipeline_queue_size))
+        # PDF 页面带有可靠的文本层时直接提取文本，不渲染也不 OCR
+        self.use_text_layer = use_text_layer
+        self.text_layer_min_chars = text_layer_min_chars
+        # 输出格式："text" ({文件名}_ocr.txt)、"jsonl" ({文件名}_ocr.jsonl，含版面块) 或 "both"；不影响识别结果
+        self.output_format = output_format
+        # 本机 OCR 模型服务地址 (见 ocr_server.py)；设置后页面交给常驻模型的服务处理，
+        # workers 表示同时发送的请求数。服务不可达时按 workers / pipeline 使用进程内执行方式
+        self.server_url = server_url
+        # OCR 前的页面预筛 (见 page_screen.py)：墨迹覆盖率极低的空白页不识别；
+        # 与批次中较早页面相同 (感知哈希 + 墨迹掩码比较) 的页面复用该页的识别结果
+        self.skip_blank_pages = skip_blank_pages
+        self.dedup_pages = dedup_pages
+        # Tesseract 区域识别 (见 text_regions.py)：在二值化页面上检测文字区域，跳过插图和空白，
+        # 每个区域按单行/段落/栏选择 psm，由 region_threads 个线程并行识别 (0 表示按 CPU 核数与进程数自动选择)。
+        # 区域检测需要正向的页面，所以区域识别时方向检测总是按 separate 方式先做 OSD
+        self.region_ocr = region_ocr
+        self.region_threads = max(0, int(region_threads))
+        # 保存页面图像 (OCRBatchRunner save_images) 的格式与后台写入线程数 (见 page_images.py)：
+        # "png" (png_level 0~9)、"webp" (无损) 或 "npy" (原始数组，可内存映射)；不影响识别结果。
+        # reuse_saved_pages 时 PDF 页面若已有相同 DPI 的 npy 文件 (且比 PDF 新)，内存映射该文件代替渲染
+        self.image_format = image_format if image_format in IMAGE_FORMATS else "png"
+        self.png_level = png_level
+        self.image_threads = max(1, int(image_threads))
+        self.reuse_saved_pages = reuse_saved_pages
+        self.route_sample_pages = max(1, int(route_sample_pages))
+
+    def to_dict(self):
+        """全部参数 (JSON 可序列化)，用于发送给 OCR 服务"""
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, values):
+        """由 to_dict 的结果重建；忽略不认识的键 (客户端与服务端版本不同时)"""
+        settings = cls()
+        for key, value in values.items():
+            if hasattr(settings, key):
+                setattr(settings, key, value)
+        return settings
+
+    @property
+    def collect_layout(self):
+        """是否需要收集版面块 (bbox、块类型、置信度) 用于 JSONL 输出"""
+        return self.output_format in ("jsonl", "both")
+
+    def cache_fingerprint(self):
+        """影响识别结果的参数 (用于结果缓存键)；不含进程数等与结果无关的参数"""
+        fingerprint = {
+            "language": self.language,
+            "osd": self.osd_mode if self.perform_osd else False,
+            "crop": self.perform_crop,
+            "clahe": self.perform_clahe,
+            "denoise": self.denoise_method if self.perform_denoise else False,
+            "dpi": (f"auto:{self.min_dpi}-{self.max_dpi}/{self.max_page_megapixels}MP/{self.dpi}"
+                    if self.adaptive_dpi else self.dpi),
+            "sr": self.use_super_res,
+        }
+        if self.region_ocr:  # 区域识别的分割方式不同，结果与整页识别不完全相同
+            fingerprint["regions"] = True
+        if self.use_super_res:
+            fingerprint["sr_tiling"] = [self.sr_tile_size, self.sr_tile_overlap, self.sr_text_only]
+            try:  # 模型权重变化时缓存失效
+                st = os.stat(self.carn_model_path)
+                fingerprint["carn_model"] = [os.path.abspath(self.carn_model_path), st.st_size, int(st.st_mtime)]
+            except OSError:
+                fingerprint["carn_model"] = self.carn_model_path
+            fingerprint["carn_variant"] = self._resolved_carn_variant()
+        return fingerprint
+
+    def _resolved_carn_variant(self):
+        """auto 时解析为实际会加载的变体 (int8 输出与 fp32 略有差异，需要区分缓存)"""
+        if self.carn_variant != "auto" or not os.path.exists(self.carn_model_path) or not load_torch():
+            return self.carn_variant
+        from carn_runtime import choose_carn_variant
+        return choose_carn_variant(self.carn_model_path, self.carn_variant)
+
+
+class PageTask:
+    """ 一个待识别的页面：PDF 的某一页，或一个图像文件 """
+
+    def __init__(self, file_index, file_path, page_index=None, num_pages=1, image_save_path=None, page_hash=None,
+                 native_text=None, route=None):
+        self.file_index = file_index
+        self.file_path = file_path
+        self.page_index = page_index  # PDF 页索引 (0-based)；图像文件为 None
+        self.num_pages = num_pages
+        self.image_save_path = image_save_path  # 需要保存页面图像时的目标路径
+        self.page_hash = page_hash  # 页面内容指纹 (启用结果缓存时计算)
+        self.native_text = native_text  # PDF 内嵌文本层 (可用时该页跳过 OCR)
+        # 自动选择引擎时由批处理指定：SAMPLE_ROUTE 两种引擎各识别一次，或为该文件选中的引擎
+        self.route = route
+
+    @property
+    def is_pdf_page(self):
+        return self.page_index is not None
+
+    @property
+    def page_num(self):
+        return self.page_index + 1 if self.is_pdf_page else 1
+
+    @property
+    def description(self):
+        return f"PDF页 {self.page_num}" if self.is_pdf_page else "图像文件"
+
+
+class PageResult:
+    """ 单个页面任务的处理结果 """
+
+    def __init__(self, task, text="", elapsed=0.0, error=None, cancelled=False, engine=None, source="ocr",
+                 stats=None, layout=None, sample=None):
+        self.task = task
+        self.text = text
+        self.elapsed = elapsed
+        self.error = error  # 处理异常的描述；None 表示没有异常
+        self.cancelled = cancelled
+        self.engine = engine  # 实际使用的引擎 (PP-Structure 加载失败时可能为 Tesseract)
+        self.source = source  # "ocr" 本次识别, "cache" 结果缓存, "journal" 检查点续跑
+        self.stats = stats or {}  # 各阶段统计 (如 sr_images / sr_tiles / sr_seconds)，由批处理汇总
+        # 版面信息 {"size": [宽, 高], "blocks": [...]} (只在 settings.collect_layout 时收集)，用于 JSONL 输出
+        self.layout = layout
+        self.sample = sample  # 采样页的 engine_router.PageSample (自动选择引擎时)
+
+    @property
+    def status(self):
+        """页面状态："ok" / "error" / "cancelled" (决定是否缓存、是否写出最终文件，不再检查文本内容)"""
+        if self.cancelled:
+            return "cancelled"
+        return "error" if self.error else "ok"
+
+
+class OCREngine:
+    """ 单图像 OCR 流程 (CARN 超分 + PP-Structure / Tesseract)，不依赖任何 GUI 组件 """
+
+    def __init__(self, settings, log=None, should_stop=None):
+        self.settings = settings
+        self.log_message = log or _default_log
+        self.should_stop = should_stop or (lambda: False)
+        self.engine_choice = settings.engine  # 加载失败时可能回退为 Tesseract
+
+        self.ppstructure_model_instance = None
+        self.carn_model_instance = None
+        self.carn_upscaler = None
+        self.page_stats = {}  # 当前页面的阶段统计，随 PageResult 返回
+        # 当前页面的处理状态：各处理函数失败时除了返回说明文本，还在这里记录错误，随 PageResult.error 返回
+        self.page_error = None
+        self.page_cancelled = False
+        self.page_layout = None  # 当前页面的版面块 (settings.collect_layout 时)
+        self.page_engine = None  # 当前页面实际使用的引擎 (自动选择引擎时逐页不同)
+        self.page_confidence = None  # 当前页面的平均识别置信度 (0~100，引擎没有给出时为 None)
+        self.page_tables = 0  # 当前页面 PP-Structure 检测到的表格数
+        self.page_sample = None  # 当前页面为采样页时的 PageSample
+        self.ppstructure_ready = False
+        self.carn_ready = False
+
+        # 最近打开的 PDF (路径, 修改时间, 大小) -> fitz.Document，最近使用的在末尾；同一文件的页面无需重复打开，
+        # 文件被修改后按新的键重新打开
+        self._open_docs = OrderedDict()
+        self._page_buffer = None  # PDF 页面图像缓冲区，尺寸不变时逐页复用
+        self._image_writer = None  # 后台保存页面图像 (page_images.AsyncImageWriter)，第一次保存时创建
+        self._render_dpi = None  # 最近一次 load_task_image 的渲染 DPI (npy 文件名使用)
+        self._image_reused = False  # 最近一次 load_task_image 是否映射了已保存的原始页面
+        self.tess_capi = None  # 进程内 libtesseract (tess_capi.TesseractCAPI)，语言模型只加载一次
+        self._tess_capi_checked = False
+        self._osd_baseline_seconds = None  # 合并方向检测时，首页测得的一次独立 OSD 耗时 (用于估计节省的时间)
+        # 区域识别：线程池与各线程使用的 libtesseract 识别器 (TessBaseAPI 不能跨线程共用，每个线程取一个)
+        self._region_executor = None
+        self._region_capis = queue.SimpleQueue()
+        # 预处理链：缓冲区与 CLAHE 对象在本进程内逐页复用
+        self.preprocessor = OCRPreprocessor(settings.perform_clahe, settings.perform_denoise, settings.denoise_method)
+
+    # --- 模型加载 ---
+    def load_models(self):
+        """按设置加载所需模型；PP-Structure 失败时回退到 Tesseract。返回是否有可用引擎"""
+        if self.engine_choice == AUTO_ENGINE:
+            self.ppstructure_ready = self._load_ppstructure_model()
+            if not (self.ppstructure_ready and load_tesseract() and TESSERACT_PATH):
+                self.engine_choice = "PP-Structure" if self.ppstructure_ready else "Tesseract"
+                self.log_message(f"自动选择引擎需要 PP-Structure 与 Tesseract 都可用，只使用 {self.engine_choice}。",
+                                 logging.WARNING)
+
+        if self.engine_choice == "PP-Structure" and not self.ppstructure_ready:
+            self.ppstructure_ready = self._load_ppstructure_model()
+            if not self.ppstructure_ready:
+                self.log_message("PP-Structure 加载失败，尝试切换到 Tesseract。", logging.ERROR)
+                if load_tesseract():
+                    self.engine_choice = "Tesseract"
+                    self.log_message("已切换到 Tesseract 引擎。", logging.INFO)
+                else:
+                    self.log_message("Tesseract 也不可用，无法继续。", logging.CRITICAL)
+                    return False
+
+        if self.settings.perform_osd:  # PP-Structure 流程的方向检测同样依赖 Tesseract
+            load_tesseract()
+
+        if self.settings.use_super_res:  # 只有在勾选了超分时才加载
+            self.carn_ready = self._load_carn_model()
+            if not self.carn_ready:
+                self.log_message("CARN 模型加载失败，超分辨率功能已禁用。", logging.ERROR)
+
+        if self.engine_choice == "Tesseract" and not (load_tesseract() and TESSERACT_PATH):
+            self.log_message("错误: Tesseract 未配置，无法作为处理方案。", logging.CRITICAL)
+            return False
+        if self.engine_choice in ("Tesseract", AUTO_ENGINE):
+            self._tesseract_capi()
+        return True
+
+    def _tesseract_capi(self):
+        """进程内 libtesseract 识别器 (首次调用时查找库)；不可用或被禁用时返回 None，调用方使用 pytesseract"""
+        if self._tess_capi_checked:
+            return self.tess_capi
+        self._tess_capi_checked = True
+        if self.settings.tesseract_backend == "cli":
+            return None
+        from tess_capi import TesseractCAPI, find_libtesseract
+        lib = find_libtesseract(TESSERACT_PATH)
+        if lib is None:
+            self.log_message("未找到 libtesseract (可用 TESSERACT_LIB 指定)，Tesseract 将以子进程方式调用。",
+                             logging.WARNING if self.settings.tesseract_backend == "capi" else logging.DEBUG)
+            return None
+        self.tess_capi = TesseractCAPI(lib, TESSDATA_DIR)
+        self.log_message(f"使用进程内 libtesseract {self.tess_capi.version} (语言模型只加载一次)。", logging.INFO)
+        return self.tess_capi
+
+    def _combined_osd_enabled(self):
+        """
+        是否用合并方式检测方向 (两种 Tesseract 后端都可以)：
+        libtesseract 的识别语言模型可以加载时按识别置信度决定是否 OSD，否则 (pytesseract) 在缩略图上做 OSD
+        """
+        if not (self.settings.perform_osd and self.settings.osd_mode == "combined" and TESSERACT_AVAILABLE):
+            return False
+        capi = self._tesseract_capi()
+        if capi is not None:
+            try:
+                capi.load(tesseract_language(self.settings.language))
+            except TesseractCAPIError as e:
+                self._disable_tesseract_capi(e)
+        return True
+
+    def _disable_tesseract_capi(self, error):
+        """libtesseract 加载语言模型失败 (如 tessdata 路径不兼容) 时释放句柄，本进程后续改用 pytesseract"""
+        self.log_message(f"        进程内 Tesseract 不可用: {error}，改用 pytesseract。", logging.WARNING)
+        if self.tess_capi is not None:
+            self.tess_capi.close()
+        self.tess_capi = None
+
+    def _load_ppstructure_model(self):
+        if self.ppstructure_model_instance is None and load_ppstructure():
+            self.log_message("首次使用，正在加载 PP-Structure 模型...", logging.INFO)
+            try:
+                use_gpu = False  # 默认CPU，除非显式检测到CUDA
+                if paddle.device.is_compiled_with_cuda():
+                    try:
+                        if paddle.device.cuda.device_count() > 0:
+                            use_gpu = True
+                    except Exception as e:  # 处理 paddle.device.cuda 不可用的情况
+                        self.log_message(f"检测CUDA设备时出错: {e}，将使用CPU。", logging.WARNING)
+
+                self.log_message(f"PP-Structure 将使用 {'GPU' if use_gpu else 'CPU'}。", logging.INFO)
+
+                # 从 self.settings.language 中提取主语言给 PPStructure
+                # PPStructure 通常使用 'ch', 'en' 等，而不是 Tesseract 的 'chi_sim+eng'
+                lang_for_pp = self.settings.language.split('+')[0]
+                if lang_for_pp == 'chi_sim': lang_for_pp = 'ch'  # 修正
+
+                self.ppstructure_model_instance = PPStructure(
+                    show_log=False,  # 通常在 PaddleOCR 内部关闭，我们用自己的日志
+                    use_gpu=use_gpu,
+                    lang=lang_for_pp  # 使用提取的语言
+                )
+                self.log_message("PP-Structure 模型加载成功。", logging.INFO)
+                return True
+            except Exception as e:
+                self.log_message(f"错误：加载 PP-Structure 模型失败: {e}", logging.ERROR)
+                traceback.print_exc()
+                self.ppstructure_model_instance = None
+                return False
+        elif self.ppstructure_model_instance:
+            return True
+        else:
+            return False
+
+    def load_sr_model(self):
+        """只加载 CARN 超分模型 (流水线的超分阶段使用)。返回是否可用"""
+        self.carn_ready = self._load_carn_model()
+        return self.carn_ready
+
+    def _load_carn_model(self):
+        if self.carn_model_instance is None and load_torch():
+            model_path = self.settings.carn_model_path
+            if not os.path.exists(model_path):
+                self.log_message(f"错误：CARN 模型权重文件不存在: {model_path}", logging.ERROR)
+                return False
+            self.log_message(f"首次使用，正在加载 CARN 超分模型: {model_path}", logging.INFO)
+            try:
+                from carn_runtime import CarnUpscaler, load_carn_variant
+                # 强制 CPU；变体文件缺失或加载失败时回退到 fp32 eager 模型
+                self.carn_model_instance, variant = load_carn_variant(model_path, self.settings.carn_variant,
+                                                                      log=self.log_message)
+                if self.settings.sr_threads > 0:
+                    torch.set_num_threads(self.settings.sr_threads)
+                self.carn_upscaler = CarnUpscaler(self.carn_model_instance, tile_size=self.settings.sr_tile_size,
+                                                  tile_overlap=self.settings.sr_tile_overlap,
+                                                  text_only=self.settings.sr_text_only,
+                                                  batch_size=self.settings.sr_batch_size,
+                                                  channels_last=self.settings.sr_channels_last)
+                self.log_message(f"CARN 模型加载成功 ({variant}, CPU, 分块 {self.settings.sr_tile_size}px, "
+                                 f"重叠 {self.settings.sr_tile_overlap}px, batch {self.settings.sr_batch_size}, "
+                                 f"线程 {torch.get_num_threads()}"
+                                 f"{', channels_last' if self.settings.sr_channels_last else ''})。", logging.INFO)
+                return True
+            except Exception as e:
+                self.log_message(f"错误：加载 CARN 模型失败: {e}", logging.ERROR)
+                traceback.print_exc()
+                self.carn_model_instance = None
+                return False
+        elif self.carn_model_instance:
+            return True
+        else:  # 不可用
+            return False
+
+    def close(self):
+        """释放打开的 PDF 文档"""
+        while self._open_docs:
+            self._open_docs.popitem()[1].close()
+
+    def _document(self, path):
+        """打开的 PDF (最多保留 MAX_OPEN_DOCS 个，按最近使用淘汰)"""
+        st = os.stat(path)
+        key = (path, st.st_mtime_ns, st.st_size)
+        doc = self._open_docs.pop(key, None)
+        if doc is None:
+            for stale in [k for k in self._open_docs if k[0] == path]:  # 文件已被修改
+                self._open_docs.pop(stale).close()
+            while len(self._open_docs) >= MAX_OPEN_DOCS:
+                self._open_docs.popitem(last=False)[1].close()
+            doc = fitz.open(path)
+        self._open_docs[key] = doc
+        return doc
+
+    def shutdown(self):
+        """
+        批处理结束：关闭文档、等待后台图像写完并卸载常驻的 Tesseract 语言模型。
+        返回图像保存统计 (AsyncImageWriter.summary)；没有保存图像时返回 None。
+        """
+        self.close()
+        image_stats = self._close_image_writer()
+        if self.tess_capi is not None:
+            self.tess_capi.close()
+        if self._region_executor is not None:
+            self._region_executor.shutdown()
+            self._region_executor = None
+        while not self._region_capis.empty():
+            self._region_capis.get().close()
+        return image_stats
+
+    def _close_image_writer(self):
+        """等待后台图像写完并记录统计；返回 AsyncImageWriter.summary()，没有写入器时返回 None"""
+        if self._image_writer is None:
+            return None
+        self._image_writer.close()
+        self.log_message(self._image_writer.stats_message)
+        image_stats = self._image_writer.summary()
+        self._image_writer = None
+        return image_stats
+
+    def swap_image_writer(self, writer):
+        """换用调用方管理的写入器 (OCR 服务为每个客户端运行各用一个)，返回原来的写入器"""
+        previous, self._image_writer = self._image_writer, writer
+        return previous
+
+    # --- 页面任务 ---
+    def load_task_image(self, task, reuse_buffer=True):
+        """
+        读取任务对应的页面图像 (cv2 BGR 格式)。
+        PDF 页面直接转换到复用的缓冲区中，返回的数组在下一次调用前有效；
+        reuse_buffer=False 时每页分配新数组 (流水线中图像要交给其他线程，不能被下一页覆盖)。
+        保存格式为 npy 且已有相同 DPI 的原始页面文件时，返回该文件的内存映射 (不渲染)。
+        """
+        self._image_reused = False
+        if task.is_pdf_page:
+            start = perf_counter()
+            page = self._document(task.file_path).load_page(task.page_index)
+            self._render_dpi = self._page_dpi(page, task)
+            if task.image_save_path and self.settings.image_format == "npy" and self.settings.reuse_saved_pages:
+                image = load_raw_page(raw_page_path(task.image_save_path, self._render_dpi), task.file_path)
+                if image is not None:
+                    self._image_reused = True
+                    _add_stats(self.page_stats, image_reused=1)
+                    self.log_message(f"    {task.description} 使用已保存的原始页面 (内存映射)，跳过渲染。",
+                                     logging.DEBUG)
+                    return image
+            pix = page.get_pixmap(dpi=self._render_dpi)
+            if not reuse_buffer:
+                image = pixmap_to_bgr(pix)
+            else:
+                self._page_buffer = image = pixmap_to_bgr(pix, self._page_buffer)
+            _add_stats(self.page_stats, render_pages=1, render_seconds=perf_counter() - start)
+            return image
+
+        # 使用 OpenCV 读取图像，因为它返回 BGR numpy 数组，与后续处理一致
+        input_image_cv = cv2.imread(task.file_path)
+        if input_image_cv is None:
+            raise IOError(f"无法加载图像文件: {task.file_path}")
+        return input_image_cv
+
+    def _page_dpi(self, page, task):
+        """PDF 页面渲染 DPI：固定 settings.dpi，或自适应模式下按估计字高选择"""
+        if not self.settings.adaptive_dpi:
+            return self.settings.dpi  # 提高DPI获取更高质量图像
+        try:
+            dpi, text_height = choose_page_dpi(page, self.settings.dpi, self.settings.min_dpi,
+                                               self.settings.max_dpi, self.settings.max_page_megapixels)
+        except Exception as e:
+            self.log_message(f"    {task.description} 自适应 DPI 估计失败，使用 {self.settings.dpi} DPI: {e}",
+                             logging.WARNING)
+            return self.settings.dpi
+        height_text = "未知" if text_height is None else f"{text_height:.1f} px@{ADAPTIVE_PROBE_DPI}dpi"
+        self.log_message(f"    {task.description} 自适应 DPI: 估计字高 {height_text} -> 渲染 DPI {dpi}")
+        return dpi
+
+    def run_task(self, task):
+        """处理一个页面任务：读取/渲染图像 -> (可选) 保存图像 -> OCR。返回 PageResult"""
+        start_time = perf_counter()
+        self.begin_page()
+        if self.should_stop():
+            return PageResult(task, cancelled=True)
+        try:
+            image_cv = self.load_task_image(task)
+            self.save_task_image(task, image_cv)
+
+            if self.should_stop():
+                return PageResult(task, elapsed=perf_counter() - start_time, cancelled=True)
+            text = self.recognize_task(task, image_cv)
+            return self.page_result(task, text, perf_counter() - start_time)
+        except Exception as page_err:
+            return self.page_exception_result(task, page_err, perf_counter() - start_time)
+
+    # 以下几个方法把 run_task 拆成可以分别调用的步骤，供流水线 (PipelinedPageOCR) 在不同线程中执行
+    def begin_page(self, stats=None):
+        """开始处理一个页面：重置页面状态；stats 为字典时各阶段统计累加到该字典 (流水线中跨引擎传递)"""
+        self.page_stats = {} if stats is None else stats
+        self.page_error = None
+        self.page_cancelled = False
+        self.page_layout = None
+        self.page_engine = None
+        self.page_confidence = None
+        self.page_tables = 0
+        self.page_sample = None
+
+    def save_task_image(self, task, image_cv):
+        """
+        按任务要求保存页面图像：交给后台线程编码写盘，识别不等待 (排队的图像达到上限时才等待)。
+        图像来自已保存的原始页面时不再保存；失败只记录警告。
+        """
+        if not task.image_save_path or self._image_reused:
+            return
+        image_format = self.settings.image_format
+        if image_format == "npy":
+            save_path = raw_page_path(task.image_save_path, self._render_dpi if task.is_pdf_page else None)
+        else:
+            save_path = image_path(task.image_save_path, image_format)
+        try:
+            # 复用的引擎 (OCR 服务) 换了保存参数时，先写完旧写入器排队的图像再按新参数创建
+            if self._image_writer is not None and not self._image_writer.matches(
+                    image_format, self.settings.png_level, self.settings.image_threads):
+                self._close_image_writer()
+            if self._image_writer is None:
+                self._image_writer = AsyncImageWriter(image_format, self.settings.png_level,
+                                                      self.settings.image_threads, log=self.log_message)
+            # 复用的页面缓冲区会被下一页覆盖，排队前复制 (远快于编码)
+            image = image_cv.copy() if image_cv is self._page_buffer else image_cv
+            waited = self._image_writer.submit(save_path, image)
+            _add_stats(self.page_stats, image_saves=1, image_save_wait=waited)
+            self.log_message(f"    已排队保存图像: {save_path}", level=logging.DEBUG)
+        except Exception as e_save:
+            self.log_message(f"    保存图像失败: {e_save}", logging.WARNING)
+
+    def page_result(self, task, text, elapsed):
+        """由当前页面状态生成 PageResult"""
+        if self.page_cancelled:
+            return PageResult(task, elapsed=elapsed, cancelled=True)
+        return PageResult(task, text, elapsed, error=self.page_error, engine=self.page_engine or self.engine_choice,
+                          stats=self.page_stats, layout=self.page_layout, sample=self.page_sample)
+
+    def page_exception_result(self, task, page_err, elapsed):
+        """页面处理抛出异常时的 PageResult"""
+        self.log_message(f"    处理 {task.description} 时发生错误: {page_err}", logging.ERROR)
+        traceback.print_exc()
+        if task.is_pdf_page:
+            text = f"\n--- PDF 第 {task.page_num} 页 (处理错误: {page_err}) ---\n"
+        else:
+            text = f"[错误: 处理图像 {os.path.basename(task.file_path)} 失败: {page_err}]"
+        return PageResult(task, text, elapsed, error=str(page_err))
+
+    def recognize_task(self, task, img_cv_bgr, apply_sr=None):
+        """
+        识别任务的页面图像，返回文本。自动选择引擎时按批处理指定的 task.route：采样页两种引擎各识别一次
+        (见 _sample_engines)，否则交给为该文件选中的引擎 (没有指定时使用 PP-Structure)。
+        """
+        if self.engine_choice != AUTO_ENGINE:
+            return self.process_image(img_cv_bgr, task.description, apply_sr)
+        if task.route == SAMPLE_ROUTE:
+            return self._sample_engines(task, img_cv_bgr, apply_sr)
+        engine = task.route if task.route in ROUTED_ENGINES else "PP-Structure"
+        return self.process_image(img_cv_bgr, task.description, apply_sr, engine=engine)
+
+    def _sample_engines(self, task, img_cv_bgr, apply_sr=None):
+        """
+        采样页：两种引擎各识别一次，结果统计记录在 page_sample 中 (由批处理的 EngineRouter 汇总)，
+        输出 PageSample.output_engine 选中的结果。页面统计 (预处理、方向检测等) 只保留输出的那次识别。
+        """
+        if apply_sr is None:
+            apply_sr = self.settings.use_super_res and self.carn_ready
+        if apply_sr:  # 超分只做一次，两种引擎识别同一张图像
+            img_cv_bgr = self.super_resolve(img_cv_bgr, task.description)
+        base_stats = dict(self.page_stats)
+        runs = {}
+        for engine in ROUTED_ENGINES:
+            self.page_stats.clear()
+            self.page_stats.update(base_stats)
+            self.page_error, self.page_layout, self.page_confidence, self.page_tables = None, None, None, 0
+            start = perf_counter()
+            text = self.process_image(img_cv_bgr, task.description, apply_sr=False, engine=engine)
+            if self.page_cancelled:
+                return text
+            body = split_page_text(text)[1]
+            runs[engine] = (text, self.page_error, self.page_layout, dict(self.page_stats), body,
+                            EngineSample(engine, perf_counter() - start, self.page_confidence,
+                                         len("".join(body.split())), self.page_tables))
+        ok = {engine: run for engine, run in runs.items() if run[1] is None}
+        agreement = text_agreement(ok["Tesseract"][4], ok["PP-Structure"][4]) if len(ok) == 2 else None
+        self.page_sample = PageSample({engine: run[5] for engine, run in ok.items()}, agreement)
+        chosen = self.page_sample.output_engine() or "PP-Structure"  # 两种引擎都失败
+        text, self.page_error, self.page_layout, stats, _, _ = runs[chosen]
+        self.page_stats.clear()
+        self.page_stats.update(stats)
+        self.page_engine = chosen
+        extra = sum(run[5].seconds for engine, run in runs.items() if engine != chosen)
+        _add_stats(self.page_stats, **{"route_sampled": 1, "route_overhead_seconds": extra, f"route_{chosen}": 1})
+        return text
+
+    def process_image(self, img_cv_bgr, image_description="图像", apply_sr=None, engine=None):
+        """
+        按当前引擎 (或指定的 engine) 处理单个图像，返回文本。
+        apply_sr=False 用于超分已在流水线前一阶段完成的图像
+        """
+        if apply_sr is None:
+            apply_sr = self.settings.use_super_res and self.carn_ready
+        engine = engine or self.engine_choice
+        self.page_engine = engine
+        if engine == "PP-Structure" and self.ppstructure_ready:
+            return self._process_single_image_with_ppstructure(img_cv_bgr, apply_sr, image_description)
+        elif engine == "Tesseract" and TESSERACT_AVAILABLE:
+            return self._process_single_image_with_tesseract(img_cv_bgr, apply_sr, image_description)
+        raise RuntimeError("无可用 OCR 引擎")
+
+    def super_resolve(self, img_cv_bgr, image_description="图像"):
+        """CARN 超分 (模型未加载时原样返回)；失败时记录警告并返回原图"""
+        if not self.carn_model_instance:
+            return img_cv_bgr
+        self.log_message(f"    对 {image_description} 应用 CARN 超分辨率...")
+        sr_start_time = perf_counter()
+        resolved_img = self._apply_carn_super_resolution(img_cv_bgr)  # _apply_carn_super_resolution 已有日志
+        if resolved_img is None:
+            self.log_message(f"      CARN 超分失败，对 {image_description} 使用原始图像。", logging.WARNING)
+            return img_cv_bgr
+        self.log_message(f"      CARN 超分完成 (耗时 {perf_counter() - sr_start_time:.2f} 秒)。")
+        return resolved_img
+
+    def _page_failed(self, error, text):
+        """记录当前页面失败 (保留第一个错误)，返回写入结果的说明文本"""
+        if self.page_error is None:
+            self.page_error = str(error)
+        return text
+
+    # --- 单个图像处理函数 ---
+    # 这些函数接收 cv2 图像数据 (BGR格式)
+
+    def _process_single_image_with_ppstructure(self, img_cv_bgr, apply_sr, image_description="图像"):
+        """使用 PP-Structure 处理单个图像 (cv2 BGR格式)"""
+        if not self.ppstructure_model_instance:
+            return self._page_failed("PP-Structure 模型未加载",
+                                     f"[错误: PP-Structure 模型未加载 ({image_description})]")
+
+        page_content = f"\n--- {image_description} (PP-Structure 处理失败) ---\n"
+        try:
+            img_to_process = img_cv_bgr  # 后续步骤均生成新数组，不修改输入
+
+            # 1. 应用超分辨率 (如果启用且模型可用)
+            if apply_sr:
+                img_to_process = self.super_resolve(img_to_process, image_description)
+
+            # 2. 调用 PP-Structure 模型
+            self.log_message(f"    调用 PP-Structure 分析 {image_description}...")
+            pp_start_time = perf_counter()
+            # PP-Structure 输入通常是 BGR numpy 数组
+            results = self.ppstructure_model_instance(img_to_process)
+            pp_end_time = perf_counter()
+            self.log_message(f"      PP-Structure 分析完成 (耗时 {pp_end_time - pp_start_time:.2f} 秒)。")
+
+            if self.settings.collect_layout:
+                h, w = img_to_process.shape[:2]
+                self.page_layout = {"size": [w, h], "blocks": ppstructure_blocks(results)}
+
+            # 3. 解析并格式化结果
+            page_blocks_text = []
+            scored_chars = 0  # 按文字长度加权的平均置信度 (自动选择引擎时记录在采样日志中)
+            weighted_score = 0.0
+            if results:
+                for item in results:
+                    block_type = item.get('type', 'Unknown').lower()
+                    # res 可能是 (text, score)、字符串、逐行识别结果列表或表格字典 (见 ppstructure_block_content)
+                    actual_text, score, _ = ppstructure_block_content(item.get('res', ''))
+                    if score is not None and actual_text:
+                        scored_chars += len(actual_text)
+                        weighted_score += float(score) * 100 * len(actual_text)
+                    if block_type == 'table':
+                        self.page_tables += 1
+
+                    if block_type in ['text', 'title', 'list', 'header', 'footer']:
+                        page_blocks_text.append(actual_text)
+                    elif block_type == 'table':
+                        page_blocks_text.append(f"\n[表格开始]\n{actual_text}\n[表格结束]\n")
+                    elif block_type == 'figure':
+                        page_blocks_text.append(f"[图片区域: {item.get('img_idx', '')}]")  # PP-Structure 可能返回图片索引
+                    else:  # 其他或未知类型
+                        if actual_text:  # 只添加有内容的未知块
+                            page_blocks_text.append(f"[{block_type.upper()}]: {actual_text}")
+
+                if scored_chars:
+                    self.page_confidence = weighted_score / scored_chars
+                if page_blocks_text:
+                    page_content = f"\n--- {image_description} (PP-Structure) ---\n" + "\n".join(
+                        page_blocks_text) + "\n"
+                else:
+                    page_content = f"\n--- {image_description} (PP-Structure 未识别到内容) ---\n"
+            else:
+                page_content = f"\n--- {image_description} (PP-Structure 未返回结果) ---\n"
+            return page_content
+
+        except Exception as page_err:
+            self.log_message(f"    处理 {image_description} (PP-Structure) 时发生错误: {page_err}", logging.ERROR)
+            traceback.print_exc()
+            return self._page_failed(page_err,
+                                     f"\n--- {image_description} (PP-Structure 处理时发生错误: {page_err}) ---\n")
+
+    def _process_single_image_with_tesseract(self, img_cv_bgr, apply_sr, image_description="图像"):
+        """使用 Tesseract 处理单个图像 (cv2 BGR格式)"""
+        if not TESSERACT_AVAILABLE:
+            return self._page_failed("Tesseract 不可用", f"[错误: Tesseract 不可用 ({image_description})]")
+
+        page_content = f"\n--- {image_description} (Tesseract 处理失败) ---\n"
+        try:
+            img_to_process = img_cv_bgr
+
+            # 1. 应用超分辨率
+            if apply_sr:
+                img_to_process = self.super_resolve(img_to_process, image_description)
+
+            if self.should_stop():
+                self.page_cancelled = True
+                return f"\n--- {image_description} (已取消) ---\n"
+
+            # 2. 预处理 I: 旋转和裁剪 (OSD依赖Tesseract自身)
+            # 合并方向检测时这里不做 OSD，方向由识别时的版面分析给出 (区域识别需要先转正页面，不合并)
+            combined_osd = not self.settings.region_ocr and self._combined_osd_enabled()
+            # 注意: _preprocess_for_layout 内部已有日志
+            img_layout_processed = self._preprocess_for_layout(img_to_process, run_osd=not combined_osd)
+            if img_layout_processed is None:  # 预处理失败
+                self.log_message(f"    {image_description} 布局预处理失败，跳过后续Tesseract处理。", logging.WARNING)
+                return self._page_failed("布局预处理失败",
+                                         f"\n--- {image_description} (Tesseract 布局预处理失败) ---\n")
+
+            # 3. 预处理 II: OCR 准备 (灰度, CLAHE, 去噪, 二值化)
+            self.log_message(f"    对 {image_description} 进行 OCR 预处理 (Tesseract)...")
+            # _preprocess_for_ocr 返回二值化的灰度数组
+            img_ocr_ready = self._preprocess_for_ocr(img_layout_processed)
+            if img_ocr_ready is None:
+                self.log_message(f"    {image_description} OCR预处理失败，跳过Tesseract OCR。", logging.WARNING)
+                return self._page_failed("OCR 预处理失败",
+                                         f"\n--- {image_description} (Tesseract OCR预处理失败) ---\n")
+
+            # 4. 执行整页 OCR (Tesseract)，或只识别检测到的文字区域
+            self.log_message(f"    对 {image_description} 执行{'区域' if self.settings.region_ocr else '整页'} "
+                             f"Tesseract OCR...")
+            ocr_start_time = perf_counter()
+            # _ocr_text_block_tesseract 内部有日志
+            ocr_result = None
+            if combined_osd:
+                ocr_result = self._ocr_tesseract_with_orientation(img_ocr_ready)
+            elif self.settings.region_ocr:
+                ocr_result = self._ocr_tesseract_regions(img_ocr_ready)  # 不适合分区域时返回 None
+            if ocr_result is None:
+                ocr_result = self._ocr_text_block_tesseract(img_ocr_ready,
+                                                            psm=3)  # PSM 3: Auto page segmentation
+            ocr_end_time = perf_counter()
+            self.log_message(f"      Tesseract OCR 完成 (耗时 {ocr_end_time - ocr_start_time:.2f} 秒)。")
+
+            page_content = f"\n--- {image_description} (Tesseract) ---\n{ocr_result}\n"
+            return page_content
+
+        except Exception as page_err:
+            self.log_message(f"    处理 {image_description} (Tesseract) 时发生错误: {page_err}", logging.ERROR)
+            traceback.print_exc()
+            return self._page_failed(page_err,
+                                     f"\n--- {image_description} (Tesseract 处理时发生错误: {page_err}) ---\n")
+
+    # --- 超分辨率辅助方法 ---
+    def _apply_carn_super_resolution(self, img_cv_bgr):
+        if not self.carn_model_instance:
+            self.log_message("      CARN 模型未加载，无法超分。", logging.WARNING)
+            return None
+        try:
+            # 分块推理：峰值内存由块大小决定，不随页面尺寸增长
+            upscaler = self.carn_upscaler
+            tiles_total, tiles_sr, sr_seconds = upscaler.tiles_total, upscaler.tiles_sr, upscaler.sr_seconds
+            sr_image_cv_bgr = upscaler.upscale(img_cv_bgr)
+            if self.settings.sr_text_only:
+                self.log_message(f"      CARN 仅处理文字块: {upscaler.tiles_sr - tiles_sr}/"
+                                 f"{upscaler.tiles_total - tiles_total} 块", logging.DEBUG)
+            _add_stats(self.page_stats, sr_images=1, sr_tiles=upscaler.tiles_sr - tiles_sr,
+                       sr_seconds=upscaler.sr_seconds - sr_seconds)
+            return sr_image_cv_bgr
+        except Exception as e:
+            self.log_message(f"      CARN 超分辨率处理失败: {e}", logging.ERROR)
+            # traceback.print_exc() # 可能过于详细，视情况启用
+            return None
+
+    # --- Tesseract 相关辅助方法 ---
+    def _preprocess_for_layout(self, img_cv_bgr, run_osd=True):
+        """Tesseract 流程的预处理 I: 旋转和裁剪. 返回处理后的CV2 BGR图像或None"""
+        processed_img = img_cv_bgr  # 旋转/裁剪都返回新数组或视图，不修改输入
+        if run_osd and self.settings.perform_osd and TESSERACT_AVAILABLE:
+            self.log_message("      执行 OSD 与旋转 (Tesseract)...")
+            rotated_img = self._run_osd_and_rotate(processed_img)  # 内部有日志
+            if rotated_img is not None:
+                processed_img = rotated_img
+            # else: OSD失败，使用原图或之前处理的图
+
+        if self.settings.perform_crop:  # 裁剪不依赖 Tesseract 本身，但逻辑上通常与 Tesseract 流程结合
+            self.log_message("      执行边界裁剪...")
+            cropped_img = self._crop_borders(processed_img)  # 内部有日志
+            if cropped_img is not None and cropped_img.shape[0] > 10 and cropped_img.shape[1] > 10:
+                processed_img = cropped_img
+            # else: 裁剪失败或区域过小，使用原图或之前处理的图
+
+        return processed_img
+
+    def _preprocess_for_ocr(self, img_cv_bgr):
+        """
+        Tesseract 流程的预处理 II: 灰度, CLAHE, 去噪, 二值化 (见 ocr_preprocess.py). 返回二维 uint8 数组或 None。
+        返回的是预处理器的内部缓冲区，在处理下一张图像前有效；各阶段耗时累加到 page_stats。
+        """
+        try:
+            return self.preprocessor.process(img_cv_bgr, self.page_stats,
+                                             log=lambda m: self.log_message(m, logging.DEBUG))
+        except Exception as e:
+            self.log_message(f"        OCR 预处理 (灰度/CLAHE/去噪/二值化) 失败: {e}", logging.ERROR)
+            return None
+
+    def _run_osd_and_rotate(self, image_cv_bgr):
+        if not TESSERACT_AVAILABLE:
+            self.log_message("        Tesseract OSD 跳过 (Tesseract 不可用)。", logging.WARNING)
+            return image_cv_bgr
+        try:
+            # OSD通常在灰度图上效果更好
+            gray = cv2.cvtColor(image_cv_bgr, cv2.COLOR_BGR2GRAY)
+            # 使用 psm 0 进行 OSD
+            osd_data = None
+            osd_start = perf_counter()
+            capi = self._tesseract_capi()
+            if capi is not None:
+                try:
+                    osd_data = capi.image_to_osd(gray)
+                except TesseractCAPIError as e:
+                    if capi.is_loaded("osd"):
+                        raise
+                    self._disable_tesseract_capi(e)
+            if osd_data is None:
+                osd_data = pytesseract.image_to_osd(gray, config='--psm 0', output_type=Output.DICT)
+            _add_stats(self.page_stats, osd_pages=1, osd_seconds=perf_counter() - osd_start)
+            angle = osd_data.get('rotate', 0)
+            script = osd_data.get('script', 'Unknown')
+            confidence = osd_data.get('orientation_conf', 0)  # 获取方向置信度
+            self.log_message(f"        OSD结果: 旋转角度={angle}, 文字={script}, 方向置信度={confidence:.2f}")
+
+            # pytesseract image_to_osd 返回的 'rotate' 是图像需要被旋转的角度以使其 upright,
+            # cv2 旋转是逆时针为正，所以直接使用 -angle。
+            if angle != 0 and confidence > 1.0:  # 设定一个置信度阈值，比如1.0
+                self.log_message(f"        根据OSD旋转图像 {-angle} 度...")
+                _add_stats(self.page_stats, osd_rotated=1)
+                if angle in _CLOCKWISE_ROTATIONS:  # 90 度整数倍：无插值、不裁边 (绕中心旋转会裁掉纵横比不同的页面)
+                    return cv2.rotate(image_cv_bgr, _CLOCKWISE_ROTATIONS[angle])
+                (h, w) = image_cv_bgr.shape[:2]
+                center = (w // 2, h // 2)
+                M = cv2.getRotationMatrix2D(center, -angle, 1.0)
+                # 使用白色填充旋转后的边界
+                rotated = cv2.warpAffine(image_cv_bgr, M, (w, h),
+                                         flags=cv2.INTER_CUBIC,
+                                         borderMode=cv2.BORDER_CONSTANT,
+                                         borderValue=(255, 255, 255))
+                return rotated
+            else:
+                self.log_message("        无需旋转或OSD置信度低。")
+                return image_cv_bgr
+        except (TesseractNotFoundError, TesseractError, TesseractCAPIError) as e:
+            # 提取错误信息的第一行，避免过长日志
+            error_detail = str(e).split('\n', 1)[0]
+            self.log_message(f"        Tesseract OSD 失败: {error_detail}", logging.ERROR)
+            return image_cv_bgr  # 返回原图
+        except Exception as e:
+            self.log_message(f"        OSD或旋转过程中发生意外错误: {e}", logging.ERROR)
+            return image_cv_bgr  # 返回原图
+
+    def _crop_borders(self, image_cv_bgr, border_threshold=200, min_area_ratio=0.5, padding=5):
+        """检测并裁剪图像边框. 返回处理后的CV2 BGR图像或原图"""
+        try:
+            gray = cv2.cvtColor(image_cv_bgr, cv2.COLOR_BGR2GRAY)
+            # 反转二值化，使内容为白色，背景为黑色，以便寻找最大轮廓（内容区域）
+            _, thresh = cv2.threshold(gray, border_threshold, 255, cv2.THRESH_BINARY_INV)
+
+            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            if not contours:
+                self.log_message("        边界裁剪：未找到轮廓。", logging.DEBUG)
+                return image_cv_bgr
+
+            # 找到最大的轮廓，假设它是主要内容区域
+            max_contour = max(contours, key=cv2.contourArea)
+            area = cv2.contourArea(max_contour)
+            img_area = image_cv_bgr.shape[0] * image_cv_bgr.shape[1]
+
+            if area / img_area < min_area_ratio:
+                self.log_message(
+                    f"        边界裁剪：最大轮廓区域过小 ({area / img_area:.2f} < {min_area_ratio})，跳过裁剪。",
+                    logging.DEBUG)
+                return image_cv_bgr
+
+            x, y, w, h = cv2.boundingRect(max_contour)
+
+            # 添加一些内边距，避免裁剪到文字
+            x1 = max(0, x - padding)
+            y1 = max(0, y - padding)
+            x2 = min(image_cv_bgr.shape[1], x + w + padding)
+            y2 = min(image_cv_bgr.shape[0], y + h + padding)
+
+            # 确保裁剪后的区域有效
+            if x2 > x1 and y2 > y1:
+                cropped = image_cv_bgr[y1:y2, x1:x2]
+                self.log_message("        边界裁剪完成。", logging.DEBUG)
+                return cropped
+            else:
+                self.log_message("        边界裁剪：计算得到的裁剪区域无效，跳过。", logging.DEBUG)
+                return image_cv_bgr
+        except Exception as e:
+            self.log_message(f"        边界裁剪出错: {e}", logging.ERROR)
+            return image_cv_bgr  # 出错时返回原图
+
+    def _ocr_tesseract_with_orientation(self, img_block):
+        """
+        合并方向检测：先按原方向识别 (--psm 3 能读出旋转 90/270 度的文字行)，
+        平均置信度 >= OSD_SKIP_CONFIDENCE 或没有识别出文字时直接使用该结果，不做 OSD；
+        否则在缩略图上补做 OSD，页面确实需要旋转时按 90 度整数倍旋转 (无插值、不裁边) 后重新识别。
+        pytesseract 后端没有识别置信度，改为先在缩略图上做 OSD、需要时转正，再识别一次。
+        每个进程的第一页额外做一次整页 OSD，记录其耗时作为估计节省时间的基准 (这次耗时计入方向检测的开销)。
+        """
+        capi = self.tess_capi
+        lang_tess = tesseract_language(self.settings.language)
+        if self._osd_baseline_seconds is None:
+            start = perf_counter()
+            try:
+                self._detect_orientation(img_block, thumbnail=False)
+            except (TesseractNotFoundError, TesseractError, TesseractCAPIError):
+                pass  # 文字过少时 OSD 失败，耗时仍可作为基准
+            self._osd_baseline_seconds = perf_counter() - start
+            _add_stats(self.page_stats, osd_baseline_seconds=self._osd_baseline_seconds)
+        _add_stats(self.page_stats, osd_pages=1, osd_avoided_seconds=self._osd_baseline_seconds)
+        if capi is None:
+            return self._ocr_tesseract_thumbnail_osd(img_block)
+        try:
+            text, confidence, data = self._recognize_with_confidence(img_block, lang_tess)
+            self.page_confidence = confidence
+            if confidence < OSD_SKIP_CONFIDENCE and text.strip():
+                start = perf_counter()
+                text, data, img_block = self._rotate_and_rerun(img_block, text, confidence, data, lang_tess)
+                _add_stats(self.page_stats, osd_checked=1, osd_check_seconds=perf_counter() - start)
+            if data is not None:
+                self._set_tesseract_layout(img_block, data)
+            return text.strip() if text else "[Tesseract识别为空]"
+        except TesseractCAPIError as e:
+            error_detail = str(e).split('\n', 1)[0]
+            self.log_message(f"        OCR (Tesseract) 失败: {error_detail} (语言: {lang_tess})", logging.ERROR)
+            return self._page_failed(error_detail, f"[OCR 错误: {error_detail}]")
+
+    def _ocr_tesseract_thumbnail_osd(self, img_block):
+        """pytesseract 后端的合并方向检测：缩略图 OSD 显示需要旋转时先转正页面，再整页识别一次"""
+        start = perf_counter()
+        try:
+            osd_data = self._detect_orientation(img_block)
+        except (TesseractNotFoundError, TesseractError, TesseractCAPIError) as e:
+            self.log_message(f"        缩略图 OSD 失败 (按原方向识别): {str(e).split(chr(10), 1)[0]}", logging.DEBUG)
+            osd_data = None
+        _add_stats(self.page_stats, osd_checked=1, osd_check_seconds=perf_counter() - start)
+        if osd_data is not None and osd_data["rotate"] in _CLOCKWISE_ROTATIONS and osd_data["orientation_conf"] > 1.0:
+            self.log_message(f"        缩略图 OSD 显示需要旋转 {osd_data['rotate']} 度，转正后识别。")
+            img_block = cv2.rotate(img_block, _CLOCKWISE_ROTATIONS[osd_data["rotate"]])
+            _add_stats(self.page_stats, osd_rotated=1)
+        return self._ocr_text_block_tesseract(img_block, psm=3)
+
+    def _detect_orientation(self, img_block, thumbnail=True):
+        """
+        OSD (libtesseract 可用时进程内调用，否则 pytesseract --psm 0)，返回含 rotate/orientation/orientation_conf 的字典。
+        thumbnail=True 时先把页面缩小到长边不超过 OSD_THUMB_MAX_SIDE 像素：OSD 耗时随像素数增长，
+        缩小后的文字仍足以判断方向。失败时抛出异常。
+        """
+        h, w = img_block.shape[:2]
+        scale = OSD_THUMB_MAX_SIDE / max(h, w)
+        if thumbnail and scale < 1:
+            img_block = cv2.resize(img_block, (max(1, round(w * scale)), max(1, round(h * scale))),
+                                   interpolation=cv2.INTER_AREA)
+        if self.tess_capi is not None:
+            return self.tess_capi.image_to_osd(img_block)
+        return pytesseract.image_to_osd(img_block, config='--psm 0', output_type=Output.DICT)
+
+    def _recognize_with_confidence(self, img_block, lang_tess):
+        """进程内识别，返回 (文本, 平均置信度, 逐词数据)；不收集版面时逐词数据为 None"""
+        if self.settings.collect_layout:
+            return self.tess_capi.image_to_data(img_block, lang_tess, psm=3, oem=3)
+        text, confidence = self.tess_capi.image_to_string_with_confidence(img_block, lang_tess, psm=3, oem=3)
+        return text, confidence, None
+
+    def _rotate_and_rerun(self, img_block, text, confidence, data, lang_tess):
+        """
+        识别置信度低时在缩略图上补做 OSD；需要旋转时旋转后重新识别，保留置信度更高的结果。
+        返回 (文本, 逐词数据, 对应的图像)。
+        """
+        try:
+            osd_data = self._detect_orientation(img_block)
+        except TesseractCAPIError as e:
+            self.log_message(f"        识别置信度低 ({confidence})，OSD 失败: {e}", logging.DEBUG)
+            return text, data, img_block
+        orientation = osd_data["orientation"]
+        if orientation == 0 or osd_data["orientation_conf"] <= 1.0:  # 与独立 OSD 相同的置信度阈值
+            self.log_message(f"        识别置信度低 ({confidence})，OSD 显示无需旋转。", logging.DEBUG)
+            return text, data, img_block
+        upright = cv2.rotate(img_block, _UPRIGHT_ROTATIONS[orientation])
+        new_text, new_confidence, new_data = self._recognize_with_confidence(upright, lang_tess)
+        self.log_message(f"        识别置信度低 ({confidence})，OSD 显示文字旋转 {orientation} 度，"
+                         f"旋转后重新识别 (置信度 {new_confidence})。")
+        if new_confidence <= confidence:
+            return text, data, img_block
+        self.page_confidence = new_confidence
+        _add_stats(self.page_stats, osd_rotated=1)
+        return new_text, new_data, upright
+
+    def _set_tesseract_layout(self, img_block, data):
+        """由 Tesseract 逐词数据生成当前页面的版面块，返回按块重建的整页文本"""
+        blocks, text = tesseract_blocks(data)
+        h, w = img_block.shape[:2]
+        self.page_layout = {"size": [w, h], "blocks": blocks}
+        return text
+
+    def _ocr_tesseract_regions(self, img_block):
+        """
+        区域识别：检测文字区域 (见 text_regions.py)，各区域按类型选择 psm 并行识别，按阅读顺序拼接文本。
+        区域过多 (表格等碎片化页面) 或区域几乎覆盖整页 (噪点多) 时分区域没有收益，返回 None 由调用方整页识别。
+        """
+        start = perf_counter()
+        regions, figures = detect_text_regions(img_block)
+        detect_seconds = perf_counter() - start
+        page_area = float(img_block.shape[0] * img_block.shape[1])
+        coverage = sum(r.w * r.h for r in regions) / page_area
+        # 插图几乎占满页面时多半是噪点很多的扫描页被误判，整页识别更稳妥
+        skipped = sum(r.w * r.h for r in figures) / page_area
+        if len(regions) > REGION_MAX_COUNT or coverage + skipped > REGION_MAX_COVERAGE:
+            self.log_message(f"        检测到 {len(regions)} 个文字区域、{len(figures)} 个插图 "
+                             f"(覆盖页面 {coverage + skipped:.0%})，改为整页识别。")
+            _add_stats(self.page_stats, region_fallbacks=1)
+            return None
+        _add_stats(self.page_stats, region_pages=1, regions=len(regions), region_figures=len(figures),
+                   region_coverage=coverage, region_detect_seconds=detect_seconds)
+        kinds = {}
+        for region in regions:
+            kinds[region.kind] = kinds.get(region.kind, 0) + 1
+        self.log_message(f"        检测到 {len(regions)} 个文字区域 (" +
+                         ", ".join(f"{REGION_KIND_NAMES[k]} {n}" for k, n in kinds.items()) +
+                         f", 跳过插图 {len(figures)} 个), 识别面积占页面 {coverage:.0%}。")
+        if not regions:
+            return "[Tesseract识别为空]"
+
+        lang_tess = tesseract_language(self.settings.language)
+        collect_layout = self.settings.collect_layout
+        try:
+            threads = min(len(regions), self._region_thread_count())
+            if threads > 1:
+                if self._region_executor is None:
+                    self._region_executor = ThreadPoolExecutor(max_workers=self._region_thread_count(),
+                                                               thread_name_prefix="ocr-region")
+                results = list(self._region_executor.map(
+                    lambda r: self._recognize_region(img_block, r, lang_tess, collect_layout), regions))
+            else:
+                results = [self._recognize_region(img_block, r, lang_tess, collect_layout) for r in regions]
+        except (TesseractNotFoundError, TesseractError, TesseractCAPIError) as e:
+            error_detail = str(e).split('\n', 1)[0]
+            self.log_message(f"        OCR (Tesseract 区域) 失败: {error_detail} (语言: {lang_tess})", logging.ERROR)
+            return self._page_failed(error_detail, f"[OCR 错误: {error_detail}]")
+
+        if collect_layout:
+            merged = {}
+            for index, (region, (_, data, _)) in enumerate(zip(regions, results)):
+                for key, values in data.items():
+                    if key in ("left", "top"):
+                        offset = (region.x if key == "left" else region.y) - REGION_PADDING
+                        values = [int(v) + offset for v in values]
+                    elif key == "block_num":  # 不同区域的块号不能重复
+                        values = [int(v) + index * 1000 for v in values]
+                    merged.setdefault(key, []).extend(values)
+            self._set_tesseract_layout(img_block, merged)
+        text = "\n\n".join(t.strip() for t, _, _ in results if t and t.strip())
+        # 页面置信度：各区域置信度按文字长度加权
+        scored = [(len(t.strip()), c) for t, _, c in results if c is not None and t and t.strip()]
+        if scored:
+            self.page_confidence = sum(n * c for n, c in scored) / sum(n for n, _ in scored)
+        return text or "[Tesseract识别为空]"
+
+    def _region_thread_count(self):
+        """区域识别线程数：未指定时按 CPU 核数平分给各进程/流水线识别线程，最多 4 个"""
+        if self.settings.region_threads:
+            return self.settings.region_threads
+        engines = self.settings.workers if self.settings.workers > 1 else (
+            self.settings.pipeline_ocr_threads if self.settings.pipeline else 1)
+        return max(1, min(4, (os.cpu_count() or 1) // engines))
+
+    def _recognize_region(self, img_block, region, lang_tess, collect_layout):
+        """
+        识别一个区域 (可在任意线程调用)，返回 (文本, 逐词数据或 None, 平均置信度或 None)，
+        坐标相对于补白边后的裁剪图；置信度只有进程内 libtesseract 给出
+        """
+        crop = region.crop(img_block)
+        main_capi = self._tesseract_capi()
+        if main_capi is None:
+            config = f'--oem 3 --psm {region.psm}'
+            if collect_layout:
+                data = pytesseract.image_to_data(crop, lang=lang_tess, config=config, output_type=Output.DICT)
+                return tesseract_blocks(data)[1], data, None
+            return pytesseract.image_to_string(crop, lang=lang_tess, config=config), None, None
+        try:
+            capi = self._region_capis.get_nowait()
+        except queue.Empty:
+            from tess_capi import TesseractCAPI
+            capi = TesseractCAPI(main_capi.lib, main_capi.tessdata_dir)
+        try:
+            if collect_layout:
+                text, confidence, data = capi.image_to_data(crop, lang_tess, psm=region.psm, oem=3)
+                return text, data, confidence
+            text, confidence = capi.image_to_string_with_confidence(crop, lang_tess, psm=region.psm, oem=3)
+            return text, None, confidence
+        finally:
+            self._region_capis.put(capi)
+
+    def _ocr_text_block_tesseract(self, img_block, psm=3):
+        """使用 Tesseract 对图像块 (二维 uint8 数组) 执行 OCR"""
+        if not TESSERACT_AVAILABLE:
+            return self._page_failed("Tesseract 不可用", "[错误: Tesseract 不可用]")
+        lang_tess = tesseract_language(self.settings.language)
+        try:
+            # oem 3 是默认的 LSTM 引擎
+            # psm 可以根据具体情况调整，3 (auto page seg with OSD) 或 6 (assume a single uniform block of text) 或 11 (sparse text with OSD)
+            # 对于已经预处理和分割的块，psm 6 可能更好，但这里是整页，用 psm 3 或 11
+            text = None
+            collect_layout = self.settings.collect_layout
+            capi = self._tesseract_capi()
+            if capi is not None:
+                try:
+                    if collect_layout:  # 文本与逐词数据来自同一次识别
+                        text, self.page_confidence, data = capi.image_to_data(img_block, lang_tess, psm=psm, oem=3)
+                        self._set_tesseract_layout(img_block, data)
+                    else:
+                        text, self.page_confidence = capi.image_to_string_with_confidence(img_block, lang_tess,
+                                                                                          psm=psm, oem=3)
+                except TesseractCAPIError as e:
+                    if capi.is_loaded(lang_tess, 3):
+                        raise
+                    self._disable_tesseract_capi(e)
+            if text is None:
+                config = f'--oem 3 --psm {psm}'
+                if collect_layout:  # 只调用一次 tesseract，整页文本由逐词数据重建
+                    data = pytesseract.image_to_data(img_block, lang=lang_tess, config=config, output_type=Output.DICT)
+                    text = self._set_tesseract_layout(img_block, data)
+                else:
+                    text = pytesseract.image_to_string(img_block, lang=lang_tess, config=config)
+            return text.strip() if text else "[Tesseract识别为空]"
+        except (TesseractNotFoundError, TesseractError, TesseractCAPIError) as e:
+            error_detail = str(e).split('\n', 1)[0]
+            self.log_message(f"        OCR (Tesseract) 失败: {error_detail} (语言: {lang_tess})", logging.ERROR)
+            return self._page_failed(error_detail, f"[OCR 错误: {error_detail}]")
+        except Exception as e:
+            self.log_message(f"        OCR (Tesseract) 发生意外错误: {e}", logging.ERROR)
+            return self._page_failed(e, f"[OCR 错误: {e}]")
+
+
+# 合并方向检测：原方向识别的平均置信度达到该值时认为页面是正向，不再做 OSD
+OSD_SKIP_CONFIDENCE = 60
+# 合并方向检测的缩略图 OSD：页面长边缩小到不超过该像素数 (约为 A4 的 150 DPI)
+OSD_THUMB_MAX_SIDE = 1600
+# 区域识别：区域数超过 REGION_MAX_COUNT (表格等碎片化页面) 或区域覆盖页面超过 REGION_MAX_COVERAGE 时改为整页识别
+REGION_MAX_COUNT = 60
+REGION_MAX_COVERAGE = 0.8
+REGION_KIND_NAMES = {"line": "单行", "block": "段落", "column": "栏"}
+# 文字顺时针旋转角度 -> 把图像转回正向的 cv2.rotate 参数
+_UPRIGHT_ROTATIONS = {90: cv2.ROTATE_90_COUNTERCLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_CLOCKWISE}
+# OSD 给出的图像需要顺时针旋转的角度 -> cv2.rotate 参数
+_CLOCKWISE_ROTATIONS = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+
+
+def _add_stats(stats, **values):
+    """把数值累加到统计字典 (PageResult.stats / BatchSummary.stats)"""
+    for key, value in values.items():
+        stats[key] = stats.get(key, 0) + value
+
+
+def pixmap_to_bgr(pix, out=None):
+    """
+    PyMuPDF Pixmap -> cv2 BGR 数组。
+    直接把 pixmap 的采样缓冲区包装为 numpy 视图，颜色转换一次写入 out (形状匹配时复用)，
+    避免 pix.samples -> PIL -> np.array -> cvtColor 的多次整页拷贝。
+    """
+    samples = np.ndarray((pix.height, pix.width, pix.n), dtype=np.uint8, buffer=pix.samples_mv,
+                         strides=(pix.stride, pix.n, 1))
+    if pix.n == 1:
+        code = cv2.COLOR_GRAY2BGR
+    elif pix.n == 4:
+        code = cv2.COLOR_RGBA2BGR
+    else:
+        code = cv2.COLOR_RGB2BGR
+    if out is None or out.shape != (pix.height, pix.width, 3):
+        out = np.empty((pix.height, pix.width, 3), dtype=np.uint8)
+    return cv2.cvtColor(samples, code, dst=out)
+
+
+# --- 自适应 DPI ---
+ADAPTIVE_PROBE_DPI = 96  # 试渲染 DPI (A4 约 0.9 MP，耗时几毫秒)
+# 目标字高 (约等于大写字母/升部高度)。Tesseract 在大写字母高约 20~33 像素时识别最好，
+# 取接近下限的值以便使用尽量低的 DPI；10pt 正文约对应 210 DPI
+TARGET_TEXT_HEIGHT_PX = 22
+
+
+def probe_text_height(page, probe_dpi=ADAPTIVE_PROBE_DPI, min_components=15):
+    """
+    低分辨率灰度试渲染页面，用连通域估计字高 (像素，按 probe_dpi 计)。
+    取字符连通域高度的第 80 百分位，近似大写字母/升部高度，不受小写字母比例影响。
+    可用的连通域太少 (空白页、照片、大面积深色扫描) 时返回 None。
+    """
+    pix = page.get_pixmap(dpi=probe_dpi, colorspace=fitz.csGRAY)
+    gray = np.ndarray((pix.height, pix.width), dtype=np.uint8, buffer=pix.samples_mv, strides=(pix.stride, 1))
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    # 只保留像字符的连通域：排除噪点、表格线、插图
+    glyphs = (heights >= 3) & (heights <= max(3, pix.height // 10)) & (widths <= heights * 3) & (areas >= 4)
+    if np.count_nonzero(glyphs) < min_components:
+        return None
+    return float(np.percentile(heights[glyphs], 80))
+
+
+def choose_page_dpi(page, default_dpi=300, min_dpi=150, max_dpi=400, max_megapixels=60):
+    """
+    为页面选择渲染 DPI。返回 (dpi, 估计字高或 None)。
+    字高无法估计时使用 default_dpi；结果限制在 [min_dpi, max_dpi] 内，并受单页像素上限约束。
+    """
+    text_height = probe_text_height(page)
+    if text_height is None:
+        dpi = default_dpi
+    else:
+        dpi = TARGET_TEXT_HEIGHT_PX * ADAPTIVE_PROBE_DPI / text_height
+    dpi = min(max(dpi, min_dpi), max_dpi)
+    page_area_in2 = max(page.rect.width * page.rect.height / (72 * 72), 1e-6)
+    dpi = min(dpi, (max_megapixels * 1e6 / page_area_in2) ** 0.5)
+    return max(int(dpi // 10 * 10), 10), text_height
+
+
+def tesseract_language(lang_orig):
+    """将界面输入的语言转换为 Tesseract 格式: 'chi_sim+eng' 或 'eng'"""
+    if '+' in lang_orig:  # 已经是组合语言
+        return lang_orig
+    elif lang_orig.lower() == 'ch':
+        return 'chi_sim'
+    elif lang_orig.lower() == 'en':
+        return 'eng'
+    return lang_orig  # 其他单语言直接使用，或根据需要添加转换规则
+
+
+# --- 页面任务构建 ---
+def build_page_tasks(file_index, file_path, image_output_subfolder=None, with_hashes=False,
+                     text_layer_min_chars=None, page_ranges=None):
+    """
+    为单个输入文件生成页面任务列表。不支持的类型返回空列表；PDF 打开失败时抛出异常。
+    with_hashes=True 时同时计算每页的内容指纹 (供结果缓存使用，无需渲染页面)。
+    text_layer_min_chars 不为 None 时检测每页的内嵌文本层，可用的文本记录在 task.native_text 中。
+    page_ranges (见 batch_schedule.parse_page_ranges) 只为范围内的页面生成任务，范围外的页面不计算指纹/文本层。
+    """
+    base_name_with_ext = os.path.basename(file_path)
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext in PDF_EXTENSIONS:
+        tasks = []
+        doc = fitz.open(file_path)
+        try:
+            num_pages = len(doc)
+            for page_num in select_pages(page_ranges, num_pages):
+                i = page_num - 1
+                save_path = None
+                if image_output_subfolder:
+                    save_path = os.path.join(image_output_subfolder, f"page_{i + 1}.png")
+                page = doc.load_page(i)
+                native_text = None
+                if text_layer_min_chars is not None:
+                    native_text = _safe_native_text(page, text_layer_min_chars)
+                page_hash = None
+                if with_hashes and native_text is None:
+                    page_hash = _safe_hash(page_content_hash, doc, page)
+                tasks.append(PageTask(file_index, file_path, i, num_pages, save_path, page_hash, native_text))
+        finally:
+            doc.close()
+        return tasks
+    elif file_ext in IMAGE_EXTENSIONS:
+        if not select_pages(page_ranges, 1):
+            return []
+        save_path = os.path.join(image_output_subfolder, base_name_with_ext) if image_output_subfolder else None
+        page_hash = _safe_hash(file_content_hash, file_path) if with_hashes else None
+        return [PageTask(file_index, file_path, None, 1, save_path, page_hash)]
+    return []
+
+
+def _safe_hash(hash_func, *args):
+    """计算内容指纹；失败时返回 None (该页不使用缓存)"""
+    try:
+        return hash_func(*args)
+    except Exception as e:
+        logging.warning(f"计算页面内容指纹失败，该页不使用缓存: {e}")
+        return None
+
+
+def _safe_native_text(page, min_chars):
+    """检测文本层；失败时返回 None (该页走 OCR)"""
+    try:
+        return native_page_text(page, min_chars)
+    except Exception as e:
+        logging.warning(f"检测 PDF 文本层失败，该页使用 OCR: {e}")
+        return None
+
+
+# --- 串行执行 ---
+class SerialPageOCR:
+    """ 在当前线程中逐个处理页面任务 (workers=1 时的默认方式) """
+
+    def __init__(self, settings, log=None, should_stop=None):
+        self.engine = OCREngine(settings, log, should_stop)
+        self.should_stop = should_stop or (lambda: False)
+
+    def start(self):
+        return self.engine.load_models()
+
+    @property
+    def engine_choice(self):
+        return self.engine.engine_choice
+
+    def map_pages(self, tasks):
+        """按顺序逐个处理任务，逐个产出 PageResult"""
+        for task in tasks:
+            if self.should_stop():
+                break
+            yield self.engine.run_task(task)
+
+    def close(self):
+        self.engine.shutdown()
+
+
+# --- 进程池执行 ---
+# 每个工作进程中的全局状态 (由 _pool_worker_init 初始化)
+_worker_engine = None
+_worker_cancel_event = None
+
+
+def _pool_worker_init(settings, cancel_event, image_stats_queue):
+    """工作进程初始化：各自加载一套 OCR 引擎/模型，并注册退出时的清理"""
+    global _worker_engine, _worker_cancel_event
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+    # 多个进程并行时，避免每个进程内部再开满线程导致过度订阅
+    cv2.setNumThreads(1)
+    _worker_cancel_event = cancel_event
+    _worker_engine = OCREngine(settings, should_stop=cancel_event.is_set)
+    # 进程池关闭时工作进程正常退出，先运行 exitpriority 不为 None 的终结器
+    multiprocessing.util.Finalize(None, _pool_worker_exit, args=(image_stats_queue,), exitpriority=10)
+    # 新启动的 (spawn) 进程中 torch 尚未导入，先导入再在加载 CARN 之前限制线程数：
+    # 指定了超分线程数时使用该值，否则每个进程单线程
+    if settings.use_super_res:
+        load_torch()
+        if TORCH_AVAILABLE:
+            torch.set_num_threads(settings.sr_threads if settings.sr_threads > 0 else 1)
+    if not _worker_engine.load_models():
+        _worker_engine = None
+
+
+def _pool_worker_exit(image_stats_queue):
+    """工作进程退出：等待后台保存的图像写完，并把图像保存统计发回主进程 (由 ParallelPageOCR.close 记录到日志)"""
+    if _worker_engine is None:
+        return
+    image_stats = _worker_engine.shutdown()
+    if image_stats is not None:
+        image_stats_queue.put(image_stats)
+
+
+def _pool_worker_status():
+    """工作进程实际使用的 (引擎, CARN 是否可用)；模型加载失败时返回 None"""
+    if _worker_engine is None:
+        return None
+    return _worker_engine.engine_choice, _worker_engine.carn_ready
+
+
+def _pool_run_task(task):
+    """工作进程中处理一个页面任务"""
+    if _worker_cancel_event is not None and _worker_cancel_event.is_set():
+        return PageResult(task, cancelled=True)
+    if _worker_engine is None:
+        return PageResult(task, f"\n--- {task.description} (无可用 OCR 引擎) ---\n", error="无可用 OCR 引擎")
+    return _worker_engine.run_task(task)
+
+
+class ParallelPageOCR:
+    """
+    进程池并行处理页面任务：
+    - 每个工作进程持有独立的 OCR 引擎 (PP-Structure / Tesseract / CARN)。
+    - 同时提交的任务数有上限，避免一次性为整个批次排队。
+    - 结果按提交顺序产出，便于按页码顺序写回输出文件。
+    - should_stop() 返回 True 时，取消排队任务并通知运行中的任务尽快结束。
+    - start() 等待一个工作进程加载完模型，以其实际使用的引擎与 CARN 状态作为 engine_choice / carn_ready。
+    - 工作进程退出时等待后台保存的图像写完，close() 汇总各进程的图像保存统计与失败记录并写入日志。
+    """
+
+    def __init__(self, settings, log=None, should_stop=None, max_pending_per_worker=2):
+        self.settings = settings
+        self.workers = settings.workers
+        self.log_message = log or _default_log
+        self.should_stop = should_stop or (lambda: False)
+        self.max_pending = self.workers * max(1, max_pending_per_worker)
+        self.engine_choice = settings.engine
+        self.carn_ready = False
+        self._executor = None
+        self._cancel_event = None
+        self._image_stats = None  # 工作进程退出时发回的图像保存统计
+
+    def start(self):
+        # 使用 spawn，避免在带 Tk/后台线程的进程中 fork
+        ctx = multiprocessing.get_context("spawn")
+        self._cancel_event = ctx.Event()
+        self._image_stats = ctx.SimpleQueue()
+        self.log_message(f"启动 {self.workers} 个 OCR 工作进程 (每个进程独立加载模型)...")
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx,
+                                             initializer=_pool_worker_init,
+                                             initargs=(self.settings, self._cancel_event, self._image_stats))
+        try:
+            status = self._executor.submit(_pool_worker_status).result()
+        except Exception as e:  # 工作进程启动失败
+            self.log_message(f"OCR 工作进程启动失败: {e}", logging.ERROR)
+            status = None
+        if status is None:
+            self.close()
+            return False
+        self.engine_choice, self.carn_ready = status
+        return True
+
+    def map_pages(self, tasks):
+        """并行处理任务，按提交顺序产出 PageResult"""
+        task_iter = iter(tasks)
+        pending = {}  # 序号 -> (PageTask, Future)
+        results = {}  # 已完成但尚未按序产出的结果
+        next_submit = 0
+        next_yield = 0
+        exhausted = False
+        try:
+            while True:
+                if self.should_stop():
+                    self._cancel()
+                    return
+
+                # 补充提交，保持在途任务数不超过上限
+                while not exhausted and len(pending) + len(results) < self.max_pending:
+                    task = next(task_iter, None)
+                    if task is None:
+                        exhausted = True
+                        break
+                    try:
+                        pending[next_submit] = (task, self._executor.submit(_pool_run_task, task))
+                    except BrokenProcessPool as e:  # 工作进程异常退出后进程池不可再用
+                        results[next_submit] = PageResult(task, f"\n--- {task.description} (处理错误: {e}) ---\n",
+                                                          error=str(e))
+                    next_submit += 1
+
+                if next_yield in results:
+                    yield results.pop(next_yield)
+                    next_yield += 1
+                    continue
+                if not pending:
+                    if exhausted:
+                        return
+                    continue
+
+                # 短超时等待，以便及时响应取消
+                done, _ = wait([f for _, f in pending.values()], timeout=0.2, return_when=FIRST_COMPLETED)
+                for seq in [s for s, (_, f) in pending.items() if f in done]:
+                    task, future = pending.pop(seq)
+                    try:
+                        results[seq] = future.result()
+                    except Exception as e:  # 工作进程崩溃等
+                        self.log_message(f"工作进程执行任务失败: {e}", logging.ERROR)
+                        results[seq] = PageResult(task, f"\n--- {task.description} (处理错误: {e}) ---\n",
+                                                  error=str(e))
+        finally:
+            for _, future in pending.values():
+                future.cancel()
+
+    def _cancel(self):
+        if self._cancel_event is None or self._cancel_event.is_set():
+            return
+        self.log_message("正在取消排队中的页面任务并通知工作进程停止...", logging.WARNING)
+        self._cancel_event.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        if self._executor is not None:
+            if self.should_stop():
+                self._cancel()
+            else:
+                self._executor.shutdown(wait=True)  # 等待工作进程退出 (其中写完后台保存的图像)
+                self._log_image_stats()
+            self._executor = None
+
+    def _log_image_stats(self):
+        """汇总工作进程发回的图像保存统计，写入日志"""
+        reports = []
+        while not self._image_stats.empty():
+            reports.append(self._image_stats.get())
+        log_image_stats(reports, self.log_message, f"{len(reports)} 个工作进程")
+
+
+# --- 单进程流水线执行 ---
+class _PipelineItem:
+    """ 在流水线各阶段之间传递的页面 """
+
+    def __init__(self, seq, task):
+        self.seq = seq
+        self.task = task
+        self.image = None
+        self.stats = {}  # 各阶段引擎的统计累加到同一个字典
+        self.busy = 0.0  # 各阶段实际处理耗时之和 (不含排队)，作为 PageResult.elapsed
+        self.result = None  # 某阶段出错时提前生成的 PageResult，后续阶段直接传递
+
+
+class _StageStats:
+    """ 一个流水线阶段的耗时统计 (多个线程累加，需加锁) """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.pages = 0
+        self.busy = 0.0  # 处理页面
+        self.starved = 0.0  # 等待上游 (输入队列为空)
+        self.blocked = 0.0  # 等待下游 (输出队列已满 / 在途页面达到上限)
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, starved=0.0, blocked=0.0, pages=0):
+        with self._lock:
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+            self.pages += pages
+
+    def message(self, wall):
+        capacity = max(wall * self.workers, 1e-9)
+        return (f"{self.name} x{self.workers}: {self.pages} 页, 利用率 {self.busy / capacity:.0%} "
+                f"(等待上游 {self.starved / capacity:.0%}, 等待下游 {self.blocked / capacity:.0%})")
+
+
+_PIPELINE_END = object()  # 阶段结束标记
+
+
+class PipelinedPageOCR:
+    """
+    单进程流水线：渲染 (PyMuPDF) -> 超分 (CARN，可选) -> 识别 (Tesseract / PP-Structure) 三个阶段
+    分别在各自的线程中运行，用有界队列连接。
+    - 渲染 1 个线程 (PDF 文档对象不能跨线程共享)，顺带保存页面图像；
+    - 超分 1 个线程，持有唯一的 CARN 模型 (torch 推理内部已多线程)；
+    - 识别 pipeline_ocr_threads 个线程，每个线程一套 OCREngine (libtesseract / Paddle / OpenCV 调用期间释放 GIL，
+      因此一个文档的不同页面可以在多个核上同时识别)。
+    队列满时上游阻塞 (背压)，同时在途的页面图像不超过 识别线程数 + 2 x 队列容量 + 1，内存占用有上限。
+    结果按提交顺序产出；结束时输出各阶段利用率，便于判断瓶颈和调整线程数。
+    """
+
+    def __init__(self, settings, log=None, should_stop=None):
+        self.settings = settings
+        self.log_message = log or _default_log
+        self.should_stop = should_stop or (lambda: False)
+        self.ocr_threads = settings.pipeline_ocr_threads
+        self.queue_size = settings.pipeline_queue_size
+        self.max_in_flight = self.ocr_threads + 2 * self.queue_size + 1
+        # 识别阶段的引擎不加载 CARN，超分由单独的阶段完成
+        ocr_settings = copy.copy(settings)
+        ocr_settings.use_super_res = False
+        self._halt = threading.Event()
+        stop = self._stopping
+        self.render_engine = OCREngine(ocr_settings, log, stop)
+        self.sr_engine = OCREngine(settings, log, stop) if settings.use_super_res else None
+        self.ocr_engines = [OCREngine(ocr_settings, log, stop) for _ in range(self.ocr_threads)]
+        self.engine_choice = settings.engine
+        self.carn_ready = False
+        self.stage_message = None  # 最近一次 map_pages 的各阶段利用率
+
+    def _stopping(self):
+        return self._halt.is_set() or self.should_stop()
+
+    def start(self):
+        self.log_message(f"启动流水线：渲染 x1, {'超分 x1, ' if self.sr_engine else ''}识别 x{self.ocr_threads} "
+                         f"(队列容量 {self.queue_size}，每个识别线程独立加载模型)...")
+        for engine in self.ocr_engines:
+            if not engine.load_models():
+                return False
+        self.engine_choice = self.ocr_engines[0].engine_choice
+        if self.sr_engine is not None:
+            self.carn_ready = self.sr_engine.load_sr_model()
+            if not self.carn_ready:
+                self.log_message("CARN 模型加载失败，超分辨率功能已禁用。", logging.ERROR)
+        return True
+
+    def map_pages(self, tasks):
+        """流水线处理任务，按提交顺序产出 PageResult"""
+        self._halt.clear()
+        slots = threading.Semaphore(self.max_in_flight)
+        render_out = queue.Queue(maxsize=self.queue_size)
+        ocr_in = render_out
+        done = queue.Queue()  # 容量由 slots 限制
+        use_sr = self.sr_engine is not None and self.carn_ready
+        stages = [_StageStats("渲染", 1)]
+        threads = [threading.Thread(target=self._render_stage, name="ocr-render", daemon=True,
+                                    args=(tasks, slots, render_out, 1 if use_sr else self.ocr_threads, done,
+                                          stages[0]))]
+        if use_sr:
+            ocr_in = queue.Queue(maxsize=self.queue_size)
+            stages.append(_StageStats("超分", 1))
+            threads.append(threading.Thread(target=self._worker_stage, name="ocr-sr", daemon=True,
+                                            args=(self._super_resolve, self.sr_engine, render_out, ocr_in,
+                                                  self.ocr_threads, stages[-1])))
+        stages.append(_StageStats("识别", self.ocr_threads))
+        for index, engine in enumerate(self.ocr_engines):
+            threads.append(threading.Thread(target=self._worker_stage, name=f"ocr-recognize-{index}", daemon=True,
+                                            args=(self._recognize, engine, ocr_in, done, 0, stages[-1])))
+        wall_start = perf_counter()
+        for thread in threads:
+            thread.start()
+
+        results = {}
+        next_yield = 0
+        total = None
+        try:
+            while total is None or next_yield < total:
+                if self.should_stop():
+                    return
+                if next_yield in results:
+                    item = results.pop(next_yield)
+                    next_yield += 1
+                    slots.release()
+                    yield item.result
+                    continue
+                try:
+                    item = done.get(timeout=0.2)
+                except queue.Empty:
+                    if not any(thread.is_alive() for thread in threads) and done.empty():
+                        return  # 各阶段意外退出
+                    continue
+                if isinstance(item, int):  # 渲染阶段结束，item 为任务总数
+                    total = item
+                else:
+                    results[item.seq] = item
+        finally:
+            self._halt.set()
+            for thread in threads:  # 各线程在当前页面结束后 0.2 秒内退出；引擎关闭前必须等待
+                thread.join()
+            wall = perf_counter() - wall_start
+            self.stage_message = "流水线各阶段: " + "; ".join(stage.message(wall) for stage in stages)
+
+    def _put(self, q, item, stats):
+        """放入下游队列；队列满时阻塞 (背压)，停止时放弃"""
+        start = perf_counter()
+        while not self._halt.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                break
+            except queue.Full:
+                continue
+        stats.add(blocked=perf_counter() - start)
+
+    def _get(self, q, stats):
+        start = perf_counter()
+        while not self._halt.is_set():
+            try:
+                item = q.get(timeout=0.2)
+                stats.add(starved=perf_counter() - start)
+                return item
+            except queue.Empty:
+                continue
+        return _PIPELINE_END
+
+    def _render_stage(self, tasks, slots, out_q, downstream_workers, done, stats):
+        engine = self.render_engine
+        count = 0
+        try:
+            for seq, task in enumerate(tasks):
+                start = perf_counter()
+                while not slots.acquire(timeout=0.2):  # 在途页面达到上限
+                    if self._stopping():
+                        return
+                stats.add(blocked=perf_counter() - start)
+                if self._stopping():
+                    return
+                item = _PipelineItem(seq, task)
+                start = perf_counter()
+                engine.begin_page(item.stats)
+                try:
+                    item.image = engine.load_task_image(task, reuse_buffer=False)
+                    engine.save_task_image(task, item.image)
+                except Exception as e:
+                    item.result = engine.page_exception_result(task, e, perf_counter() - start)
+                item.busy += perf_counter() - start
+                stats.add(busy=perf_counter() - start, pages=1)
+                count += 1
+                self._put(out_q, item, stats)
+        finally:
+            engine.close()
+            done.put(count)
+            for _ in range(downstream_workers):
+                self._put(out_q, _PIPELINE_END, stats)
+
+    def _worker_stage(self, func, engine, in_q, out_q, downstream_workers, stats):
+        """
+        通用阶段线程：逐个取出页面交给 func(engine, item) 处理后放入下游。
+        收到结束标记时退出，并向下游的每个线程各发一个结束标记 (downstream_workers 为 0 时不发)。
+        """
+        while True:
+            item = self._get(in_q, stats)
+            if item is _PIPELINE_END:
+                break
+            if item.result is None and not self._stopping():
+                start = perf_counter()
+                try:
+                    func(engine, item)
+                except Exception as e:
+                    item.result = engine.page_exception_result(item.task, e, item.busy)
+                elapsed = perf_counter() - start
+                item.busy += elapsed
+                stats.add(busy=elapsed, pages=1)
+            elif item.result is None:
+                item.result = PageResult(item.task, cancelled=True)
+            self._put(out_q, item, stats)
+        for _ in range(downstream_workers):
+            self._put(out_q, _PIPELINE_END, stats)
+
+    @staticmethod
+    def _super_resolve(engine, item):
+        engine.begin_page(item.stats)
+        item.image = engine.super_resolve(item.image, item.task.description)
+
+    @staticmethod
+    def _recognize(engine, item):
+        start = perf_counter()
+        engine.begin_page(item.stats)
+        text = engine.recognize_task(item.task, item.image, apply_sr=False)
+        item.image = None  # 识别完成后立即释放页面图像
+        item.result = engine.page_result(item.task, text, item.busy + perf_counter() - start)
+
+    def close(self):
+        self._halt.set()
+        self.render_engine.shutdown()  # 等待后台保存的页面图像写完
+        for engine in self.ocr_engines:
+            engine.shutdown()
+
+
+def create_page_runner(settings, log=None, should_stop=None):
+    """根据设置选择本机 OCR 服务、进程池、单进程流水线或串行执行方式"""
+    if settings.server_url:
+        from ocr_server import connect_page_runner
+        runner = connect_page_runner(settings, log, should_stop)
+        if runner is not None:
+            return runner
+    return create_local_page_runner(settings, log, should_stop)
+
+
+def create_local_page_runner(settings, log=None, should_stop=None):
+    """进程内执行方式：进程池、单进程流水线或串行 (OCR 服务不可用时 RemotePageOCR 也使用它)"""
+    if settings.workers > 1:
+        return ParallelPageOCR(settings, log, should_stop)
+    if settings.pipeline:
+        return PipelinedPageOCR(settings, log, should_stop)
+    return SerialPageOCR(settings, log, should_stop)
+
+
+def local_execution_mode(settings):
+    """进程内执行方式的说明 (用于日志)"""
+    if settings.workers > 1:
+        return f"进程池 x{settings.workers}"
+    if settings.pipeline:
+        return f"流水线 (识别线程 x{settings.pipeline_ocr_threads})"
+    return "串行"
+
+
+# --- 批处理 (GUI 与命令行共用) ---
+SCREEN_LIST_LIMIT = 50  # 汇总中最多列出的空白页/重复页数
+
+
+class BatchSummary:
+    """ 一次批处理的统计结果 """
+
+    def __init__(self, total_files):
+        self.total_files = total_files
+        self.processed_count = 0
+        self.error_count = 0
+        self.cancelled = False
+        self.duration = 0.0
+        self.page_sources = {}  # 页面结果来源 ("ocr"/"text_layer"/"cache"/"journal"/"blank"/"duplicate") -> 页数
+        self.blank_pages = []  # 预筛跳过的空白页 ("文件名 PDF页 N")
+        self.duplicate_pages = []  # 复用识别结果的重复页 ("文件名 PDF页 N", "原页面")
+        self.stats = {}  # 各页 PageResult.stats 的累计值
+
+    @property
+    def sr_message(self):
+        """超分阶段吞吐量；没有页面经过超分时返回 None"""
+        images = self.stats.get("sr_images", 0)
+        if not images:
+            return None
+        seconds = max(self.stats.get("sr_seconds", 0.0), 1e-9)
+        tiles = self.stats.get("sr_tiles", 0)
+        return (f"超分阶段: {images} 张图像, {tiles} 个块经过 CARN, 推理耗时 {seconds:.2f} 秒, "
+                f"{images / seconds:.2f} 图像/秒 ({tiles / seconds:.1f} 块/秒)")
+
+    @property
+    def osd_message(self):
+        """方向检测统计；没有页面做过方向检测时返回 None"""
+        pages = self.stats.get("osd_pages", 0)
+        if not pages:
+            return None
+        rotated = self.stats.get("osd_rotated", 0)
+        if "osd_avoided_seconds" not in self.stats:
+            return (f"方向检测 (独立 OSD): {pages} 页, 旋转 {rotated} 页, "
+                    f"OSD 耗时 {self.stats.get('osd_seconds', 0.0):.2f} 秒")
+        avoided = self.stats["osd_avoided_seconds"]
+        checked = self.stats.get("osd_checked", 0)
+        baseline = self.stats.get("osd_baseline_seconds", 0.0)
+        spent = self.stats.get("osd_check_seconds", 0.0) + baseline
+        return (f"方向检测 (按识别置信度或缩略图 OSD): {pages} 页, 做缩略图 OSD {checked} 页, 旋转 {rotated} 页 "
+                f"(缩略图 OSD 与重新识别耗时 {spent - baseline:.2f} 秒, 测量整页 OSD 基准 {baseline:.2f} 秒), "
+                f"省去每页整页 OSD 约 {avoided:.2f} 秒, 估计净节省 {avoided - spent:.2f} 秒")
+
+    @property
+    def preprocess_message(self):
+        """Tesseract 预处理各阶段的每页平均耗时与跳过情况；没有页面经过预处理时返回 None"""
+        pages = self.stats.get("prep_pages", 0)
+        if not pages:
+            return None
+
+        def ms(key):
+            return self.stats.get(key, 0.0) / pages * 1000
+
+        parts = [f"灰度 {ms('prep_gray_seconds'):.0f} ms", f"噪声估计 {ms('prep_analyze_seconds'):.0f} ms"]
+        if "prep_clahe_seconds" in self.stats or "prep_clahe_skipped" in self.stats:
+            parts.append(f"CLAHE {ms('prep_clahe_seconds'):.0f} ms (跳过 {self.stats.get('prep_clahe_skipped', 0)} 页)")
+        methods = [(f"prep_denoise_{k}", label) for k, label in
+                   (("median", "中值"), ("bilateral", "双边"), ("nlmeans", "NL-means"))]
+        if any(k in self.stats for k, _ in methods) or "prep_denoise_skipped" in self.stats:
+            used = ", ".join(f"{label} {self.stats[k]} 页" for k, label in methods if k in self.stats)
+            parts.append(f"降噪 {ms('prep_denoise_seconds'):.0f} ms ({used + ', ' if used else ''}"
+                         f"跳过 {self.stats.get('prep_denoise_skipped', 0)} 页)")
+        parts.append(f"二值化 {ms('prep_binarize_seconds'):.0f} ms")
+        return f"预处理 ({pages} 页, 每页平均): " + ", ".join(parts)
+
+    @property
+    def region_message(self):
+        """Tesseract 区域识别统计；没有页面按区域识别时返回 None"""
+        pages = self.stats.get("region_pages", 0)
+        fallbacks = self.stats.get("region_fallbacks", 0)
+        if not pages and not fallbacks:
+            return None
+        if not pages:
+            return f"区域识别: {fallbacks} 页不适合分区域 (区域过多或覆盖整页)，均按整页识别"
+        return (f"区域识别: {pages} 页, 平均每页 {self.stats.get('regions', 0) / pages:.1f} 个文字区域, "
+                f"识别面积平均占页面 {self.stats.get('region_coverage', 0.0) / pages:.0%}, "
+                f"跳过插图 {self.stats.get('region_figures', 0)} 个, "
+                f"区域检测 {self.stats.get('region_detect_seconds', 0.0) / pages * 1000:.0f} ms/页; "
+                f"改为整页识别 {fallbacks} 页")
+
+    @property
+    def route_message(self):
+        """自动选择引擎的统计；没有使用自动选择时返回 None"""
+        sampled = self.stats.get("route_sampled", 0)
+        if not sampled:
+            return None
+        overhead = self.stats.get("route_overhead_seconds", 0.0)
+        saved = self.stats.get("route_saved_seconds", 0.0)
+        counts = ", ".join(f"{engine} {self.stats.get(f'route_{engine}', 0)} 页" for engine in ROUTED_ENGINES)
+        return (f"引擎自动选择: {counts} (其中采样 {sampled} 页，两种引擎各识别一次，多耗时 {overhead:.2f} 秒); "
+                f"路由到更快引擎估计节省 {saved:.2f} 秒，扣除采样开销净节省 {saved - overhead:.2f} 秒")
+
+    @property
+    def image_message(self):
+        """页面渲染与图像保存/复用统计；没有渲染、保存或复用页面时返回 None"""
+        rendered = self.stats.get("render_pages", 0)
+        saves = self.stats.get("image_saves", 0)
+        reused = self.stats.get("image_reused", 0)
+        if not saves and not reused:
+            return None
+        parts = []
+        if rendered:
+            parts.append(f"渲染 {rendered} 页, 平均 {self.stats.get('render_seconds', 0.0) / rendered * 1000:.0f} ms/页")
+        if saves:
+            parts.append(f"后台保存 {saves} 张 (识别线程等待写盘共 {self.stats.get('image_save_wait', 0.0):.2f} 秒)")
+        if reused:
+            parts.append(f"{reused} 页内存映射已保存的原始页面，跳过渲染")
+        return "页面图像: " + ", ".join(parts)
+
+    @property
+    def page_sources_message(self):
+        names = [("ocr", "OCR 识别"), ("text_layer", "PDF 文本层"), ("cache", "结果缓存"), ("journal", "检查点"),
+                 ("blank", "空白页跳过"), ("duplicate", "重复页复用")]
+        return "页面处理路径: " + ", ".join(f"{label} {self.page_sources.get(key, 0)} 页" for key, label in names)
+
+    @property
+    def screen_message(self):
+        """预筛跳过的空白页与复用结果的重复页清单 (各最多列出 SCREEN_LIST_LIMIT 项)；都没有时返回 None"""
+        if not self.blank_pages and not self.duplicate_pages:
+            return None
+
+        def listing(items):
+            shown = "; ".join(items[:SCREEN_LIST_LIMIT])
+            more = len(items) - SCREEN_LIST_LIMIT
+            return shown + (f"; ... 另有 {more} 页" if more > 0 else "")
+
+        lines = []
+        if self.blank_pages:
+            lines.append(f"跳过的空白页 ({len(self.blank_pages)} 页): {listing(self.blank_pages)}")
+        if self.duplicate_pages:
+            pairs = [f"{page} = {original}" for page, original in self.duplicate_pages]
+            lines.append(f"复用识别结果的重复页 ({len(pairs)} 页): {listing(pairs)}")
+        return "\n".join(lines)
+
+    @property
+    def final_message(self):
+        if self.cancelled and self.processed_count < self.total_files:
+            return f"任务已取消。成功处理 {self.processed_count} 个文件。"
+        elif self.error_count > 0:
+            return (f"处理完成，共 {self.total_files} 文件，成功 {self.processed_count} 个，"
+                    f"失败或含错误 {self.error_count} 个。")
+        return f"所有 {self.total_files} 个文件处理完成！"
+
+
+class OCRBatchRunner:
+    """
+    批量处理输入文件：为每个文件生成页面任务，交给串行/进程池执行，
+    按页码顺序把每页文本追加到 {文件名}_ocr.partial.txt (flush_policy 决定何时落盘)，
+    全部页面成功后改名为 {文件名}_ocr.txt；已写出的页面不在内存中保留。
+    每页完成后追加到该文件的检查点日志；resume=True 时跳过日志中已完成的页面，
+    文件全部完成并写出后删除日志。
+    schedule (batch_schedule.BatchSchedule) 决定每个文件处理的页码范围与任务顺序，默认按输入顺序处理全部页面。
+    log(m, level) / progress(value, text) / should_stop() 均为可选回调。
+    """
+
+    def __init__(self, settings, output_dir, save_images=False, log=None, progress=None, should_stop=None,
+                 use_cache=True, cache_dir=None, cache_size_mb=DEFAULT_CACHE_SIZE_MB, purge_cache=False,
+                 resume=True, flush_policy="page", schedule=None):
+        self.settings = settings
+        self.schedule = schedule or BatchSchedule()
+        self.preview_task_count = 0  # 预览阶段 (每个文件的前 N 页) 的任务数，0 表示没有预览阶段
+        self.output_dir = output_dir
+        self.save_images = save_images
+        self.resume = resume
+        self.flush_policy = flush_policy
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.cache_size_mb = cache_size_mb
+        self.purge_cache = purge_cache
+        self.log_message = log or _default_log
+        self.update_progress = progress or (lambda value, text: None)
+        self.should_stop = should_stop or (lambda: False)
+        self.engine_choice = settings.engine  # 模型加载后可能回退为 Tesseract
+        self.carn_ready = settings.use_super_res
+
+    def run(self, input_files):
+        """处理全部输入文件，返回 BatchSummary"""
+        summary = BatchSummary(len(input_files))
+        thread_start_time = perf_counter()
+
+        # 串行模式下在本线程加载模型；并行模式下由每个工作进程各自加载
+        page_runner = create_page_runner(self.settings, self.log_message, self.should_stop)
+        if not page_runner.start():
+            summary.error_count = summary.total_files
+            summary.duration = perf_counter() - thread_start_time
+            self.update_progress(0, "错误：OCR引擎加载失败")
+            return summary
+        self.engine_choice = page_runner.engine_choice
+        if isinstance(page_runner, SerialPageOCR):
+            self.carn_ready = page_runner.engine.carn_ready
+        else:  # 无法得知 CARN 状态的执行方式沿用设置
+            self.carn_ready = getattr(page_runner, "carn_ready", self.settings.use_super_res)
+
+        cache = self._open_cache()
+        try:
+            file_states, all_tasks = self._build_tasks(input_files, summary, with_hashes=cache is not None)
+            self._run_tasks(page_runner, file_states, all_tasks, summary, cache)
+            if self.should_stop():
+                self.log_message("任务已被用户取消。")
+        except Exception as e:
+            self.log_message(f"处理文件过程中发生严重意外错误: {e}\n{traceback.format_exc()}", logging.CRITICAL)
+            summary.error_count = summary.total_files  # 标记所有文件失败
+        finally:
+            page_runner.close()
+            summary.cancelled = self.should_stop()
+            summary.duration = perf_counter() - thread_start_time
+            self.log_message(f"\n{summary.final_message} 总耗时: {summary.duration:.2f} 秒。", logging.INFO)
+            self.log_message(summary.page_sources_message)
+            if summary.screen_message:
+                self.log_message(summary.screen_message)
+            if summary.sr_message:
+                self.log_message(summary.sr_message)
+            if summary.osd_message:
+                self.log_message(summary.osd_message)
+            if summary.preprocess_message:
+                self.log_message(summary.preprocess_message)
+            if summary.region_message:
+                self.log_message(summary.region_message)
+            if summary.image_message:
+                self.log_message(summary.image_message)
+            if summary.route_message:
+                self.log_message(summary.route_message)
+            if getattr(page_runner, "stage_message", None):
+                self.log_message(page_runner.stage_message)
+            if cache is not None:
+                self.log_message(cache.stats_message())
+                cache.close()
+            self.update_progress(100, summary.final_message)
+        return summary
+
+    def _open_cache(self):
+        """按设置打开 (并可选清空) 结果缓存；不使用缓存或打开失败时返回 None"""
+        if not self.use_cache and not self.purge_cache:
+            return None
+        try:
+            cache = OCRResultCache(self.cache_dir, self.cache_size_mb, log=self.log_message)
+        except Exception as e:
+            self.log_message(f"无法打开结果缓存，本次不使用缓存: {e}", logging.WARNING)
+            return None
+        if self.purge_cache:
+            removed = cache.purge()
+            self.log_message(f"已清空结果缓存 ({removed} 条): {cache.db_path}")
+        if not self.use_cache:
+            cache.close()
+            return None
+        self.log_message(f"使用结果缓存: {cache.db_path}")
+        return cache
+
+    def _build_tasks(self, input_files, summary, with_hashes=False):
+        """
+        为每个文件生成页面任务 (PDF 每页一个任务，图像文件一个任务)，只包含调度指定页码范围内的页面，
+        并按调度顺序排列 (同一文件的页面保持页码顺序)。
+        """
+        file_states = []
+        tasks_by_file = {}
+        for idx, file_path in enumerate(input_files):
+            base_name_with_ext = os.path.basename(file_path)
+            base_name_no_ext = os.path.splitext(base_name_with_ext)[0]
+            state = {"path": file_path, "name": base_name_with_ext, "stem": base_name_no_ext,
+                     "done": 0, "expected": 0, "start_time": None, "journal": None, "resumed": {}, "writers": None}
+            file_states.append(state)
+
+            # 创建用于存放该文件相关图片的子文件夹
+            image_output_subfolder = None
+            if self.save_images:
+                image_output_subfolder = os.path.join(self.output_dir, f"{base_name_no_ext}_images")
+                try:
+                    os.makedirs(image_output_subfolder, exist_ok=True)
+                except OSError as e:
+                    self.log_message(f"  无法创建图像子文件夹 {image_output_subfolder}: {e}", logging.ERROR)
+                    image_output_subfolder = None  # 创建失败则不保存
+
+            file_ext = os.path.splitext(file_path)[1].lower()
+            if file_ext not in PDF_EXTENSIONS + IMAGE_EXTENSIONS:
+                self.log_message(f"  不支持的文件类型: {file_ext}。跳过文件 {base_name_with_ext}。", logging.WARNING)
+                continue
+            try:
+                tasks = build_page_tasks(idx, file_path, image_output_subfolder, with_hashes,
+                                         self.settings.text_layer_min_chars if self.settings.use_text_layer else None,
+                                         self.schedule.page_ranges_for(file_path))
+            except Exception as open_err:
+                self.log_message(f"打开 {base_name_with_ext} 时发生错误: {open_err}", logging.ERROR)
+                summary.error_count += 1
+                continue
+            if not tasks:
+                self.log_message(f"  {base_name_with_ext}: 指定的页码范围内没有页面，跳过。", logging.WARNING)
+                continue
+            state["expected"] = len(tasks)
+            self._open_journal(state, tasks)
+            tasks_by_file[idx] = tasks
+        return file_states, self._order_tasks(file_states, tasks_by_file)
+
+    def _order_tasks(self, file_states, tasks_by_file):
+        """按调度顺序排列各文件的任务；页数少优先时按检查点恢复后仍需处理的页数排序"""
+        files = []
+        for idx, tasks in tasks_by_file.items():
+            resumed = file_states[idx]["resumed"]
+            remaining = sum(1 for task in tasks if task.page_num not in resumed and task.native_text is None)
+            files.append((idx, file_states[idx]["path"], remaining))
+        file_order = self.schedule.order_files(files)
+        all_tasks, self.preview_task_count = self.schedule.order_tasks(tasks_by_file, file_order)
+        if not self.schedule.is_default:
+            names = ", ".join(file_states[idx]["name"] for idx in file_order[:10])
+            more = f" 等 {len(file_order)} 个文件" if len(file_order) > 10 else ""
+            self.log_message(f"任务调度: {self.schedule.description}; 文件顺序: {names}{more}。")
+        return all_tasks
+
+    def _open_journal(self, state, tasks):
+        """创建文件的检查点日志；续跑模式下读取已完成的页面 (页码 -> 文本)"""
+        try:
+            header = {"source": source_identity(state["path"]), "settings": self.settings.cache_fingerprint(),
+                      "engine": self.engine_choice, "num_pages": len(tasks)}
+        except OSError as e:
+            self.log_message(f"  无法读取文件信息，不记录检查点: {e}", logging.WARNING)
+            return
+        journal = PageJournal(self.output_dir, state["stem"], header, log=self.log_message)
+        resumed = journal.load_completed() if self.resume else {}
+        try:
+            journal.open(fresh=not resumed)
+        except OSError as e:
+            self.log_message(f"  无法写入检查点 {journal.path}: {e}", logging.WARNING)
+            return
+        state["journal"] = journal
+        state["resumed"] = resumed
+        if resumed:
+            self.log_message(f"  {state['name']}: 从检查点恢复 {len(resumed)}/{len(tasks)} 页，继续处理剩余页面。")
+
+    def _run_tasks(self, page_runner, file_states, all_tasks, summary, cache=None):
+        """
+        处理页面任务，结果按文件、页码顺序返回，文件的最后一页完成后立即写出。
+        命中缓存的页面直接使用缓存文本，不会交给引擎/工作进程；
+        预筛判定为空白页或重复页的页面也不交给引擎 (重复页在原页面完成后复用其文本)。
+        """
+        total_pages = len(all_tasks)
+        fingerprint = self.settings.cache_fingerprint()
+        # 任务序号 -> 不需要识别的 PageResult，来源为 "journal"、"text_layer"、"cache" 或 "blank"；
+        # engine 为实际产生文本的引擎 (文本层、空白页为 None)
+        known_texts = {}
+        for seq, task in enumerate(all_tasks):
+            resumed = file_states[task.file_index]["resumed"]
+            if task.page_num in resumed:
+                record = resumed[task.page_num]
+                known_texts[seq] = PageResult(task, record["text"], engine=record.get("engine"), source="journal",
+                                              layout=record.get("layout"))
+            elif task.native_text is not None:
+                known_texts[seq] = PageResult(task, f"\n--- {task.description} (文本层) ---\n{task.native_text}\n",
+                                              source="text_layer")
+            elif cache is not None and task.page_hash:
+                # 自动选择引擎时任一引擎缓存的结果都可以使用 (一页只计一次命中)；
+                # 未命中的页面可能被预筛跳过，预筛之后只把确实要识别的页面计为未命中
+                engines = ROUTED_ENGINES if self.engine_choice == AUTO_ENGINE else (self.engine_choice,)
+                entry = cache.get_any([make_cache_key(task.page_hash, engine, fingerprint) for engine in engines],
+                                      count_miss=False)
+                if entry is not None:  # 缓存不含标题行，按本页页码重建
+                    text = format_page_text(task.description, entry["label"], entry["body"])
+                    known_texts[seq] = PageResult(task, text, engine=entry["engine"], source="cache",
+                                                  layout=entry.get("layout"))
+        duplicates = self._screen_pages(all_tasks, known_texts, summary)
+        num_known = {}
+        for known in known_texts.values():
+            num_known[known.source] = num_known.get(known.source, 0) + 1
+        self.log_message(f"共 {total_pages} 个页面任务 (检查点恢复 {num_known.get('journal', 0)} 个, "
+                         f"使用文本层 {num_known.get('text_layer', 0)} 个, "
+                         f"命中缓存 {num_known.get('cache', 0)} 个, 空白页 {num_known.get('blank', 0)} 个, "
+                         f"重复页 {len(duplicates)} 个)，执行方式: {self._execution_mode(page_runner)}。")
+
+        ocr_tasks = [t for seq, t in enumerate(all_tasks) if seq not in known_texts and seq not in duplicates]
+        if cache is not None:
+            cache.add_misses(sum(1 for task in ocr_tasks if task.page_hash))
+        if page_runner.engine_choice == AUTO_ENGINE:
+            result_iter = self._routed_results(page_runner, ocr_tasks)
+        else:
+            result_iter = page_runner.map_pages(ocr_tasks)
+        try:
+            self._collect_results(all_tasks, known_texts, duplicates, result_iter, file_states, summary, cache,
+                                  fingerprint)
+        finally:
+            result_iter.close()
+            for state in file_states:
+                if state["journal"] is not None:
+                    state["journal"].close()
+                if state["writers"] and state["done"] < state["expected"]:  # 取消或出错中断
+                    for writer in state["writers"]:
+                        writer.close()
+                        self.log_message(f"  {state['name']}: 已完成的 {writer.pages_written}/{state['expected']} 页"
+                                         f"保留在 {writer.path}", logging.WARNING)
+
+    def _routed_results(self, page_runner, tasks):
+        """
+        自动选择引擎 (见 engine_router.py)：先提交每个路由的前 route_sample_pages 个采样页，全部完成后
+        为每个文件做一次决定，再按选中的引擎提交其余页面。按任务顺序产出 PageResult。
+        """
+        router = EngineRouter(self.settings.route_sample_pages, self.log_message)
+        keys = [router.route_key(task.file_path, task.num_pages) for task in tasks]
+        for task, key in zip(tasks, keys):
+            task.route = SAMPLE_ROUTE if router.reserve_sample(key) else None
+        samples = [(task, key) for task, key in zip(tasks, keys) if task.route == SAMPLE_ROUTE]
+        self.log_message(f"引擎自动选择: 先用两种引擎识别 {len(samples)} 个采样页...")
+        sampled = []
+        sample_iter = page_runner.map_pages([task for task, _ in samples])
+        try:
+            for (task, key), result in zip(samples, sample_iter):
+                sampled.append(result)
+                if result.cancelled:
+                    break
+                router.record(key, result.sample)
+        finally:
+            sample_iter.close()
+        complete = len(sampled) == len(samples) and not any(result.cancelled for result in sampled)
+        rest = []
+        for task, key in zip(tasks, keys):
+            if task.route is None and complete:  # 采样被取消时不再提交其余页面
+                task.route = router.engine_for(key)
+                rest.append(task)
+        rest_iter = page_runner.map_pages(rest)
+        sampled_iter = iter(sampled)
+        try:
+            for task, key in zip(tasks, keys):
+                if task.route == SAMPLE_ROUTE:
+                    result = next(sampled_iter, None)
+                else:
+                    result = next(rest_iter, None)
+                    if result is not None and not result.cancelled:
+                        _add_stats(result.stats, **{f"route_{task.route}": 1,
+                                                    "route_saved_seconds": router.estimated_saving(key)})
+                if result is None:
+                    return
+                yield result
+        finally:
+            rest_iter.close()
+
+    def _screen_pages(self, all_tasks, known_texts, summary):
+        """
+        预筛尚无结果的页面 (见 page_screen.py)：空白页加入 known_texts (来源 "blank")，
+        返回重复页 {任务序号: 原页面任务序号} (原页面总在前面，按顺序合并结果时先完成)。
+        单页预筛失败时该页照常 OCR。
+        """
+        duplicates = {}
+        if not (self.settings.skip_blank_pages or self.settings.dedup_pages):
+            return duplicates
+        screener = PageScreener(skip_blank=self.settings.skip_blank_pages, dedup=self.settings.dedup_pages)
+        start_time = perf_counter()
+        screened = 0
+        try:
+            for seq, task in enumerate(all_tasks):
+                if seq in known_texts:
+                    continue
+                if self.should_stop():
+                    break
+                try:
+                    verdict, original = screener.screen(task, seq)
+                except Exception as e:
+                    self.log_message(f"  预筛 {describe_page(task)} 失败，照常识别: {e}", logging.WARNING)
+                    continue
+                screened += 1
+                if verdict == "blank":
+                    known_texts[seq] = PageResult(task, f"\n--- {task.description} (空白页，跳过 OCR) ---\n",
+                                                  source="blank")
+                    summary.blank_pages.append(describe_page(task))
+                elif verdict == "duplicate":
+                    duplicates[seq] = original
+                    summary.duplicate_pages.append((describe_page(task), describe_page(all_tasks[original])))
+        finally:
+            screener.close()
+        self.log_message(f"页面预筛: 检查 {screened} 页，空白页 {len(summary.blank_pages)} 页，"
+                         f"重复页 {len(duplicates)} 页 (复核相似页 {screener.verified} 次，"
+                         f"其中内容不同 {screener.rejected} 次)，耗时 {perf_counter() - start_time:.2f} 秒。")
+        return duplicates
+
+    def _execution_mode(self, page_runner=None):
+        if getattr(page_runner, "execution_mode", None):  # OCR 服务
+            return page_runner.execution_mode
+        return local_execution_mode(self.settings)
+
+    def _collect_results(self, all_tasks, known_texts, duplicates, result_iter, file_states, summary, cache,
+                         fingerprint):
+        """按任务顺序合并检查点/缓存结果与引擎结果，逐页记录检查点，并写出完成的文件"""
+        total_files = summary.total_files
+        total_pages = len(all_tasks)
+        done_pages = 0
+        pending_refs = {}  # 被重复页引用的原页面序号 -> 尚未写出的重复页数
+        for original in duplicates.values():
+            pending_refs[original] = pending_refs.get(original, 0) + 1
+        reusable = {}  # 原页面序号 -> 原页面的 PageResult (最后一个重复页写出后释放)
+        for seq, task in enumerate(all_tasks):
+            if self.should_stop():
+                break
+            state = file_states[task.file_index]
+            if seq in known_texts:
+                result = known_texts.pop(seq)  # 写出后不再保留
+            elif seq in duplicates:
+                original = duplicates[seq]
+                pending_refs[original] -= 1
+                original_result = reusable.get(original) if pending_refs[original] else reusable.pop(original, None)
+                header = f"\n--- {task.description} (与 {describe_page(all_tasks[original])} 相同，复用识别结果) ---"
+                if original_result is None:
+                    result = PageResult(task, header + "\n", error="原页面识别失败，重复页没有可复用的结果",
+                                        source="duplicate")
+                else:  # 去掉原页面的标题行，换成本页的标题；版面块与原页面相同
+                    _, body = split_page_text(original_result.text)
+                    result = PageResult(task, f"{header}\n{body}", engine=original_result.engine, source="duplicate",
+                                        layout=original_result.layout)
+            else:
+                result = next(result_iter, None)
+                if result is None or result.cancelled:
+                    break
+                if result.status == "ok" and cache is not None and task.page_hash and result.engine:
+                    label, body = split_page_text(result.text)
+                    cache.put(make_cache_key(task.page_hash, result.engine, fingerprint),
+                              {"label": label, "body": body, "engine": result.engine, "layout": result.layout})
+                if state["journal"] is not None:
+                    state["journal"].append_page(task.page_num, result.text, result.engine, error=result.error,
+                                                 layout=result.layout)
+            if seq in pending_refs and pending_refs[seq] and result.status == "ok":
+                reusable[seq] = result
+            if result.source in ("cache", "text_layer", "blank", "duplicate") and state["journal"] is not None:
+                state["journal"].append_page(task.page_num, result.text, result.engine, error=result.error,
+                                             layout=result.layout)
+            file_num = task.file_index + 1
+            if state["start_time"] is None:
+                state["start_time"] = perf_counter() - result.elapsed
+                self.log_message(f"\n>> 文件 {file_num}/{total_files}: {state['name']}", logging.INFO)
+                if task.is_pdf_page:
+                    selected = f"，本次处理其中 {state['expected']} 页" if state["expected"] < task.num_pages else ""
+                    self.log_message(f"  PDF 共 {task.num_pages} 页{selected}。")
+                state["writers"] = self._open_writers(state)
+
+            self._write_page(state, result)
+            state["done"] += 1
+            done_pages += 1
+            summary.page_sources[result.source] = summary.page_sources.get(result.source, 0) + 1
+            _add_stats(summary.stats, **result.stats)
+            if result.source == "journal":
+                self.log_message(f"    {task.description} 已在检查点中完成，跳过识别。")
+            elif result.source == "text_layer":
+                self.log_message(f"    {task.description} 使用 PDF 内嵌文本层，跳过 OCR。")
+            elif result.source == "cache":
+                self.log_message(f"    {task.description} 命中结果缓存，跳过识别。")
+            elif result.source == "blank":
+                self.log_message(f"    {task.description} 为空白页，跳过 OCR。")
+            elif result.source == "duplicate":
+                original = describe_page(all_tasks[duplicates[seq]])
+                if result.error:
+                    self.log_message(f"    {task.description} 与 {original} 相同，但原页面识别失败。", logging.WARNING)
+                else:
+                    self.log_message(f"    {task.description} 与 {original} 相同，复用识别结果。")
+            else:
+                self.log_message(f"    {task.description} 处理完成 (引擎: {result.engine or self.engine_choice}, "
+                                 f"耗时 {result.elapsed:.2f} 秒)。")
+            self.update_progress(done_pages / max(1, total_pages) * 100,
+                                 f"文件 {file_num}/{total_files} - {task.description}/{task.num_pages} "
+                                 f"({self.engine_choice})...")
+
+            if state["done"] == state["expected"]:
+                saved = self._save_file_result(state)
+                if saved:
+                    summary.processed_count += 1
+                    if state["journal"] is not None:
+                        state["journal"].remove()  # 最终结果已写出，不再需要检查点
+                elif saved is None:
+                    summary.error_count += 1
+            if seq + 1 == self.preview_task_count:
+                for other in file_states:
+                    for writer in other["writers"] or ():
+                        writer.flush()
+                self.log_message(f"\n预览阶段完成：每个文件的前 {self.schedule.preview_pages} 页已写入输出 "
+                                 f"(未完成的文件在 *.partial 中)，开始处理其余 {total_pages - seq - 1} 个页面。")
+
+    def _open_writers(self, state):
+        """按输出格式创建文件的逐页输出 (文本/JSONL)；任一输出无法创建时返回 None (该文件按失败处理)"""
+        output_format = self.settings.output_format
+        writers = []
+        if output_format in ("text", "both"):
+            writers.append(StreamingTextWriter(self.output_dir, state["stem"], self.flush_policy))
+        if output_format in ("jsonl", "both"):
+            writers.append(StreamingJSONLWriter(self.output_dir, state["stem"], self.flush_policy, state["name"]))
+        for writer in writers:
+            try:
+                writer.open()
+            except OSError as e:
+                self.log_message(f"错误：无法创建输出文件 {writer.path}: {e}", logging.ERROR)
+                self._close_writers(writers)
+                return None
+        return writers
+
+    @staticmethod
+    def _close_writers(writers):
+        for writer in writers:
+            writer.close()
+
+    def _write_page(self, state, result):
+        """按页码顺序把一页结果追加到各个输出；写入失败时关闭输出，该文件不再生成最终结果"""
+        if not state["writers"]:
+            return
+        for writer in state["writers"]:
+            try:
+                writer.write_result(result)
+            except OSError as e:
+                self.log_message(f"错误：写入输出文件 {writer.path} 失败: {e}", logging.ERROR)
+                self._close_writers(state["writers"])
+                state["writers"] = None
+                return
+
+    def _save_file_result(self, state):
+        """
+        文件全部页面写出后按页面状态收尾：全部成功则把各输出改名为最终文件。
+        返回 True 已保存，None 有页面失败或写入失败 (计为错误)，False 没有有效文本。
+        """
+        base_name_with_ext = state["name"]
+        writers = state["writers"]
+        if not writers:
+            self.log_message(f"文件 {base_name_with_ext} 的输出写入失败，未生成结果文件。", logging.WARNING)
+            return None
+        failed_pages = writers[0].failed_pages  # 各输出写入的页面相同
+        if failed_pages:
+            self._close_writers(writers)
+            pages = ", ".join(str(page_num) for page_num, _ in failed_pages[:10])
+            more = " 等" if len(failed_pages) > 10 else ""
+            kept = ", ".join(writer.path for writer in writers)
+            self.log_message(f"文件 {base_name_with_ext} 有 {len(failed_pages)} 页处理失败 (页码 {pages}{more})，"
+                             f"未生成最终结果文件；已识别的内容保留在 {kept}", logging.WARNING)
+            return None
+        if not any(writer.has_content for writer in writers):
+            for writer in writers:
+                writer.discard()
+            self.log_message(f"文件 {base_name_with_ext} 未产生有效文本输出 (可能为空白或无内容)。",
+                             logging.WARNING)
+            return False
+        saved = []
+        for writer in writers:
+            try:
+                saved.append(writer.commit())
+            except OSError as e:
+                self.log_message(f"错误：无法保存结果文件 {writer.final_path}: {e}", logging.ERROR)
+                self._close_writers(writers)
+                return None
+        file_end_time = perf_counter()
+        self.log_message(f"结果已保存 (耗时 {file_end_time - state['start_time']:.2f} 秒): {', '.join(saved)}")
+        return True
+
+
+# --- 命令行入口 ---
+def expand_inputs(patterns):
+    """展开输入参数：支持通配符 (含 ** 递归) 和目录 (取目录下所有支持的文件)，保持顺序并去重"""
+    supported = PDF_EXTENSIONS + IMAGE_EXTENSIONS
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    full = os.path.join(path, name)
+                    if os.path.isfile(full) and os.path.splitext(name)[1].lower() in supported:
+                        files.append(full)
+            elif os.path.isfile(path):
+                files.append(path)
+            else:
+                logging.warning(f"输入不存在，已忽略: {path}")
+    seen = set()
+    return [f for f in files if not (os.path.abspath(f) in seen or seen.add(os.path.abspath(f)))]
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m ocr_engine",
+        description="无界面批量 OCR (PDF/图像)，输出 {文件名}_ocr.txt 和/或 {文件名}_ocr.jsonl")
+    parser.add_argument("inputs", nargs="+", help="输入文件、目录或通配符 (如 'scans/**/*.pdf')")
+    parser.add_argument("-o", "--output-dir", default=os.getcwd(), help="输出目录 (默认当前目录)")
+    parser.add_argument("-e", "--engine", choices=["pp-structure", "tesseract", AUTO_ENGINE], default="pp-structure",
+                        help="OCR 引擎 (默认 pp-structure，加载失败时回退到 tesseract；auto 按每个文件的采样页"
+                             "实测耗时与置信度选择)")
+    parser.add_argument("--route-samples", type=int, default=DEFAULT_SAMPLE_PAGES,
+                        help=f"-e auto 时每个文件用两种引擎各识别的采样页数 (默认 {DEFAULT_SAMPLE_PAGES})")
+    parser.add_argument("-l", "--lang", default="ch", help="识别语言 (PP用ch/en, Tess用chi_sim+eng)")
+    parser.add_argument("--dpi", type=int, default=300, help="PDF 页面渲染 DPI (默认 300)")
+    parser.add_argument("--adaptive-dpi", action="store_true",
+                        help="按估计字高为每页选择渲染 DPI (无法估计时使用 --dpi)")
+    parser.add_argument("--min-dpi", type=int, default=150, help="自适应 DPI 下限 (默认 150)")
+    parser.add_argument("--max-dpi", type=int, default=400, help="自适应 DPI 上限 (默认 400)")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="并行进程数 (默认 1，串行)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="单进程流水线：渲染/超分/识别在不同线程中并行 (-j 1 时有效)，结束时输出各阶段利用率")
+    parser.add_argument("--ocr-threads", type=int, default=2, help="流水线识别阶段的线程数 (默认 2，每个线程一套引擎)")
+    parser.add_argument("--queue-size", type=int, default=2, help="流水线阶段之间的队列容量 (默认 2 页)")
+    parser.add_argument("--server", nargs="?", const="default", default=None, metavar="URL",
+                        help="使用本机 OCR 模型服务 (python ocr_server.py)，不写 URL 时为 OCR_SERVER_URL 或 "
+                             "http://127.0.0.1:8765；-j 表示并发请求数。服务未启动时使用进程内引擎")
+    parser.add_argument("--sr", action="store_true", help="启用 CARN 超分辨率 (需 PyTorch)")
+    parser.add_argument("--carn-model", default="carn.pth", help="CARN 模型权重路径")
+    parser.add_argument("--sr-tile", type=int, default=256, help="CARN 分块大小 (像素，默认 256，越大越占内存)")
+    parser.add_argument("--sr-overlap", type=int, default=16, help="CARN 分块重叠像素 (默认 16)")
+    parser.add_argument("--sr-text-only", action="store_true",
+                        help="只对检测到文字的块做 CARN 超分，其余区域双三次插值")
+    parser.add_argument("--sr-batch", type=int, default=4, help="CARN 每次前向的块数 (默认 4)")
+    parser.add_argument("--sr-threads", type=int, default=0,
+                        help="CARN 推理线程数 (默认 0: torch 默认值；并行模式下为每进程 1)")
+    parser.add_argument("--sr-channels-last", action="store_true", help="CARN 使用 channels_last 内存布局")
+    parser.add_argument("--carn-variant", choices=["auto", "fp32", "torchscript", "int8"], default="auto",
+                        help="CARN 模型变体 (默认 auto：按 carn_runtime.py export 的结果选最快且精度达标的)")
+    parser.add_argument("--tesseract-backend", choices=["auto", "capi", "cli"], default="auto",
+                        help="Tesseract 调用方式 (默认 auto：优先进程内 libtesseract，找不到时用 pytesseract 子进程)")
+    parser.add_argument("--regions", action="store_true",
+                        help="Tesseract 只识别检测到的文字区域 (跳过插图与空白，各区域选择 psm 并行识别)")
+    parser.add_argument("--region-threads", type=int, default=0,
+                        help="区域识别的线程数 (默认 0，按 CPU 核数与进程数自动选择)")
+    parser.add_argument("--save-images", action="store_true", help="保存提取/输入的图像到子文件夹")
+    parser.add_argument("--image-format", choices=list(IMAGE_FORMATS), default="png",
+                        help="保存图像的格式：png (默认)，webp (无损)，npy (原始数组，可内存映射，"
+                             "再次处理时跳过渲染)")
+    parser.add_argument("--png-level", type=int, default=DEFAULT_PNG_LEVEL,
+                        help=f"PNG 压缩级别 0~9 (默认 {DEFAULT_PNG_LEVEL}，越大文件越小、编码越慢)")
+    parser.add_argument("--image-threads", type=int, default=1, help="后台保存图像的线程数 (默认 1)")
+    parser.add_argument("--no-reuse-images", action="store_true",
+                        help="不复用已保存的 npy 原始页面 (默认以相同 DPI 处理时内存映射代替渲染)")
+    parser.add_argument("--no-osd", action="store_true", help="关闭方向检测 (Tesseract 流程)")
+    parser.add_argument("--osd-mode", choices=["combined", "separate"], default="combined",
+                        help="方向检测方式 (默认 combined：先识别，置信度低时才 OSD，只有需要旋转的页面才重新识别；"
+                             "separate：每页先单独 OSD)")
+    parser.add_argument("--no-crop", action="store_true", help="关闭边界裁剪 (Tesseract 流程)")
+    parser.add_argument("--no-clahe", action="store_true", help="关闭 CLAHE 对比度增强 (Tesseract 流程)")
+    parser.add_argument("--denoise", action="store_true", help="启用降噪 (Tesseract 流程)")
+    parser.add_argument("--denoise-method", choices=["auto", "nlmeans", "median", "bilateral"], default="auto",
+                        help="降噪方法 (默认 auto：按估计的噪声水平选择；nlmeans 效果好但很慢)")
+    parser.add_argument("--no-text-layer", action="store_true",
+                        help="不使用 PDF 内嵌文本层，所有页面都渲染后 OCR")
+    parser.add_argument("--text-layer-min-chars", type=int, default=TEXT_LAYER_MIN_CHARS,
+                        help=f"页面文本层至少包含多少个可见字符才直接使用 (默认 {TEXT_LAYER_MIN_CHARS})")
+    parser.add_argument("--no-skip-blank", action="store_true", help="不跳过空白页 (默认预筛墨迹极少的页面并跳过 OCR)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="与批次中较早页面相同的页面复用其识别结果 (默认关闭，每页都识别)")
+    parser.add_argument("--pages", default=None, metavar="RANGE",
+                        help="只处理每个文件的这些页 (1 起始，如 '1-5,8,12-'；默认全部页面)")
+    parser.add_argument("--file-pages", action="append", default=[], metavar="FILE=RANGE",
+                        help="为单个文件指定页码范围 (文件为路径或文件名，可重复；优先于 --pages)")
+    parser.add_argument("--order", choices=list(SCHEDULE_ORDERS), default="input",
+                        help="文件处理顺序：input 输入顺序 (默认)，sjf 待处理页数少的文件优先，"
+                             "priority 按 --priority 指定的优先级")
+    parser.add_argument("--priority", action="append", default=[], metavar="FILE=N",
+                        help="文件优先级 (整数，越大越先处理，未指定为 0；可重复，配合 --order priority)")
+    parser.add_argument("--preview", type=int, default=0, metavar="N",
+                        help="先处理每个文件的前 N 页，再处理其余页面 (默认 0，不预览)")
+    parser.add_argument("--no-cache", action="store_true", help="不读写结果缓存 (强制重新识别)")
+    parser.add_argument("--purge-cache", action="store_true", help="开始前清空结果缓存")
+    parser.add_argument("--cache-dir", default=None, help="结果缓存目录 (默认 ~/.cache/ocr_tools 或 OCR_CACHE_DIR)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="忽略输出目录中已有的逐页检查点，从头处理 (默认从上次中断处继续)")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default="text",
+                        help="输出格式 (默认 text：{文件名}_ocr.txt；jsonl：{文件名}_ocr.jsonl，每个版面块一条记录，"
+                             "含 bbox、类型、置信度与耗时；both：两者都输出)")
+    parser.add_argument("--flush", choices=list(FLUSH_POLICIES), default="page",
+                        help="文本输出落盘策略 (默认 page：每页 flush，可边识别边 tail -f {文件名}_ocr.partial.txt；"
+                             "fsync：每页 fsync；close：文件完成时才落盘)")
+    parser.add_argument("--cache-size-mb", type=float, default=DEFAULT_CACHE_SIZE_MB,
+                        help=f"结果缓存大小上限 MB，超出后按 LRU 淘汰 (默认 {DEFAULT_CACHE_SIZE_MB})")
+    return parser
+
+
+def _server_url(value):
+    if value == "default":
+        from ocr_server import DEFAULT_SERVER_URL
+        return DEFAULT_SERVER_URL
+    return value
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    input_files = expand_inputs(args.inputs)
+    if not input_files:
+        logging.error("没有找到可处理的输入文件。")
+        return 2
+    os.makedirs(args.output_dir, exist_ok=True)
+    try:
+        schedule = BatchSchedule(args.order, args.pages, parse_assignments(args.file_pages),
+                                 parse_assignments(args.priority, int), args.preview)
+    except ValueError as e:
+        logging.error(f"任务调度参数无效: {e}")
+        return 2
+
+    settings = OCRSettings(
+        engine={"pp-structure": "PP-Structure", "tesseract": "Tesseract"}.get(args.engine, AUTO_ENGINE),
+        language=args.lang,
+        perform_osd=not args.no_osd,
+        perform_crop=not args.no_crop,
+        perform_clahe=not args.no_clahe,
+        perform_denoise=args.denoise,
+        use_super_res=args.sr,
+        carn_model_path=args.carn_model,
+        sr_tile_size=args.sr_tile,
+        sr_tile_overlap=args.sr_overlap,
+        sr_text_only=args.sr_text_only,
+        sr_batch_size=args.sr_batch,
+        sr_threads=args.sr_threads,
+        sr_channels_last=args.sr_channels_last,
+        carn_variant=args.carn_variant,
+        tesseract_backend=args.tesseract_backend,
+        osd_mode=args.osd_mode,
+        denoise_method=args.denoise_method,
+        dpi=args.dpi,
+        adaptive_dpi=args.adaptive_dpi,
+        min_dpi=args.min_dpi,
+        max_dpi=args.max_dpi,
+        workers=args.workers,
+        pipeline=args.pipeline,
+        pipeline_ocr_threads=args.ocr_threads,
+        pipeline_queue_size=args.queue_size,
+        use_text_layer=not args.no_text_layer,
+        text_layer_min_chars=args.text_layer_min_chars,
+        output_format=args.format,
+        server_url=_server_url(args.server),
+        skip_blank_pages=not args.no_skip_blank,
+        dedup_pages=args.dedup,
+        region_ocr=args.regions,
+        region_threads=args.region_threads,
+        image_format=args.image_format,
+        png_level=args.png_level,
+        image_threads=args.image_threads,
+        reuse_saved_pages=not args.no_reuse_images,
+        route_sample_pages=args.route_samples,
+    )
+    logging.info(f"共 {len(input_files)} 个输入文件，引擎: {settings.engine}, 语言: {settings.language}, "
+                 f"DPI: {'自适应' if settings.adaptive_dpi else settings.dpi}, 进程数: {settings.workers}, 超分: {settings.use_super_res}")
+
+    stop_requested = threading.Event()
+    runner = OCRBatchRunner(settings, args.output_dir, save_images=args.save_images,
+                            should_stop=stop_requested.is_set,
+                            use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                            cache_size_mb=args.cache_size_mb, purge_cache=args.purge_cache,
+                            resume=not args.no_resume, flush_policy=args.flush, schedule=schedule)
+    try:
+        summary = runner.run(input_files)
+    except KeyboardInterrupt:
+        stop_requested.set()
+        logging.warning("已中断。")
+        return 130
+    if summary.cancelled:
+        return 130
+    return 1 if summary.error_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+# 文件路径：ocr_output.py
+# -*- coding: utf-8 -*-
+"""
+ocr_output.py — OCR 结果输出
+主要功能：
+1. PageJournal: 每个输入文件一个逐页检查点日志 ({文件名}_ocr.journal.jsonl)。
+   - 每页识别完成后立即追加一行 JSON 并落盘，进程崩溃或取消后已完成的页面不会丢失。
+   - 再次运行时读取日志，从第一个缺失的页面继续；文件/参数变化时自动作废。
+   - 日志是逐行追加的 JSONL，其他程序可以边识别边读取部分结果。
+   - 识别失败的页面也记录一行 (status="error")，续跑时只重新处理这些页面和缺失的页面。
+2. StreamingTextWriter: 每页完成后立即追加到 {文件名}_ocr.partial.txt，内存占用不随页数增长；
+   全部页面成功后改名为 {文件名}_ocr.txt (同一 inode，tail -f 不会中断)。
+   有页面失败时保留 .partial.txt，不生成最终文件。页面状态由调用方传入，不再从文本中查找"失败"等字样。
+3. StreamingJSONLWriter: 结构化输出 {文件名}_ocr.jsonl，同样逐页追加、完成后改名。每页先写一条
+   type="page" 的记录 (引擎、来源、状态、耗时与各阶段耗时、识别图像尺寸)，然后每个版面块一条记录
+   (type 为块类型，含 bbox、text、confidence，表格另含 html)。bbox 为 [x0, y0, x1, y1]，
+   坐标基于实际送入识别器的图像 (超分/旋转/裁剪之后，尺寸见页面记录的 size)。
+   结果缓存和检查点保存识别时的版面块，命中时照常输出；PDF 文本层、空白页等没有版面信息的页面，
+   去掉标题行的整页文本作为一条 type="page_text" 的记录。
+4. split_page_text / format_page_text: 页面文本与 (标题说明, 正文) 之间的转换。
+5. tesseract_blocks / ppstructure_blocks: 把 Tesseract 逐词数据、PP-Structure 结果转换为版面块。
+"""
+
+import os
+import re
+import json
+import logging
+
+JOURNAL_FORMAT_VERSION = 1
+JOURNAL_SUFFIX = "_ocr.journal.jsonl"
+TEXT_SUFFIX = "_ocr.txt"
+PARTIAL_TEXT_SUFFIX = "_ocr.partial.txt"
+# 文本输出落盘策略："page" 每页 flush (其他程序可立即读到)，"fsync" 每页 flush 并 fsync (断电也不丢)，
+# "close" 只在文件完成时落盘 (页数很多的小页面吞吐最高)
+FLUSH_POLICIES = ("page", "fsync", "close")
+JSONL_SUFFIX = "_ocr.jsonl"
+PARTIAL_JSONL_SUFFIX = "_ocr.partial.jsonl"
+OUTPUT_FORMATS = ("text", "jsonl", "both")
+# PageResult.stats 中不是实际阶段耗时的估计值，不写入 JSONL 的 stage_seconds
+_ESTIMATED_STATS = ("osd_avoided_seconds",)
+
+
+def split_page_text(text):
+    """
+    页面文本 "\n--- 描述 (说明) ---\n正文" -> (说明, 正文)。
+    标题行带有页码，结果缓存只保存说明和正文，命中时用 format_page_text 按本页的描述重建标题。
+    """
+    header, _, body = text.partition(" ---\n")
+    _, _, label = header.rpartition(" (")
+    return (label[:-1] if label.endswith(")") else label), body
+
+
+def format_page_text(description, label, body):
+    return f"\n--- {description} ({label}) ---\n{body}"
+
+
+def source_identity(path):
+    """输入文件身份 (绝对路径、大小、修改时间)，用于判断检查点是否仍然对应同一个文件"""
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+class PageJournal:
+    """ 单个输入文件的逐页检查点日志 """
+
+    def __init__(self, output_dir, stem, header, log=None):
+        self.path = os.path.join(output_dir, f"{stem}{JOURNAL_SUFFIX}")
+        self.header = dict(header, type="header", version=JOURNAL_FORMAT_VERSION)
+        self.log_message = log or (lambda m, level=logging.INFO: logging.log(level, m))
+        self._fh = None
+
+    def load_completed(self):
+        """
+        读取已完成的页面，返回 {页码: 记录}，记录含 "text"、"engine" 与 "layout" (没有版面信息时为 None)。
+        日志不存在、头部与当前文件/参数不一致或无法解析时返回空字典 (并在下次写入时重建日志)。
+        末尾不完整的行 (写入过程中崩溃) 会被忽略。
+        """
+        if not os.path.exists(self.path):
+            return {}
+        completed = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                first = f.readline()
+                header = json.loads(first) if first.strip() else None
+                if not header or not self._header_matches(header):
+                    self.log_message(f"  检查点与当前文件或参数不一致，重新开始: {self.path}", logging.WARNING)
+                    return {}
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # 最后一行可能写了一半
+                    if record.get("type") == "page" and record.get("status", "ok") == "ok":
+                        completed[int(record["page"])] = record
+                    elif record.get("type") == "page":
+                        completed.pop(int(record["page"]), None)
+        except (OSError, ValueError, KeyError) as e:
+            self.log_message(f"  读取检查点失败，重新开始: {e}", logging.WARNING)
+            return {}
+        return completed
+
+    def _header_matches(self, header):
+        keys = ("version", "source", "settings", "engine", "num_pages")
+        return all(header.get(k) == self.header.get(k) for k in keys)
+
+    def open(self, fresh):
+        """打开日志用于追加；fresh=True 时重建日志并写入头部"""
+        if self._fh is not None:
+            return
+        mode = "w" if fresh or not os.path.exists(self.path) else "a"
+        self._fh = open(self.path, mode, encoding="utf-8")
+        if mode == "w":
+            self._write_line(self.header)
+
+    def append_page(self, page_num, text, engine=None, error=None, layout=None):
+        """追加一页结果并立即落盘；error 不为 None 时记录为失败页面 (续跑时重新处理)"""
+        record = {"type": "page", "page": page_num, "engine": engine, "status": "error" if error else "ok"}
+        if error:
+            record["error"] = error
+        record["text"] = text
+        if layout is not None:
+            record["layout"] = layout
+        self._write_line(record)
+
+    def _write_line(self, record):
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def remove(self):
+        """文件全部完成并写出最终结果后删除检查点"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class StreamingTextWriter:
+    """ 单个输入文件的逐页文本输出 (按页码顺序调用 write_page) """
+
+    suffix = TEXT_SUFFIX
+    partial_suffix = PARTIAL_TEXT_SUFFIX
+
+    def __init__(self, output_dir, stem, flush_policy="page"):
+        self.path = os.path.join(output_dir, f"{stem}{self.partial_suffix}")
+        self.final_path = os.path.join(output_dir, f"{stem}{self.suffix}")
+        self.flush_policy = flush_policy if flush_policy in FLUSH_POLICIES else "page"
+        self.pages_written = 0
+        self.failed_pages = []  # [(页码, 错误描述)]
+        self.has_content = False  # 是否写出过非空白的成功页面
+        self._fh = None
+
+    def open(self):
+        """创建 (覆盖) 部分结果文件；续跑时已完成的页面会按顺序重新写入"""
+        if self._fh is None:
+            self._fh = open(self.path, "w", encoding="utf-8")
+
+    def write_page(self, page_num, text, error=None):
+        """追加一页文本并按落盘策略 flush；error 不为 None 表示该页处理失败"""
+        self._append(text, page_num, error, bool(text.strip()))
+
+    def write_result(self, result):
+        """写出一个页面结果 (ocr_engine.PageResult)"""
+        self.write_page(result.task.page_num, result.text, result.error)
+
+    def _append(self, data, page_num, error, has_content):
+        self._fh.write(data)
+        self.pages_written += 1
+        if error:
+            self.failed_pages.append((page_num, error))
+        elif has_content:
+            self.has_content = True
+        if self.flush_policy != "close":
+            self._fh.flush()
+            if self.flush_policy == "fsync":
+                os.fsync(self._fh.fileno())
+
+    def flush(self):
+        """把已写出的页面落盘 (不论落盘策略)，如预览阶段结束时"""
+        if self._fh is not None:
+            self._fh.flush()
+
+    @property
+    def succeeded(self):
+        return not self.failed_pages and self.has_content
+
+    def commit(self):
+        """落盘并把部分结果文件改名为最终文件，返回最终路径"""
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self.close()
+        os.replace(self.path, self.final_path)
+        return self.final_path
+
+    def close(self):
+        """关闭文件，部分结果保留在 self.path"""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def discard(self):
+        """关闭并删除部分结果文件"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class StreamingJSONLWriter(StreamingTextWriter):
+    """ 单个输入文件的逐页 JSONL 输出：每页一条页面记录 + 每个版面块一条记录 """
+
+    suffix = JSONL_SUFFIX
+    partial_suffix = PARTIAL_JSONL_SUFFIX
+
+    def __init__(self, output_dir, stem, flush_policy="page", source_name=None):
+        super().__init__(output_dir, stem, flush_policy)
+        self.source_name = source_name or stem
+
+    def write_result(self, result):
+        """写出一个页面结果 (ocr_engine.PageResult)；result.layout 为 None 时整页正文 (不含标题行) 作为一个块"""
+        page_num = result.task.page_num
+        layout = result.layout or {}
+        blocks = layout.get("blocks")
+        if blocks is None:
+            body = split_page_text(result.text)[1].strip()
+            blocks = [] if result.error else [{"type": "page_text", "bbox": None, "text": body, "confidence": None}]
+        common = {"file": self.source_name, "page": page_num}
+        page_record = dict(common, type="page", engine=result.engine, source=result.source, status=result.status,
+                           error=result.error, seconds=round(result.elapsed, 4),
+                           stage_seconds={k: round(v, 4) for k, v in sorted(result.stats.items())
+                                          if k.endswith("_seconds") and k not in _ESTIMATED_STATS},
+                           size=layout.get("size"), blocks=len(blocks))
+        lines = [page_record]
+        for index, block in enumerate(blocks):
+            lines.append(dict(common, block=index, engine=result.engine, **block))
+        data = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+        self._append(data, page_num, result.error, any(block.get("text") for block in blocks))
+
+
+def tesseract_blocks(data):
+    """
+    Tesseract 逐词数据 (image_to_data 的 DICT) -> (版面块列表, 重建的整页文本)。
+    每个 Tesseract 块 (level 2) 一个版面块；置信度为块内词置信度的平均值 (0~1)。
+    整页文本按 GetUTF8Text 的习惯重建：词之间空格，行之间换行，段落之间空行。
+    """
+    boxes = {}
+    words = {}  # 块号 -> {(段落号, 行号): [词]}
+    confidences = {}
+    for i, level in enumerate(data["level"]):
+        block_key = (data["page_num"][i], data["block_num"][i])
+        if level == 2:
+            left, top = data["left"][i], data["top"][i]
+            boxes[block_key] = [left, top, left + data["width"][i], top + data["height"][i]]
+        elif level == 5 and str(data["text"][i]).strip():
+            line_key = (data["par_num"][i], data["line_num"][i])
+            words.setdefault(block_key, {}).setdefault(line_key, []).append(str(data["text"][i]).strip())
+            if float(data["conf"][i]) >= 0:
+                confidences.setdefault(block_key, []).append(float(data["conf"][i]))
+    blocks = []
+    for block_key, lines in words.items():
+        paragraphs = {}
+        for (par_num, _), line_words in lines.items():
+            paragraphs.setdefault(par_num, []).append(" ".join(line_words))
+        confs = confidences.get(block_key)
+        blocks.append({"type": "text", "bbox": boxes.get(block_key),
+                       "text": "\n\n".join("\n".join(par_lines) for par_lines in paragraphs.values()),
+                       "confidence": round(sum(confs) / len(confs) / 100.0, 4) if confs else None})
+    return blocks, "\n\n".join(block["text"] for block in blocks)
+
+
+def ppstructure_block_content(res):
+    """
+    PP-Structure 块的 res -> (文本, 置信度 0~1 或 None, 表格 html 或 None)。
+    兼容 (text, score) 元组、纯字符串、逐行识别结果列表 ([{'text', 'confidence'}, ...]) 与表格字典 ({'html'})。
+    """
+    if isinstance(res, tuple) and len(res) > 0:
+        score = res[1] if len(res) > 1 and isinstance(res[1], (int, float)) else None
+        return str(res[0]), score, None
+    if isinstance(res, str):
+        return res, None, None
+    if isinstance(res, dict):
+        html = res.get("html")
+        if html:
+            return _html_to_text(html), None, html
+        return str(res.get("text", "")), res.get("confidence"), None
+    if isinstance(res, list):
+        lines = [item for item in res if isinstance(item, dict) and item.get("text")]
+        scores = [float(item["confidence"]) for item in lines if isinstance(item.get("confidence"), (int, float))]
+        return ("\n".join(str(item["text"]) for item in lines),
+                sum(scores) / len(scores) if scores else None, None)
+    return "", None, None
+
+
+def ppstructure_blocks(results):
+    """PP-Structure 整页结果 -> 版面块列表 (保留块类型、bbox、置信度与表格 html)"""
+    blocks = []
+    for item in results or []:
+        text, confidence, html = ppstructure_block_content(item.get("res", ""))
+        bbox = item.get("bbox")
+        block = {"type": str(item.get("type", "unknown")).lower(),
+                 "bbox": [int(v) for v in bbox] if bbox is not None else None,
+                 "text": text, "confidence": round(float(confidence), 4) if confidence is not None else None}
+        if html:
+            block["html"] = html
+        blocks.append(block)
+    return blocks
+
+
+def _html_to_text(html):
+    """表格 html -> 制表符分隔的纯文本 (用于全文检索)"""
+    rows = re.findall(r"<tr[^>]*>(.*?)</tr>", html, flags=re.S | re.I)
+    lines = []
+    for row in rows:
+        cells = re.findall(r"<t[dh][^>]*>(.*?)</t[dh]>", row, flags=re.S | re.I)
+        lines.append("\t".join(re.sub(r"<[^>]+>", "", cell).strip() for cell in cells))
+    return "\n".join(lines) if lines else re.sub(r"<[^>]+>", "", html).strip()
@@ -0,0 +1,123 @@
+# 文件路径：ocr_preprocess.py
+# -*- coding: utf-8 -*-
+"""
+ocr_preprocess.py — Tesseract 识别前的图像预处理 (灰度 -> CLAHE -> 降噪 -> 自适应二值化)
+OCRPreprocessor 每个工作进程一个：
+  - 各阶段的输出写入预先分配的缓冲区，页面尺寸不变时逐页复用，不再每个阶段分配新的整页数组；
+  - CLAHE 对象只创建一次；
+  - 先在页面中心区域估计噪声水平 (Immerkær 拉普拉斯算子 + 中位数，文字边缘影响很小) 和对比度：
+      * 噪声低且对比度高的干净页面跳过 CLAHE 与降噪；
+      * denoise_method="auto" 时按噪声水平选择降噪方法：噪声很低不降噪，中等用 3x3 中值滤波，
+        较高用双边滤波；只有显式指定 "nlmeans" 才使用 (很慢的) fastNlMeansDenoising。
+  - 每个阶段的耗时与跳过次数累加到 stats，随 PageResult.stats 汇总到运行结束的日志。
+返回的二值图像是内部缓冲区，在下一次 process 调用前有效。
+"""
+
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+DENOISE_METHODS = ("auto", "nlmeans", "median", "bilateral")
+NOISE_SAMPLE_SIZE = 1024  # 噪声/对比度估计只看页面中心这么大的区域
+CLEAN_NOISE_SIGMA = 2.0  # 低于此噪声水平 (灰度级标准差) 视为无需降噪
+MEDIAN_NOISE_SIGMA = 6.0  # 低于此值用中值滤波，否则用双边滤波
+CLEAN_CONTRAST = 160  # 1%~99% 分位灰度差不低于此值且噪声低时跳过 CLAHE
+
+# 3x3 拉普拉斯差分核：对平坦区域输出 0，对独立同分布噪声输出标准差为 6σ
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+
+def estimate_noise(gray, sample_size=NOISE_SAMPLE_SIZE):
+    """估计灰度图的噪声标准差 (灰度级) 与 1%~99% 分位对比度，只使用中心 sample_size 见方的区域"""
+    h, w = gray.shape
+    y0, x0 = max(0, (h - sample_size) // 2), max(0, (w - sample_size) // 2)
+    sample = gray[y0:y0 + sample_size, x0:x0 + sample_size]
+    response = cv2.filter2D(sample, cv2.CV_32F, _NOISE_KERNEL)[1:-1, 1:-1]
+    # 中位数对文字边缘的大响应不敏感；0.6745 为正态分布绝对值中位数与标准差之比
+    sigma = float(np.median(np.abs(response))) / (0.6745 * 6.0)
+    low, high = np.percentile(sample, (1, 99))
+    return sigma, float(high - low)
+
+
+class OCRPreprocessor:
+    """ 带缓冲区复用与阶段跳过的 OCR 预处理链 """
+
+    def __init__(self, perform_clahe=True, perform_denoise=False, denoise_method="auto"):
+        self.perform_clahe = perform_clahe
+        self.perform_denoise = perform_denoise
+        self.denoise_method = denoise_method if denoise_method in DENOISE_METHODS else "auto"
+        self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self._buffers = {}  # 名称 -> 复用的二维 uint8 数组
+
+    def _buffer(self, name, shape):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._buffers[name] = buf
+        return buf
+
+    def choose_denoise(self, sigma):
+        """按估计的噪声水平选择降噪方法；返回 None 表示跳过降噪"""
+        if not self.perform_denoise:
+            return None
+        if self.denoise_method != "auto":
+            return self.denoise_method
+        if sigma < CLEAN_NOISE_SIGMA:
+            return None
+        return "median" if sigma < MEDIAN_NOISE_SIGMA else "bilateral"
+
+    def _denoise(self, method, src, dst, sigma):
+        if method == "median":
+            return cv2.medianBlur(src, 3, dst=dst)
+        if method == "bilateral":
+            # 颜色域带宽随噪声增大，空间邻域固定为 5，保持笔画边缘
+            return cv2.bilateralFilter(src, 5, max(10.0, 3.0 * sigma), 5, dst=dst)
+        return cv2.fastNlMeansDenoising(src, dst, h=10, templateWindowSize=7, searchWindowSize=21)
+
+    def process(self, img_cv_bgr, stats=None, log=None):
+        """BGR 图像 -> 二值化灰度图 (内部缓冲区)。stats 为字典时累加各阶段耗时 (prep_*_seconds) 与跳过次数"""
+        stats = {} if stats is None else stats
+        shape = img_cv_bgr.shape[:2]
+
+        start = perf_counter()
+        gray = cv2.cvtColor(img_cv_bgr, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray", shape))
+        _add(stats, "prep_gray_seconds", perf_counter() - start)
+
+        start = perf_counter()
+        sigma, contrast = estimate_noise(gray)
+        clean = sigma < CLEAN_NOISE_SIGMA and contrast >= CLEAN_CONTRAST
+        denoise = self.choose_denoise(sigma)
+        _add(stats, "prep_analyze_seconds", perf_counter() - start)
+        if log:
+            log(f"        噪声估计 σ={sigma:.1f}, 对比度 {contrast:.0f}"
+                f"{', 干净页面' if clean else ''}, 降噪: {denoise or '跳过'}")
+
+        current = gray
+        if self.perform_clahe:
+            if clean:
+                _add(stats, "prep_clahe_skipped", 1)
+            else:
+                start = perf_counter()
+                current = self._clahe.apply(current, self._buffer("clahe", shape))
+                _add(stats, "prep_clahe_seconds", perf_counter() - start)
+
+        if self.perform_denoise:
+            if denoise is None:
+                _add(stats, "prep_denoise_skipped", 1)
+            else:
+                start = perf_counter()
+                current = self._denoise(denoise, current, self._buffer("denoise", shape), sigma)
+                _add(stats, "prep_denoise_seconds", perf_counter() - start)
+                _add(stats, f"prep_denoise_{denoise}", 1)
+
+        start = perf_counter()
+        binary = cv2.adaptiveThreshold(current, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 7,
+                                       dst=self._buffer("binary", shape))
+        _add(stats, "prep_binarize_seconds", perf_counter() - start)
+        _add(stats, "prep_pages", 1)
+        return binary
+
+
+def _add(stats, key, value):
+    stats[key] = stats.get(key, 0) + value
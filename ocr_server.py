@@ -0,0 +1,587 @@
+# 文件路径：ocr_server.py
+# -*- coding: utf-8 -*-
+"""
+ocr_server.py — 本机 OCR 模型服务 (可选)
+每个 ocr.py / ReadPdf.py / python -m ocr_engine 进程原本都要各自加载 PP-Structure (数秒、数百 MB)、
+CARN 和 Tesseract 语言模型。启动本服务后模型在服务进程中常驻，多个客户端共用：
+  - 服务端：python ocr_server.py [--port 8765] [--engines 2] [--preload pp-structure:ch tesseract:chi_sim+eng]
+    只监听 127.0.0.1 (HTTP + JSON)。按 "模型键" (引擎、语言、超分模型与分块参数、Tesseract 调用方式)
+    维护引擎池，每个键最多 --engines 个 OCREngine，并发请求各用一个；预处理开关等逐页参数随请求传入，
+    不需要重新加载模型。
+  - 客户端：OCRSettings(server_url=...) 时 create_page_runner 返回 RemotePageOCR。
+    服务在同一台机器上，页面以 PageTask (文件路径 + 页索引) 传递，由服务端渲染，避免传输整页图像。
+    服务未启动、加载失败或中途断开时自动改用进程内执行方式 (进程池/流水线/串行)，结果与本地处理相同。
+访问控制：服务只能监听本机回环地址 (--host 为其他地址时拒绝启动)。启动时生成随机令牌，写入缓存目录中
+只有当前用户可读的 ocr_server_{端口}.token；POST 请求必须在 X-OCR-Token 头中带上该令牌，
+因此只有同一用户的进程能让服务读取输入文件、写入页面图像 (这些进程本来就能访问同样的文件)。
+接口：
+  GET  /health  服务状态与已加载的模型键
+  POST /load    {"settings": {...}} 预热对应的引擎，返回实际引擎与超分是否可用
+  POST /page    {"settings": {...}, "task": {...}, "run": 运行 ID} 处理一个页面，返回 PageResult 的各字段
+  POST /finish  {"run": 运行 ID} 客户端一次运行结束：等待该运行排队保存的页面图像写完，返回图像保存统计
+服务端为每个客户端运行单独创建图像写入器 (按该运行的格式、PNG 压缩级别与线程数)，复用的引擎不会用上一个
+客户端的保存参数写图像；/finish 返回后客户端才报告完成，图像统计也记入客户端的日志。
+"""
+
+import os
+import sys
+import json
+import argparse
+import hmac
+import itertools
+import secrets
+import uuid
+import ipaddress
+import threading
+import traceback
+import logging
+import urllib.request
+import urllib.error
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from time import perf_counter
+
+import numpy as np
+
+from ocr_engine import (OCRSettings, OCREngine, PageTask, PageResult, probe_dependencies, create_local_page_runner,
+                        local_execution_mode, _default_log)
+from engine_router import PageSample
+from ocr_preprocess import OCRPreprocessor
+from page_images import AsyncImageWriter, log_image_stats
+from ocr_cache import default_cache_dir
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_SERVER_URL = os.getenv("OCR_SERVER_URL") or f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+# 2: 页面任务带 route (自动选择引擎)，结果带采样页 sample；3: 请求带运行 ID，/finish；4: POST 请求需要令牌
+PROTOCOL_VERSION = 4
+CONNECT_TIMEOUT = 1.0  # 探测服务是否存在的超时 (秒)
+LOAD_TIMEOUT = 300  # 首次加载模型可能较慢
+PAGE_TIMEOUT = 600
+TOKEN_HEADER = "X-OCR-Token"
+
+# 决定需要加载哪些模型的参数；其余参数 (预处理、OSD、DPI 等) 逐页随请求生效
+MODEL_KEY_FIELDS = ("engine", "language", "tesseract_backend", "use_super_res", "carn_model_path", "carn_variant",
+                    "sr_tile_size", "sr_tile_overlap", "sr_text_only", "sr_batch_size", "sr_threads",
+                    "sr_channels_last")
+
+
+class OCRServerError(Exception):
+    """ 服务端返回了错误 (服务可达，但请求处理失败) """
+
+
+def model_key(settings):
+    return tuple(getattr(settings, name) for name in MODEL_KEY_FIELDS)
+
+
+def _json_default(value):
+    """numpy 标量/数组等转换为 JSON 基本类型 (版面块的 bbox、置信度可能是 numpy 类型)"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+def result_to_dict(result):
+    return {"text": result.text, "elapsed": result.elapsed, "error": result.error, "cancelled": result.cancelled,
+            "engine": result.engine, "source": result.source, "stats": result.stats, "layout": result.layout,
+            "sample": result.sample.to_dict() if result.sample is not None else None}
+
+
+def result_from_dict(task, values):
+    sample = values.get("sample")
+    return PageResult(task, values.get("text", ""), values.get("elapsed", 0.0), error=values.get("error"),
+                      cancelled=values.get("cancelled", False), engine=values.get("engine"),
+                      source=values.get("source", "ocr"), stats=values.get("stats"), layout=values.get("layout"),
+                      sample=PageSample.from_dict(sample) if sample else None)
+
+
+# --- 服务端 ---
+class EnginePool:
+    """
+    按模型键复用 OCREngine：每个键最多 max_engines 个引擎，空闲的放回池中供后续请求使用。
+    OCREngine 不是线程安全的，一个引擎同一时间只处理一个请求。
+    """
+
+    def __init__(self, max_engines=2, log=None):
+        self.max_engines = max(1, max_engines)
+        self.log_message = log or _default_log
+        self._cond = threading.Condition()
+        self._idle = {}  # 模型键 -> [OCREngine]
+        self._count = {}  # 模型键 -> 已创建的引擎数
+        self._failed = {}  # 模型键 -> 加载失败说明 (不反复重试)
+
+    def acquire(self, settings):
+        key = model_key(settings)
+        with self._cond:
+            while True:
+                if key in self._failed:
+                    raise OCRServerError(self._failed[key])
+                if self._idle.get(key):
+                    engine = self._idle[key].pop()
+                    break
+                if self._count.get(key, 0) < self.max_engines:
+                    self._count[key] = self._count.get(key, 0) + 1
+                    engine = None
+                    break
+                self._cond.wait()
+        if engine is None:
+            engine = self._create(key, settings)
+        self._apply_settings(engine, settings)
+        return engine
+
+    def release(self, settings, engine):
+        with self._cond:
+            self._idle.setdefault(model_key(settings), []).append(engine)
+            self._cond.notify()
+
+    def _create(self, key, settings):
+        start = perf_counter()
+        engine = OCREngine(settings, self.log_message)
+        if engine.load_models():
+            self.log_message(f"已加载引擎 {settings.engine} ({settings.language}"
+                             f"{', 超分' if engine.carn_ready else ''})，耗时 {perf_counter() - start:.1f} 秒。")
+            return engine
+        engine.shutdown()
+        with self._cond:
+            self._count[key] -= 1
+            self._failed[key] = f"{settings.engine} 引擎加载失败"
+            self._cond.notify_all()
+        raise OCRServerError(self._failed[key])
+
+    @staticmethod
+    def _apply_settings(engine, settings):
+        """把本次请求的逐页参数交给复用的引擎；预处理参数变化时重建预处理链"""
+        previous = engine.settings
+        engine.settings = settings
+        if (previous.perform_clahe, previous.perform_denoise, previous.denoise_method) != \
+                (settings.perform_clahe, settings.perform_denoise, settings.denoise_method):
+            engine.preprocessor = OCRPreprocessor(settings.perform_clahe, settings.perform_denoise,
+                                                  settings.denoise_method)
+
+    def describe(self):
+        with self._cond:
+            return [{"engine": key[0], "language": key[1], "super_res": key[3], "engines": self._count[key],
+                     "idle": len(self._idle.get(key, []))} for key in self._count if self._count[key]]
+
+    def close_idle_documents(self):
+        """关闭空闲引擎打开的 PDF"""
+        with self._cond:
+            for engines in self._idle.values():
+                for engine in engines:
+                    engine.close()
+
+    def shutdown(self):
+        with self._cond:
+            for engines in self._idle.values():
+                for engine in engines:
+                    engine.shutdown()
+            self._idle.clear()
+
+
+def is_loopback_host(host):
+    """监听地址是否为本机回环地址 (localhost 或 127.0.0.0/8)"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.IPv4Address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def token_path(port):
+    """服务令牌文件：缓存目录中的 ocr_server_{端口}.token"""
+    return os.path.join(default_cache_dir(), f"ocr_server_{port}.token")
+
+
+def write_token(port):
+    """生成随机令牌并写入只有当前用户可读写的令牌文件，返回令牌"""
+    token = secrets.token_urlsafe(32)
+    path = token_path(port)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        os.chmod(path, 0o600)  # 文件已存在时 os.open 不会修改权限
+        f.write(token)
+    return token
+
+
+def read_token(port):
+    """读取服务令牌；令牌文件不存在或无法读取时返回 None"""
+    try:
+        with open(token_path(port), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+class OCRRequestHandler(BaseHTTPRequestHandler):
+    """ /health、/load、/page、/finish 四个接口，请求和响应都是 JSON；POST 请求需要令牌 """
+
+    server_version = "OCRModelServer/1"
+
+    def log_message(self, format, *args):  # 访问日志只在 DEBUG 级别输出
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status, obj):
+        body = _dumps(obj)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send(404, {"error": f"未知路径: {self.path}"})
+            return
+        self._send(200, {"status": "ok", "protocol": PROTOCOL_VERSION, "pid": os.getpid(),
+                         "pages": self.server.pages_served, "models": self.server.pool.describe()})
+
+    def do_POST(self):
+        if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), self.server.token):
+            self._send(403, {"error": f"令牌错误，客户端需与服务以同一用户运行 (令牌文件 {token_path(self.server.port)})"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            settings = OCRSettings.from_dict(request.get("settings", {}))
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": f"请求格式错误: {e}"})
+            return
+        if self.path == "/finish":  # 不需要引擎；客户端运行结束后关闭空闲引擎打开的 PDF，不长期占用文件
+            image_stats = self.server.finish_run(request.get("run"))
+            self.server.pool.close_idle_documents()
+            self._send(200, {"image_stats": image_stats})
+            return
+        pool = self.server.pool
+        try:
+            engine = pool.acquire(settings)
+        except OCRServerError as e:
+            self._send(503, {"error": str(e)})
+            return
+        try:
+            if self.path == "/load":
+                self._send(200, {"engine_choice": engine.engine_choice, "carn_ready": engine.carn_ready})
+            elif self.path == "/page":
+                task = PageTask(**request["task"])
+                writer = self.server.run_writer(request.get("run"), settings) if task.image_save_path else None
+                previous = engine.swap_image_writer(writer)
+                try:
+                    result = engine.run_task(task)
+                finally:
+                    engine.swap_image_writer(previous)
+                self.server.count_page()
+                self._send(200, result_to_dict(result))
+            else:
+                self._send(404, {"error": f"未知路径: {self.path}"})
+        except Exception as e:
+            logging.error(f"处理请求 {self.path} 失败: {e}\n{traceback.format_exc()}")
+            self._send(500, {"error": str(e)})
+        finally:  # 引擎 (模型与最近打开的 PDF) 保留在池中，同一文件的后续页面不再重新打开
+            pool.release(settings, engine)
+
+
+class OCRModelServer(ThreadingHTTPServer):
+    """ 常驻模型的本机 OCR 服务 (每个请求一个线程) """
+
+    daemon_threads = True
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, max_engines=2, log=None):
+        if not is_loopback_host(host):
+            raise ValueError(f"OCR 服务只能监听本机回环地址 (127.0.0.1 / localhost)，不能使用 {host}")
+        super().__init__((host, port), OCRRequestHandler)
+        self.port = self.server_address[1]
+        self.token = write_token(self.port)
+        self.pool = EnginePool(max_engines, log)
+        self.pages_served = 0
+        self._pages_lock = threading.Lock()  # 请求线程并发累加 pages_served
+        self._run_writers = {}  # 客户端运行 ID -> AsyncImageWriter
+        self._writers_lock = threading.Lock()
+
+    def count_page(self):
+        with self._pages_lock:
+            self.pages_served += 1
+
+    def run_writer(self, run_id, settings):
+        """客户端一次运行的图像写入器 (第一次保存图像时按该运行的保存参数创建)；没有运行 ID 时返回 None"""
+        if not run_id:
+            return None
+        with self._writers_lock:
+            writer = self._run_writers.get(run_id)
+            if writer is None:
+                writer = self._run_writers[run_id] = AsyncImageWriter(
+                    settings.image_format, settings.png_level, settings.image_threads, log=self.pool.log_message)
+            return writer
+
+    def finish_run(self, run_id):
+        """等待该运行排队的图像写完，返回 AsyncImageWriter.summary()；没有保存过图像时返回 None"""
+        with self._writers_lock:
+            writer = self._run_writers.pop(run_id, None)
+        if writer is None:
+            return None
+        writer.close()
+        return writer.summary()
+
+    def preload(self, engine, language):
+        """启动时预热一种引擎/语言 (使用 OCRSettings 的默认超分与 Tesseract 参数)"""
+        settings = OCRSettings(engine=engine, language=language)
+        try:
+            self.pool.release(settings, self.pool.acquire(settings))
+        except OCRServerError as e:
+            logging.error(f"预加载 {engine} ({language}) 失败: {e}")
+
+    def server_close(self):
+        super().server_close()
+        with self._writers_lock:  # 没有调用 /finish 就退出的客户端
+            writers, self._run_writers = list(self._run_writers.values()), {}
+        for writer in writers:
+            writer.close()
+        self.pool.shutdown()
+        if read_token(self.port) == self.token:  # 同一端口上已有新的服务时不删除它的令牌
+            try:
+                os.remove(token_path(self.port))
+            except OSError:
+                pass
+
+
+# --- 客户端 ---
+class OCRServerClient:
+    """ 访问本机 OCR 服务的简单 HTTP 客户端 (标准库 urllib) """
+
+    def __init__(self, url=DEFAULT_SERVER_URL):
+        self.url = url.rstrip("/")
+        self.token = read_token(urllib.parse.urlsplit(self.url).port or DEFAULT_PORT)
+
+    def _request(self, path, payload=None, timeout=PAGE_TIMEOUT):
+        data = None if payload is None else _dumps(payload)
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        request = urllib.request.Request(self.url + path, data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:  # 服务可达但返回错误
+            try:
+                message = json.loads(e.read().decode("utf-8")).get("error", str(e))
+            except ValueError:
+                message = str(e)
+            raise OCRServerError(message) from None
+
+    def health(self):
+        return self._request("/health", timeout=CONNECT_TIMEOUT)
+
+    def load(self, settings):
+        return self._request("/load", {"settings": settings.to_dict()}, timeout=LOAD_TIMEOUT)
+
+    def run_page(self, settings, task, run_id=None):
+        values = self._request("/page", {"settings": settings.to_dict(), "task": vars(task), "run": run_id})
+        return result_from_dict(task, values)
+
+    def finish(self, run_id):
+        """结束一次运行：等待服务端写完该运行的图像，返回图像保存统计 (没有保存图像时为 None)"""
+        return self._request("/finish", {"run": run_id})["image_stats"]
+
+
+def server_gone(error):
+    """请求失败是否说明服务已退出：连接被拒绝、重置或中断 (超时等其他 OSError 只影响当前页面)"""
+    reason = getattr(error, "reason", error)  # urllib.error.URLError 包装的底层错误
+    return isinstance(reason, ConnectionError)
+
+
+class RemotePageOCR:
+    """
+    把页面任务交给本机 OCR 服务处理 (接口与 SerialPageOCR 相同)：
+    - 同时在途的请求数为 settings.workers (服务端每个模型键最多 --engines 个引擎并行)；
+    - 结果按提交顺序产出；
+    - 服务不可达或加载失败时，剩余页面改用 create_local_page_runner 的进程内执行方式
+      (workers > 1 时为进程池，与不使用服务时相同，不会退回单核串行)；
+      只有连接被拒绝/重置才认为服务已退出，单页请求超时记为该页处理错误。
+    """
+
+    def __init__(self, settings, client, log=None, should_stop=None):
+        self.settings = settings
+        self.client = client
+        self.log_message = log or _default_log
+        self.should_stop = should_stop or (lambda: False)
+        self.concurrency = settings.workers
+        self.engine_choice = settings.engine
+        self.carn_ready = False
+        self.run_id = uuid.uuid4().hex  # 服务端按运行 ID 保存本次运行的页面图像
+        self._served = False  # 是否有页面由服务处理 (结束时需要 /finish)
+        self._local = None  # 回退用的进程内执行方式
+        self._local_ready = False
+        self._executor = None
+
+    @property
+    def execution_mode(self):
+        if self._local is not None:
+            return f"{local_execution_mode(self.settings)} (OCR 服务不可用，进程内执行)"
+        return f"OCR 服务 {self.client.url} (并发请求 x{self.concurrency})"
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ocr-client")
+        start = perf_counter()
+        try:
+            info = self.client.load(self.settings)
+        except (OSError, OCRServerError) as e:
+            return self._use_local(e)
+        self.engine_choice = info["engine_choice"]
+        self.carn_ready = info["carn_ready"]
+        self.log_message(f"使用 OCR 服务 {self.client.url}：引擎 {self.engine_choice}"
+                         f"{' + 超分' if self.carn_ready else ''} 已就绪 ({perf_counter() - start:.2f} 秒)。")
+        return True
+
+    def _use_local(self, error):
+        """改用进程内执行方式；返回是否启动成功 (只在产出结果的线程中调用)"""
+        if self._local is None:
+            self.log_message(f"OCR 服务不可用 ({error})，改用进程内执行方式: {local_execution_mode(self.settings)}。",
+                             logging.WARNING)
+            self._local = create_local_page_runner(self.settings, self.log_message, self.should_stop)
+            self._local_ready = self._local.start()
+            self.engine_choice = self._local.engine_choice
+            self.carn_ready = getattr(self._local, "carn_ready", self.settings.use_super_res)
+        return self._local_ready
+
+    def _run_task(self, task):
+        """发送一个页面请求；服务端处理出错时返回错误结果，连接失败 (OSError) 时抛出，由 map_pages 切换"""
+        self._served = True
+        try:
+            return self.client.run_page(self.settings, task, self.run_id)
+        except OSError as e:
+            if server_gone(e):  # 交给 map_pages 切换到进程内执行方式
+                raise
+            error = e  # 超时等：只有这一页失败 (服务仍在处理其他页面)
+        except OCRServerError as e:
+            error = e
+        self.log_message(f"    OCR 服务处理 {task.description} 失败: {error}", logging.ERROR)
+        return PageResult(task, f"\n--- {task.description} (处理错误: {error}) ---\n", error=str(error))
+
+    def _map_local(self, tasks):
+        if self._local_ready:
+            yield from self._local.map_pages(tasks)
+            return
+        for task in tasks:
+            yield PageResult(task, f"\n--- {task.description} (无可用 OCR 引擎) ---\n", error="无可用 OCR 引擎")
+
+    def map_pages(self, tasks):
+        """并发发送请求，按提交顺序产出 PageResult；服务中途退出时未完成的页面交给进程内执行方式"""
+        if self._local is not None:
+            yield from self._map_local(tasks)
+            return
+        task_iter = iter(tasks)
+        pending = deque()  # (PageTask, Future)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < 2 * self.concurrency and not self.should_stop():
+                    task = next(task_iter, None)
+                    if task is None:
+                        exhausted = True
+                        break
+                    pending.append((task, self._executor.submit(self._run_task, task)))
+                if not pending or self.should_stop():
+                    return
+                task, future = pending[0]
+                try:
+                    result = future.result()
+                except OSError as e:  # 服务中途退出 (见 server_gone)：从这一页起 (含已发送的请求) 在进程内重新处理
+                    self._use_local(e)
+                    retry = [t for t, _ in pending]
+                    for _, f in pending:
+                        f.cancel()
+                    pending.clear()
+                    yield from self._map_local(itertools.chain(retry, task_iter))
+                    return
+                pending.popleft()
+                yield result
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._served and self._local is None:  # 等待服务端写完本次运行的图像，统计记入本地日志
+            try:
+                image_stats = self.client.finish(self.run_id)
+            except (OSError, OCRServerError) as e:
+                self.log_message(f"无法取得 OCR 服务的图像保存统计: {e}", logging.WARNING)
+            else:
+                log_image_stats([image_stats] if image_stats else [], self.log_message, "OCR 服务")
+            self._served = False
+        if self._local is not None:
+            self._local.close()
+
+
+def connect_page_runner(settings, log=None, should_stop=None):
+    """服务可达时返回 RemotePageOCR，否则返回 None (调用方使用进程内执行方式)"""
+    log = log or _default_log
+    client = OCRServerClient(settings.server_url)
+    try:
+        info = client.health()
+    except (OSError, OCRServerError, ValueError) as e:
+        log(f"未连接到 OCR 服务 {client.url} ({e})，使用进程内执行方式: {local_execution_mode(settings)}。",
+            logging.WARNING)
+        return None
+    if info.get("protocol") != PROTOCOL_VERSION:
+        log(f"OCR 服务协议版本不匹配 ({info.get('protocol')} != {PROTOCOL_VERSION})，"
+            f"使用进程内执行方式: {local_execution_mode(settings)}。",
+            logging.WARNING)
+        return None
+    if client.token is None:
+        log(f"找不到 OCR 服务令牌 {token_path(urllib.parse.urlsplit(client.url).port or DEFAULT_PORT)} "
+            f"(服务需与客户端以同一用户运行)，使用进程内执行方式: {local_execution_mode(settings)}。", logging.WARNING)
+        return None
+    return RemotePageOCR(settings, client, log, should_stop)
+
+
+# --- 命令行入口 ---
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python ocr_server.py",
+                                     description="本机 OCR 模型服务：模型常驻，供多个 OCR 客户端共用")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help=f"监听地址 (默认 {DEFAULT_HOST}；只能是本机回环地址，服务会读写请求中的本机文件路径)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"监听端口 (默认 {DEFAULT_PORT})")
+    parser.add_argument("--engines", type=int, default=2,
+                        help="每种引擎/语言配置最多同时加载的引擎数 (默认 2，即最多 2 个页面并行)")
+    parser.add_argument("--preload", nargs="*", default=[], metavar="ENGINE:LANG",
+                        help="启动时预加载，例如 pp-structure:ch tesseract:chi_sim+eng")
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if not is_loopback_host(args.host):
+        parser.error(f"--host 只能是本机回环地址 (127.0.0.1 / localhost)，不能使用 {args.host}")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+    probe_dependencies()
+    server = OCRModelServer(args.host, args.port, args.engines)
+    for item in args.preload:
+        engine, _, language = item.partition(":")
+        engine = "PP-Structure" if engine.lower() == "pp-structure" else "Tesseract"
+        server.preload(engine, language or ("ch" if engine == "PP-Structure" else "chi_sim+eng"))
+    logging.info(f"OCR 服务已启动: http://{args.host}:{server.server_address[1]} (Ctrl+C 退出)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("OCR 服务已停止。")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
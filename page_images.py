@@ -0,0 +1,176 @@
+# 文件路径：page_images.py
+# -*- coding: utf-8 -*-
+"""
+page_images.py — 页面图像的后台保存与复用
+勾选“保存提取/输入的图像”时，原来每页在识别线程中同步 cv2.imwrite 为 PNG，
+300 DPI 的页面 zlib 压缩需要数百毫秒，几乎使每页耗时翻倍。
+AsyncImageWriter 把编码与写盘放到独立的线程池 (cv2 编码时释放 GIL)：
+  - 格式："png" (可选压缩级别 0~9，默认 1 最快)、"webp" (无损)、"npy" (未压缩的原始数组，
+    可以用 np.load(mmap_mode=...) 直接内存映射，供下游程序或下次运行复用)；
+  - 先写入临时文件再改名，进程中断时不会留下不完整的图像；
+  - 等待写入的图像数有上限 (max_pending)，写盘跟不上时识别线程才会等待，内存占用有界。
+npy 格式的 PDF 页面文件名包含渲染 DPI (page_3@300dpi.npy)，load_raw_page 在文件比输入 PDF 新时
+内存映射返回，下次以相同 DPI 处理同一文件时跳过渲染。
+"""
+
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+# 保存格式 -> 文件扩展名
+IMAGE_FORMATS = {"png": ".png", "webp": ".webp", "npy": ".npy"}
+DEFAULT_PNG_LEVEL = 1
+MAX_REPORTED_FAILURES = 10  # 每个写入器保留的失败记录数 (进程池汇总到主进程日志)
+WEBP_LOSSLESS_QUALITY = 101  # OpenCV 中 WebP 质量大于 100 表示无损
+
+
+def image_path(path, image_format):
+    """把保存路径的扩展名换成格式对应的扩展名"""
+    return os.path.splitext(path)[0] + IMAGE_FORMATS[image_format]
+
+
+def raw_page_path(path, dpi=None):
+    """npy 格式的页面路径；PDF 页面 (dpi 不为 None) 的文件名包含渲染 DPI"""
+    stem = os.path.splitext(path)[0]
+    return f"{stem}@{dpi}dpi.npy" if dpi else f"{stem}.npy"
+
+
+def load_raw_page(path, source_path):
+    """
+    内存映射之前保存的原始页面 (copy-on-write，修改不会写回文件)。
+    文件不存在、比输入文件旧 (输入已更新) 或无法读取时返回 None。
+    """
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(source_path):
+            return None
+        image = np.load(path, mmap_mode="c")
+    except (OSError, ValueError):
+        return None
+    if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3:
+        return None
+    return image
+
+
+def encode_image(path, image, image_format, png_level=DEFAULT_PNG_LEVEL):
+    """按格式把图像写入 path (先写临时文件再改名)；失败时抛出异常"""
+    tmp_path = f"{path}.tmp{os.getpid()}_{threading.get_ident()}{IMAGE_FORMATS[image_format]}"
+    try:
+        if image_format == "npy":
+            with open(tmp_path, "wb") as f:
+                np.save(f, image)
+        else:
+            params = ([cv2.IMWRITE_PNG_COMPRESSION, int(png_level)] if image_format == "png"
+                      else [cv2.IMWRITE_WEBP_QUALITY, WEBP_LOSSLESS_QUALITY])
+            if not cv2.imwrite(tmp_path, image, params):
+                raise IOError(f"cv2.imwrite 无法写入 {tmp_path}")
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class AsyncImageWriter:
+    """ 在后台线程中编码并保存页面图像 (线程安全，可在多个线程中 submit) """
+
+    def __init__(self, image_format="png", png_level=DEFAULT_PNG_LEVEL, threads=1, max_pending=None, log=None):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"未知的图像保存格式: {image_format}")
+        self.image_format = image_format
+        self.png_level = min(9, max(0, int(png_level)))
+        self.threads = max(1, int(threads))
+        self.log_message = log or (lambda m, level=logging.INFO: logging.log(level, m))
+        self._slots = threading.BoundedSemaphore(max_pending or self.threads * 2)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.saved = 0
+        self.failed = 0
+        self.encode_seconds = 0.0  # 后台编码与写盘的累计耗时
+        self.failures = []  # 最近的失败 [(路径, 错误)]，最多 MAX_REPORTED_FAILURES 条
+
+    def matches(self, image_format, png_level, threads):
+        """写入器是否按这些参数编码 (复用的引擎换了保存参数时需要换一个写入器)"""
+        return (self.image_format, self.png_level, self.threads) == \
+            (image_format, min(9, max(0, int(png_level))), max(1, int(threads)))
+
+    def submit(self, path, image):
+        """
+        排队保存 image (调用方之后仍会修改/复用的缓冲区应先复制)。
+        返回等待空闲位置的秒数 (写盘跟不上时识别线程被阻塞的时间)。
+        """
+        start = perf_counter()
+        self._slots.acquire()
+        waited = perf_counter() - start
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="image-writer")
+        try:
+            self._executor.submit(self._write, path, image)
+        except RuntimeError:  # 已关闭
+            self._slots.release()
+            raise
+        return waited
+
+    def _write(self, path, image):
+        start = perf_counter()
+        try:
+            encode_image(path, image, self.image_format, self.png_level)
+            error = None
+        except Exception as e:
+            error = str(e)
+            self.log_message(f"    保存图像失败 {path}: {e}", logging.WARNING)
+        finally:
+            self._slots.release()
+        with self._lock:
+            self.encode_seconds += perf_counter() - start
+            if error is None:
+                self.saved += 1
+            else:
+                self.failed += 1
+                if len(self.failures) < MAX_REPORTED_FAILURES:
+                    self.failures.append((path, error))
+
+    @property
+    def stats_message(self):
+        failed = f"，失败 {self.failed} 张" if self.failed else ""
+        return (f"图像保存 ({self.image_format}): 后台写入 {self.saved} 张{failed}，"
+                f"编码与写盘共 {self.encode_seconds:.2f} 秒 ({self.threads} 个线程)")
+
+    def summary(self):
+        """统计的普通字典 (进程池工作进程退出时发回主进程，见 ocr_engine._pool_worker_exit)"""
+        with self._lock:
+            return {"image_format": self.image_format, "saved": self.saved, "failed": self.failed,
+                    "encode_seconds": self.encode_seconds, "failures": list(self.failures)}
+
+    def close(self):
+        """等待排队的图像全部写完"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def log_image_stats(reports, log, source):
+    """
+    汇总几个写入器的 summary() 并写入日志 (进程池各工作进程、OCR 服务的写入器在别的进程中，统计由调用方取回)；
+    失败的路径逐条记录。
+    """
+    if not reports:
+        return
+    saved = sum(r["saved"] for r in reports)
+    failed = sum(r["failed"] for r in reports)
+    seconds = sum(r["encode_seconds"] for r in reports)
+    log(f"图像保存 ({reports[0]['image_format']}): {source}后台写入 {saved} 张"
+        f"{f'，失败 {failed} 张' if failed else ''}，编码与写盘共 {seconds:.2f} 秒")
+    failures = [failure for r in reports for failure in r["failures"]]
+    for path, error in failures:
+        log(f"    保存图像失败 {path}: {error}", logging.WARNING)
+    if failed > len(failures):
+        log(f"    (其余 {failed - len(failures)} 张失败未逐条列出)", logging.WARNING)
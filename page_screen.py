@@ -0,0 +1,261 @@
+# 文件路径：page_screen.py
+# -*- coding: utf-8 -*-
+"""
+page_screen.py — OCR 前的页面预筛 (空白页与重复页)
+扫描批次中常有空白分隔页和重复的封面/表头页，原来每页都要完整渲染并识别。
+PageScreener 以低分辨率 (SCREEN_DPI，A4 约 400x560 像素) 渲染每个待识别页面的灰度图：
+  - 墨迹覆盖率：比页面背景 (中位灰度) 暗 INK_CONTRAST 以上的像素比例，不计页边 (扫描边缘的阴影)；
+    低于 blank_ink_ratio 视为空白页，直接跳过 OCR。
+  - 感知哈希 (pHash)：32x32 缩略图 DCT 低频 8x8 系数与中位数比较，得到 64 位哈希。
+    与之前页面的哈希汉明距离不超过 HASH_MAX_DISTANCE、墨迹量相近时只是候选：
+    pHash 和低分辨率下的墨迹只反映版式，只差几个数字的表单/发票也会相同。
+  - 候选页再以 VERIFY_DPI 渲染两页，相位相关求亚像素位移并对齐 (容忍整页的位置偏差)，
+    比较墨迹掩码：一方有墨迹、另一方 4 邻域 1 像素内没有墨迹的像素为差异像素。不做开运算：
+    11pt 的 "6" 改成 "8" 在 150 DPI 下只差 3 个像素。差异像素落在任何一个文字行的外接矩形内就不算重复页；
+    文字行之外 (污点、扫描噪声) 只有一团不小于 DIFF_MIN_AREA 像素的差异才算不同。
+    重新扫描/重采样的页面边缘抖动与改动的笔画无法区分，通常不会判为重复页。
+  同一模板的批次中每页都是候选。之前的页面按 pHash 分组，pHash 再按 HASH_BANDS 段 16 位建索引：
+  汉明距离不超过 HASH_MAX_DISTANCE 的两个哈希至少有一段相差不超过 BAND_RADIUS 位，只需查这些段值的
+  近邻桶 (每桶最近 MAX_HASHES_PER_BUCKET 个哈希)，不用遍历所有见过的哈希。候选页总共只看最近
+  MAX_SCAN_PER_PAGE 页，按缩略图 (THUMB_SIZE) 的 L1 距离排序后最多复核 MAX_VERIFY_CANDIDATES 个；低分辨率灰度图完全相同的页面
+  另有索引，不受这个上限影响。已记录页面的复核图像缓存最近 VERIFY_CACHE_PAGES 页，
+  PDF 文档保持打开最近 MAX_OPEN_DOCS 个，预筛耗时与页数成线性关系。
+  重复页复用同一批次中较早页面的识别结果；判定偏保守，拿不准的页面照常识别。
+"""
+
+import os
+import hashlib
+import itertools
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+import cv2
+import numpy as np
+
+SCREEN_DPI = 48
+SCREEN_LONG_SIDE = 560  # 图像文件缩放到与 A4@48dpi 相当的尺寸，便于与 PDF 页面比较
+VERIFY_DPI = 150
+VERIFY_LONG_SIDE = 1750  # 图像文件复核时缩放到与 A4@150dpi 相当的尺寸
+INK_CONTRAST = 60  # 比背景暗多少灰度级算作墨迹
+MARGIN_RATIO = 0.04  # 计算覆盖率时忽略的页边比例
+BLANK_INK_RATIO = 0.0005  # 墨迹覆盖率低于此值视为空白页 (A4@48dpi 约 100 个像素)
+HASH_MAX_DISTANCE = 8  # pHash 汉明距离不超过此值、
+INK_MAX_DIFFERENCE = 0.25  # 且墨迹像素数相差不超过此比例的页面才复核
+DIFF_MIN_AREA = 6  # 文字行之外一团差异像素达到此面积即判为不同
+LINE_MIN_HEIGHT = 8  # 高度不小于此值 (150 DPI 下约 4pt 字高) 的墨迹团 (横向连接后) 视为文字行
+THUMB_SIZE = (96, 136)  # 候选排序用的缩略图尺寸 (宽, 高)
+HASH_BANDS = 4  # 64 位 pHash 分成 4 段 16 位建索引
+BAND_BITS = 64 // HASH_BANDS
+BAND_RADIUS = HASH_MAX_DISTANCE // HASH_BANDS  # 鸽巢原理：距离 <= 8 时至少一段相差 <= 2 位
+MAX_HASHES_PER_BUCKET = 64  # 每个段值桶最多查看最近的多少个不同哈希
+MAX_SCAN_PER_PAGE = 256  # 每页最多与之前的多少页比较缩略图
+MAX_VERIFY_CANDIDATES = 2  # 每页最多复核的候选页数
+VERIFY_CACHE_PAGES = 8  # 缓存复核图像的页数 (A4@150dpi 每页约 2 MB)
+MAX_OPEN_DOCS = 4  # 同时保持打开的 PDF 文档数
+_KERNEL_CROSS = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+_KERNEL_LINE = np.ones((3, 15), np.uint8)  # 把同一行相邻的字符连成一团
+# 16 位段值中不超过 BAND_RADIUS 位的翻转掩码 (1 + 16 + 120 个)
+_BAND_FLIPS = [sum(1 << bit for bit in bits) for radius in range(BAND_RADIUS + 1)
+               for bits in itertools.combinations(range(BAND_BITS), radius)]
+
+
+class PageSignature:
+    """ 一个页面的预筛特征：墨迹覆盖率、pHash、墨迹像素数、低分辨率图像尺寸、缩略图与内容摘要 """
+
+    def __init__(self, coverage, phash, ink_pixels, shape, thumb=None, digest=None):
+        self.coverage = coverage
+        self.phash = phash
+        self.ink_pixels = ink_pixels
+        self.shape = shape
+        self.thumb = thumb
+        self.digest = digest  # 低分辨率灰度图的摘要 (完全相同的页面相同)
+
+
+def perceptual_hash(gray):
+    """64 位 pHash：32x32 缩略图的 DCT 低频 8x8 系数 (去掉直流分量) 与其中位数比较"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()[1:]
+    bits = low > np.median(low)
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def ink_mask(gray):
+    """比页面背景 (中位灰度) 暗 INK_CONTRAST 以上的像素"""
+    return (gray < float(np.median(gray)) - INK_CONTRAST).astype(np.uint8)
+
+
+def page_signature(gray):
+    """由低分辨率灰度图计算 PageSignature"""
+    mask = ink_mask(gray)
+    h, w = mask.shape
+    my, mx = int(h * MARGIN_RATIO), int(w * MARGIN_RATIO)
+    inner = mask[my:h - my, mx:w - mx]
+    coverage = float(np.count_nonzero(inner)) / max(1, inner.size)
+    thumb = cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    digest = hashlib.blake2b(np.ascontiguousarray(gray).tobytes(), digest_size=16).digest()
+    return PageSignature(coverage, perceptual_hash(gray), int(np.count_nonzero(mask)), mask.shape, thumb, digest)
+
+
+def is_candidate(a, b):
+    """两页是否可能相同 (版式与墨迹量相近)，需要 same_content 复核"""
+    if a.shape != b.shape or bin(a.phash ^ b.phash).count("1") > HASH_MAX_DISTANCE:
+        return False
+    if not a.ink_pixels or not b.ink_pixels:
+        return False
+    return abs(a.ink_pixels - b.ink_pixels) <= INK_MAX_DIFFERENCE * max(a.ink_pixels, b.ink_pixels)
+
+
+def text_line_mask(mask):
+    """墨迹横向连接成行后，高度不小于 LINE_MIN_HEIGHT 的墨迹团的外接矩形"""
+    joined = cv2.dilate(mask, _KERNEL_LINE)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+    lines = np.zeros_like(mask)
+    for x, y, w, h, _ in stats[1:count]:
+        if h >= LINE_MIN_HEIGHT:
+            lines[y:y + h, x:x + w] = 1
+    return lines
+
+
+def same_content(gray_a, gray_b):
+    """
+    复核两页 (VERIFY_DPI 灰度图) 内容是否相同：相位相关对齐后比较墨迹掩码，只容忍 4 邻域 1 像素的边缘差异。
+    文字行内有任何差异像素，或文字行之外有不小于 DIFF_MIN_AREA 的差异团时不相同。
+    """
+    if gray_a.shape != gray_b.shape:
+        return False
+    (shift_x, shift_y), _ = cv2.phaseCorrelate(gray_a.astype(np.float32), gray_b.astype(np.float32))
+    h, w = gray_b.shape
+    aligned_b = cv2.warpAffine(gray_b, np.float32([[1, 0, -shift_x], [0, 1, -shift_y]]), (w, h),
+                               flags=cv2.INTER_LINEAR, borderValue=255)
+    mask_a, mask_b = ink_mask(gray_a), ink_mask(aligned_b)
+    diff = (((mask_a > 0) & (cv2.dilate(mask_b, _KERNEL_CROSS) == 0)) |
+            ((mask_b > 0) & (cv2.dilate(mask_a, _KERNEL_CROSS) == 0))).astype(np.uint8)
+    if not diff.any():
+        return True
+    if np.any(diff & text_line_mask(mask_a | mask_b)):
+        return False
+    _, _, stats, _ = cv2.connectedComponentsWithStats(diff, connectivity=8)
+    return not np.any(stats[1:, cv2.CC_STAT_AREA] >= DIFF_MIN_AREA)
+
+
+class PageScreener:
+    """
+    按任务顺序预筛页面。screen(task, key) 返回：
+      ("blank", None)      空白页
+      ("duplicate", 原 key) 与之前某个页面相同
+      (None, None)         需要 OCR (其特征被记录，供后续页面比较)
+    """
+
+    def __init__(self, skip_blank=True, dedup=False, blank_ink_ratio=BLANK_INK_RATIO):
+        self.skip_blank = skip_blank
+        self.dedup = dedup
+        self.blank_ink_ratio = blank_ink_ratio
+        self._seen = {}  # pHash -> [(PageSignature, 任务, key, 记录序号)]
+        self._bands = [{} for _ in range(HASH_BANDS)]  # 每段：段值 -> [pHash] (按首次出现顺序)
+        self._recorded = 0
+        self._exact = {}  # 内容摘要 -> (PageSignature, 任务, key)
+        self._verify_cache = OrderedDict()  # key -> 复核图像 (最近使用的在后)
+        self._docs = OrderedDict()  # 路径 -> 打开的 PDF 文档
+        self.verified = 0  # 复核过的候选页数
+        self.rejected = 0  # 复核发现内容不同的候选页数
+
+    def _open_doc(self, path):
+        doc = self._docs.pop(path, None)
+        if doc is None:
+            if len(self._docs) >= MAX_OPEN_DOCS:
+                self._docs.popitem(last=False)[1].close()
+            doc = fitz.open(path)
+        self._docs[path] = doc
+        return doc
+
+    def render_gray(self, task, dpi=SCREEN_DPI, long_side=SCREEN_LONG_SIDE):
+        """任务页面的灰度图 (PDF 按 dpi 渲染，图像文件缩放到长边 long_side)"""
+        if task.is_pdf_page:
+            pix = self._open_doc(task.file_path).load_page(task.page_index).get_pixmap(dpi=dpi,
+                                                                                      colorspace=fitz.csGRAY)
+            return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width].copy()
+        gray = cv2.imread(task.file_path, cv2.IMREAD_GRAYSCALE if long_side > SCREEN_LONG_SIDE
+                          else cv2.IMREAD_REDUCED_GRAYSCALE_2)
+        if gray is None:
+            raise IOError(f"无法加载图像文件: {task.file_path}")
+        scale = long_side / max(gray.shape)
+        size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def _verify_gray(self, task, key):
+        """复核图像 (缓存最近 VERIFY_CACHE_PAGES 页)"""
+        gray = self._verify_cache.pop(key, None)
+        if gray is None:
+            gray = self.render_gray(task, VERIFY_DPI, VERIFY_LONG_SIDE)
+        self._verify_cache[key] = gray
+        while len(self._verify_cache) > VERIFY_CACHE_PAGES:
+            self._verify_cache.popitem(last=False)
+        return gray
+
+    def candidates(self, signature):
+        """
+        可能与 signature 相同的之前页面 [(PageSignature, 任务, key)]，最多 MAX_VERIFY_CANDIDATES 个：
+        低分辨率图像完全相同的页面在前，其余按缩略图 L1 距离从近到远。
+        """
+        exact = self._exact.get(signature.digest)
+        # 最近的之前页面在前，总共最多 MAX_SCAN_PER_PAGE 页
+        entries = sorted((entry for phash in self._near_hashes(signature.phash) for entry in self._seen[phash]),
+                         key=lambda entry: -entry[3])[:MAX_SCAN_PER_PAGE]
+        found = []
+        for entry in entries:
+            if (exact is None or entry[2] != exact[2]) and is_candidate(entry[0], signature):
+                found.append((cv2.norm(entry[0].thumb, signature.thumb, cv2.NORM_L1), -entry[3], entry[:3]))
+        found.sort(key=lambda item: item[:2])
+        ranked = [entry for _, _, entry in found]
+        return ([exact] + ranked if exact is not None else ranked)[:MAX_VERIFY_CANDIDATES]
+
+    def _near_hashes(self, phash):
+        """之前出现过、与 phash 汉明距离不超过 HASH_MAX_DISTANCE 的哈希 (查各段的近邻桶)"""
+        near = set()
+        for band, buckets in enumerate(self._bands):
+            value = (phash >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1)
+            for flip in _BAND_FLIPS:
+                for other in buckets.get(value ^ flip, ())[-MAX_HASHES_PER_BUCKET:]:
+                    if other not in near and bin(other ^ phash).count("1") <= HASH_MAX_DISTANCE:
+                        near.add(other)
+        return near
+
+    def _record(self, signature, task, key):
+        if signature.phash not in self._seen:
+            self._seen[signature.phash] = []
+            for band, buckets in enumerate(self._bands):
+                value = (signature.phash >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1)
+                buckets.setdefault(value, []).append(signature.phash)
+        entries = self._seen[signature.phash]
+        entries.append((signature, task, key, self._recorded))
+        del entries[:-MAX_SCAN_PER_PAGE]  # 更早的页面不会再被比较
+        self._exact.setdefault(signature.digest, (signature, task, key))
+        self._recorded += 1
+
+    def screen(self, task, key):
+        signature = page_signature(self.render_gray(task))
+        if self.skip_blank and signature.coverage < self.blank_ink_ratio:
+            return "blank", None
+        if self.dedup:
+            verify_gray = None
+            for seen, seen_task, seen_key in self.candidates(signature):
+                if verify_gray is None:
+                    verify_gray = self._verify_gray(task, key)
+                self.verified += 1
+                if same_content(self._verify_gray(seen_task, seen_key), verify_gray):
+                    self._verify_cache.pop(key, None)
+                    return "duplicate", seen_key
+                self.rejected += 1
+            self._record(signature, task, key)
+        return None, None
+
+    def close(self):
+        for doc in self._docs.values():
+            doc.close()
+        self._docs.clear()
+        self._verify_cache.clear()
+
+
+def describe_page(task):
+    """日志/汇总中使用的页面名称：文件名 + 页码"""
+    return f"{os.path.basename(task.file_path)} {task.description}"
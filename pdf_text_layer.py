@@ -0,0 +1,66 @@
+# 文件路径：pdf_text_layer.py
+# -*- coding: utf-8 -*-
+"""
+pdf_text_layer.py — PDF 内嵌文本层检测
+电子版 (born-digital) PDF 的页面本身带有可提取的文字，直接用 PyMuPDF 取出文本
+比渲染 + OCR 快几个数量级，且没有识别误差。
+扫描页 (整页图像) 和图文混排页 (大面积图像中可能含文字) 仍需走 OCR。
+
+判断规则 (逐页)：
+  - 可见字符数 >= min_chars；
+  - 图像覆盖页面面积的比例 <= max_image_coverage；
+  - 乱码字符 (U+FFFD、私用区字符，通常来自缺少 ToUnicode 的字体) 比例 <= max_garbage_ratio。
+"""
+
+DEFAULT_MIN_CHARS = 30
+DEFAULT_MAX_IMAGE_COVERAGE = 0.5
+DEFAULT_MAX_GARBAGE_RATIO = 0.1
+
+
+class TextLayerInfo:
+    """ 单页文本层分析结果 """
+
+    def __init__(self, text, char_count, image_coverage, garbage_ratio):
+        self.text = text
+        self.char_count = char_count
+        self.image_coverage = image_coverage
+        self.garbage_ratio = garbage_ratio
+
+    def usable(self, min_chars=DEFAULT_MIN_CHARS, max_image_coverage=DEFAULT_MAX_IMAGE_COVERAGE,
+               max_garbage_ratio=DEFAULT_MAX_GARBAGE_RATIO):
+        return (self.char_count >= min_chars
+                and self.image_coverage <= max_image_coverage
+                and self.garbage_ratio <= max_garbage_ratio)
+
+
+def _is_garbage_char(ch):
+    code = ord(ch)
+    return ch == "�" or 0xE000 <= code <= 0xF8FF
+
+
+def analyze_text_layer(page):
+    """提取页面文本层并统计字符数、图像覆盖率与乱码比例 (不渲染页面)"""
+    page_rect = page.rect
+    page_area = max(page_rect.width * page_rect.height, 1.0)
+
+    image_area = 0.0
+    for info in page.get_image_info():
+        bbox = page_rect & info["bbox"]  # 裁剪到页面范围内
+        if not bbox.is_empty:
+            image_area += bbox.width * bbox.height
+    image_coverage = min(image_area / page_area, 1.0)
+
+    text = page.get_text("text", sort=True)
+    visible = [ch for ch in text if not ch.isspace()]
+    garbage = sum(1 for ch in visible if _is_garbage_char(ch))
+    garbage_ratio = garbage / len(visible) if visible else 0.0
+    return TextLayerInfo(text, len(visible), image_coverage, garbage_ratio)
+
+
+def native_page_text(page, min_chars=DEFAULT_MIN_CHARS, max_image_coverage=DEFAULT_MAX_IMAGE_COVERAGE,
+                     max_garbage_ratio=DEFAULT_MAX_GARBAGE_RATIO):
+    """文本层足够可靠时返回页面文本，否则返回 None (该页需要 OCR)"""
+    info = analyze_text_layer(page)
+    if info.usable(min_chars, max_image_coverage, max_garbage_ratio):
+        return info.text.strip()
+    return None
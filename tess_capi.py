@@ -0,0 +1,250 @@
+# 文件路径：tess_capi.py
+# -*- coding: utf-8 -*-
+"""
+tess_capi.py — 进程内 Tesseract (通过 ctypes 调用 libtesseract C API)
+pytesseract 每次调用都会把图像编码成 PNG 写入临时文件，再启动一个新的 tesseract 进程，
+该进程每次都要重新加载 tessdata 语言模型 (chi_sim+eng 约数十 MB)；OSD 与识别各一次，每页两次。
+TesseractCAPI 在每个工作进程中只初始化一次 TessBaseAPI：
+  - 每种语言组合 (以及 OSD 用的 osd 模型) 一个句柄，首次使用时加载，之后逐页复用；
+  - 灰度/二值 numpy 数组直接作为内存缓冲区传入，不经过 PNG 编码和临时文件；
+  - 句柄不是线程安全的，一个 TesseractCAPI 只能在一个线程中使用。
+找不到 libtesseract 时 find_libtesseract 返回 None，调用方回退到 pytesseract。
+库路径可用环境变量 TESSERACT_LIB 显式指定。
+"""
+
+import os
+import glob
+import atexit
+import ctypes
+import ctypes.util
+import platform
+
+import numpy as np
+
+# TessPageSegMode / TessOcrEngineMode 取值 (与命令行 --psm / --oem 相同)
+PSM_OSD_ONLY = 0
+OEM_DEFAULT = 3
+# TessBaseAPIGetTsvText 的列 (与 pytesseract.image_to_data 的 DICT 键相同)
+TSV_COLUMNS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+               "left", "top", "width", "height", "conf", "text")
+
+
+class TesseractCAPIError(RuntimeError):
+    """ libtesseract 初始化或识别失败 """
+
+
+def _candidate_libraries(tesseract_path=None):
+    env_lib = os.getenv("TESSERACT_LIB")
+    if env_lib:
+        yield env_lib
+    if tesseract_path:  # Windows 安装包把 libtesseract-*.dll 放在 tesseract.exe 同目录
+        for pattern in ("libtesseract*.dll", "tesseract*.dll", "libtesseract*.dylib", "libtesseract.so*"):
+            yield from sorted(glob.glob(os.path.join(os.path.dirname(tesseract_path), pattern)), reverse=True)
+    found = ctypes.util.find_library("tesseract")
+    if found:
+        yield found
+    if platform.system() == "Darwin":
+        yield from ("/opt/homebrew/lib/libtesseract.dylib", "/usr/local/lib/libtesseract.dylib")
+    else:
+        yield from ("libtesseract.so.5", "libtesseract.so.4")
+
+
+def find_libtesseract(tesseract_path=None):
+    """加载 libtesseract 并声明用到的 C API 函数签名；找不到或版本过旧 (< 4) 时返回 None"""
+    for candidate in _candidate_libraries(tesseract_path):
+        try:
+            lib = ctypes.CDLL(candidate)
+            _declare_api(lib)
+        except (OSError, AttributeError):
+            continue
+        version = lib.TessVersion().decode("utf-8", "replace")
+        if version.split(".")[0].isdigit() and int(version.split(".")[0]) >= 4:
+            return lib
+    return None
+
+
+def _declare_api(lib):
+    handle = ctypes.c_void_p
+    lib.TessVersion.restype = ctypes.c_char_p
+    lib.TessVersion.argtypes = []
+    lib.TessBaseAPICreate.restype = handle
+    lib.TessBaseAPICreate.argtypes = []
+    lib.TessBaseAPIInit2.restype = ctypes.c_int
+    lib.TessBaseAPIInit2.argtypes = [handle, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+    lib.TessBaseAPISetPageSegMode.restype = None
+    lib.TessBaseAPISetPageSegMode.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPISetImage.restype = None
+    lib.TessBaseAPISetImage.argtypes = [handle, ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                        ctypes.c_int]
+    lib.TessBaseAPISetSourceResolution.restype = None
+    lib.TessBaseAPISetSourceResolution.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p  # 需要用 TessDeleteText 释放，不能声明为 c_char_p
+    lib.TessBaseAPIGetUTF8Text.argtypes = [handle]
+    lib.TessDeleteText.restype = None
+    lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+    lib.TessBaseAPIDetectOrientationScript.restype = ctypes.c_int
+    lib.TessBaseAPIDetectOrientationScript.argtypes = [handle, ctypes.POINTER(ctypes.c_int),
+                                                       ctypes.POINTER(ctypes.c_float),
+                                                       ctypes.POINTER(ctypes.c_char_p),
+                                                       ctypes.POINTER(ctypes.c_float)]
+    lib.TessBaseAPIRecognize.restype = ctypes.c_int
+    lib.TessBaseAPIRecognize.argtypes = [handle, ctypes.c_void_p]
+    lib.TessBaseAPIMeanTextConf.restype = ctypes.c_int
+    lib.TessBaseAPIMeanTextConf.argtypes = [handle]
+    lib.TessBaseAPIGetTsvText.restype = ctypes.c_void_p  # 同样需要 TessDeleteText 释放
+    lib.TessBaseAPIGetTsvText.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPIClear.restype = None
+    lib.TessBaseAPIClear.argtypes = [handle]
+    lib.TessBaseAPIEnd.restype = None
+    lib.TessBaseAPIEnd.argtypes = [handle]
+    lib.TessBaseAPIDelete.restype = None
+    lib.TessBaseAPIDelete.argtypes = [handle]
+
+
+class TesseractCAPI:
+    """ 常驻的 Tesseract 识别器：按语言缓存已初始化的 TessBaseAPI 句柄 """
+
+    def __init__(self, lib, tessdata_dir=None):
+        self.lib = lib
+        self.version = lib.TessVersion().decode("utf-8", "replace")
+        # None 表示由 libtesseract 按 TESSDATA_PREFIX 查找
+        self.tessdata_dir = tessdata_dir
+        self._handles = {}  # (语言, oem) -> 句柄
+        atexit.register(self.close)  # 进程退出前卸载模型，避免 libtesseract 报告对象泄漏
+
+    def _handle(self, lang, oem=OEM_DEFAULT):
+        key = (lang, oem)
+        handle = self._handles.get(key)
+        if handle is None:
+            handle = self.lib.TessBaseAPICreate()
+            datapath = self.tessdata_dir.encode("utf-8") if self.tessdata_dir else None
+            if self.lib.TessBaseAPIInit2(handle, datapath, lang.encode("utf-8"), oem) != 0:
+                self.lib.TessBaseAPIDelete(handle)
+                raise TesseractCAPIError(f"无法加载语言模型 '{lang}' (tessdata: {self.tessdata_dir or '默认'})")
+            self._handles[key] = handle
+        return handle
+
+    def load(self, lang, oem=OEM_DEFAULT):
+        """预先加载语言模型；失败时抛出 TesseractCAPIError"""
+        self._handle(lang, oem)
+
+    def is_loaded(self, lang, oem=OEM_DEFAULT):
+        """该语言的句柄是否已成功初始化 (用于区分模型加载失败与单次识别失败)"""
+        return (lang, oem) in self._handles
+
+    def _set_image(self, handle, gray, ppi=None):
+        """gray: 二维 uint8 数组 (灰度或二值)。返回实际传入的数组，调用方需在识别结束前保持引用"""
+        if gray.ndim != 2 or gray.dtype != np.uint8:
+            raise TesseractCAPIError(f"需要二维 uint8 图像，实际为 {gray.dtype} {gray.shape}")
+        if gray.strides[1] != 1:
+            gray = np.ascontiguousarray(gray)
+        height, width = gray.shape
+        self.lib.TessBaseAPISetImage(handle, gray.ctypes.data, width, height, 1, gray.strides[0])
+        if ppi:
+            self.lib.TessBaseAPISetSourceResolution(handle, int(ppi))
+        return gray
+
+    def image_to_string(self, gray, lang, psm=3, oem=OEM_DEFAULT, ppi=None):
+        """
+        识别文字，等价于 pytesseract.image_to_string(gray, lang=lang, config='--oem {oem} --psm {psm}')。
+        ppi 为 None 时由 Tesseract 根据字高估计分辨率。
+        """
+        handle = self._handle(lang, oem)
+        self.lib.TessBaseAPISetPageSegMode(handle, psm)
+        image = self._set_image(handle, gray, ppi)
+        text_ptr = self.lib.TessBaseAPIGetUTF8Text(handle)
+        del image
+        if not text_ptr:
+            self.lib.TessBaseAPIClear(handle)
+            raise TesseractCAPIError("识别失败 (TessBaseAPIGetUTF8Text 返回空指针)")
+        try:
+            return ctypes.string_at(text_ptr).decode("utf-8", "replace")
+        finally:
+            self.lib.TessDeleteText(text_ptr)
+            self.lib.TessBaseAPIClear(handle)
+
+    def image_to_string_with_confidence(self, gray, lang, psm=3, oem=OEM_DEFAULT, ppi=None):
+        """识别文字并返回 (文本, 平均词置信度 0~100)；置信度来自同一次识别，不需要额外调用"""
+        text, confidence, _ = self._recognize(gray, lang, psm, oem, ppi, with_data=False)
+        return text, confidence
+
+    def image_to_data(self, gray, lang, psm=3, oem=OEM_DEFAULT, ppi=None):
+        """
+        识别文字并返回 (文本, 平均词置信度, 逐词数据)，三者来自同一次识别。
+        逐词数据与 pytesseract.image_to_data(output_type=DICT) 格式相同：TSV_COLUMNS 中每列一个列表。
+        """
+        return self._recognize(gray, lang, psm, oem, ppi, with_data=True)
+
+    def _recognize(self, gray, lang, psm, oem, ppi, with_data):
+        handle = self._handle(lang, oem)
+        self.lib.TessBaseAPISetPageSegMode(handle, psm)
+        image = self._set_image(handle, gray, ppi)
+        text_ptr = tsv_ptr = None
+        try:
+            if self.lib.TessBaseAPIRecognize(handle, None) != 0:
+                raise TesseractCAPIError("识别失败 (TessBaseAPIRecognize)")
+            confidence = self.lib.TessBaseAPIMeanTextConf(handle)
+            text_ptr = self.lib.TessBaseAPIGetUTF8Text(handle)
+            text = ctypes.string_at(text_ptr).decode("utf-8", "replace") if text_ptr else ""
+            data = None
+            if with_data:
+                tsv_ptr = self.lib.TessBaseAPIGetTsvText(handle, 0)
+                data = parse_tsv(ctypes.string_at(tsv_ptr).decode("utf-8", "replace") if tsv_ptr else "")
+            return text, confidence, data
+        finally:
+            del image
+            for ptr in (text_ptr, tsv_ptr):
+                if ptr:
+                    self.lib.TessDeleteText(ptr)
+            self.lib.TessBaseAPIClear(handle)
+
+    def image_to_osd(self, gray, ppi=None):
+        """
+        方向与文字脚本检测 (需要 osd.traineddata)，返回与 pytesseract.image_to_osd(output_type=DICT)
+        相同含义的字典：rotate 为图像需要顺时针旋转的角度。
+        """
+        handle = self._handle("osd")
+        self.lib.TessBaseAPISetPageSegMode(handle, PSM_OSD_ONLY)
+        image = self._set_image(handle, gray, ppi)
+        orient_deg = ctypes.c_int(0)
+        orient_conf = ctypes.c_float(0.0)
+        script_name = ctypes.c_char_p()
+        script_conf = ctypes.c_float(0.0)
+        try:
+            ok = self.lib.TessBaseAPIDetectOrientationScript(handle, ctypes.byref(orient_deg),
+                                                             ctypes.byref(orient_conf), ctypes.byref(script_name),
+                                                             ctypes.byref(script_conf))
+        finally:
+            del image
+            self.lib.TessBaseAPIClear(handle)
+        if not ok:
+            raise TesseractCAPIError("方向检测失败 (文字过少或缺少 osd.traineddata)")
+        return {
+            "orientation": orient_deg.value,
+            "rotate": (360 - orient_deg.value) % 360,  # 文字顺时针转了 orient_deg 度，图像需再顺时针转 360 - orient_deg 度
+            "orientation_conf": orient_conf.value,
+            "script": script_name.value.decode("utf-8", "replace") if script_name.value else "Unknown",
+            "script_conf": script_conf.value,
+        }
+
+    def close(self):
+        """释放所有句柄 (卸载语言模型)"""
+        for handle in self._handles.values():
+            self.lib.TessBaseAPIEnd(handle)
+            self.lib.TessBaseAPIDelete(handle)
+        self._handles = {}
+
+
+def parse_tsv(tsv):
+    """TessBaseAPIGetTsvText 的输出 (无表头) -> {列名: 列表}，数值列转为 int/float"""
+    data = {name: [] for name in TSV_COLUMNS}
+    for line in tsv.splitlines():
+        fields = line.split("\t")
+        if len(fields) < len(TSV_COLUMNS) - 1:
+            continue
+        fields += [""] * (len(TSV_COLUMNS) - len(fields))  # 非词级别的行可能没有 text 列
+        for name, value in zip(TSV_COLUMNS[:-2], fields):
+            data[name].append(int(value))
+        data["conf"].append(float(fields[-2]))
+        data["text"].append(fields[-1])
+    return data
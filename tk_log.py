@@ -0,0 +1,123 @@
+# 文件路径：tk_log.py
+# -*- coding: utf-8 -*-
+"""
+tk_log.py — OCR 界面 (ocr.py / ReadPdf.py) 的缓冲日志与进度显示
+原来每条日志、每次进度更新都各自 root.after(0, ...)，并对 Text 组件 insert + see(END)；
+流水线每页输出十几行日志，大批量任务时 Tk 事件循环成为瓶颈，日志组件也无限增长。
+BufferedTkLog：
+  - log() / set_progress() 可在任意线程调用，只把内容放入缓冲区 (加锁)，不触碰 Tk 组件；
+  - Tk 线程中的定时器 (默认每 100 ms) 把期间的日志一次性插入、只滚动一次，进度只应用最新值；
+  - 日志组件只保留最近 max_lines 行，完整日志同时写入文件 (open_file 指定，通常在每次任务开始时)。
+"""
+
+import os
+import threading
+import logging
+from time import strftime, localtime
+from tkinter import END, NORMAL, DISABLED, TclError
+
+DEFAULT_FLUSH_MS = 100
+DEFAULT_MAX_LINES = 2000
+RUN_LOG_PREFIX = "ocr_run_"
+
+
+def run_log_path(output_dir):
+    """一次任务的完整日志文件路径：{输出目录}/ocr_run_{日期_时间}.log"""
+    return os.path.join(output_dir, f"{RUN_LOG_PREFIX}{strftime('%Y%m%d_%H%M%S', localtime())}.log")
+
+
+class BufferedTkLog:
+    """ 合并日志与进度更新的 Tk 输出端 (必须在 Tk 线程中创建) """
+
+    def __init__(self, root, log_text, progress_bar, progress_label, max_lines=DEFAULT_MAX_LINES,
+                 flush_ms=DEFAULT_FLUSH_MS):
+        self.root = root
+        self.log_text = log_text
+        self.progress_bar = progress_bar
+        self.progress_label = progress_label
+        self.max_lines = max(100, max_lines)
+        self.flush_ms = max(10, flush_ms)
+        self._lock = threading.Lock()
+        self._pending = []  # 等待插入日志组件的行
+        self._progress = None  # 最新的 (进度值, 说明)，None 表示没有新进度
+        self._file = None
+        self.file_path = None
+        self._closed = False
+        self.root.after(self.flush_ms, self._tick)
+
+    # --- 任意线程调用 ---
+    def log(self, message, level=logging.INFO):
+        timestamp = strftime("%H:%M:%S", localtime())
+        prefix = f"{timestamp} [{logging.getLevelName(level)}] " if level > logging.INFO else f"{timestamp} - "
+        line = f"{prefix}{message}\n"
+        logging.log(level, message)  # 同步到 Python 标准日志
+        with self._lock:
+            self._pending.append(line)
+            if self._file is not None:
+                self._file.write(line)
+
+    def set_progress(self, value, text):
+        with self._lock:
+            self._progress = (max(0, min(100, int(value))), text)
+
+    def open_file(self, path):
+        """之后的日志完整写入 path (同时关闭之前的文件)；打开失败时只记录警告"""
+        self.close_file()
+        try:
+            handle = open(path, "a", encoding="utf-8")
+        except OSError as e:
+            self.log(f"无法打开日志文件 {path}: {e}", logging.WARNING)
+            return None
+        with self._lock:
+            self._file, self.file_path = handle, path
+        return path
+
+    def close_file(self):
+        with self._lock:
+            handle, self._file = self._file, None
+        if handle is not None:
+            handle.close()
+
+    # --- Tk 线程调用 ---
+    def clear(self):
+        """清空日志组件与尚未显示的日志"""
+        with self._lock:
+            self._pending = []
+        self.log_text.config(state=NORMAL)
+        self.log_text.delete(1.0, END)
+        self.log_text.config(state=DISABLED)
+
+    def close(self):
+        self._closed = True
+        self.close_file()
+
+    def _tick(self):
+        if self._closed:
+            return
+        try:
+            self.flush()
+            self.root.after(self.flush_ms, self._tick)
+        except (TclError, RuntimeError):  # 窗口已关闭
+            self.close()
+
+    def flush(self):
+        """把缓冲区中的日志一次性插入组件 (超出 max_lines 的旧行被删除)，并应用最新进度"""
+        with self._lock:
+            lines, self._pending = self._pending, []
+            progress, self._progress = self._progress, None
+            if self._file is not None:
+                self._file.flush()
+        if lines:
+            if len(lines) > self.max_lines:
+                lines = lines[-self.max_lines:]
+            self.log_text.config(state=NORMAL)
+            self.log_text.insert(END, "".join(lines))
+            line_count = int(self.log_text.index("end-1c").split(".")[0])
+            if line_count > self.max_lines:
+                self.log_text.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+            self.log_text.see(END)
+            self.log_text.config(state=DISABLED)
+        if progress is not None:
+            value, text = progress
+            self.progress_bar['value'] = value
+            self.progress_label.config(text=text)